@@ -0,0 +1,151 @@
+"""Row conversion throughput of CargoFetcher on a synthetic table shaped like wavu's T8 Move table.
+
+Run from the repository root with: python -m benchmarks.bench_fetcher
+"""
+import argparse
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import fields
+from typing import Any, Callable
+
+from hunting_hawk.mediawiki.cargo import _table_type
+from hunting_hawk.mediawiki.filepath import FilePaths
+from hunting_hawk.sources import fetcher as fetcher_module
+from hunting_hawk.sources.memory import table_memory
+from hunting_hawk.sources.wavu import StripSuffixFetcher, cargo
+
+# Roughly the field layout of the T8 Move table
+FIELDS: dict[str, dict[str, Any]] = {
+    "id": {"type": "String"},
+    "name": {"type": "String"},
+    "input": {"type": "String"},
+    "parent": {"type": "String"},
+    "target": {"type": "String"},
+    "damage": {"type": "String"},
+    "reach": {"type": "String"},
+    "tracksLeft": {"type": "String"},
+    "tracksRight": {"type": "String"},
+    "startup": {"type": "String"},
+    "recv": {"type": "String"},
+    "tot": {"type": "String"},
+    "crush": {"type": "String"},
+    "block": {"type": "String"},
+    "hit": {"type": "String"},
+    "ch": {"type": "String"},
+    "notes": {"type": "Wikitext"},
+    "alias": {"type": "String", "isList": "", "delimiter": ","},
+    "image": {"type": "File"},
+    "video": {"type": "File"},
+}
+
+NOTES = [
+    "",
+    "* Homing\n* Balcony Break",
+    "&lt;div class=&quot;plainlist&quot;&gt;\n* Heat Engager&lt;/div&gt;",
+    "&amp;lt;b&amp;gt;Tornado&amp;lt;/b&amp;gt;",
+    "-",
+]
+
+
+def make_rows(count: int, seed: int = 0) -> list[dict[str, Any]]:
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(count):
+        chara = f"Character {i % 36} movelist"
+        rows.append(
+            {
+                "_pageName": chara,
+                "id": f"{chara}-{i}",
+                "name": rnd.choice(["Jab", "Right Splits Kick", "Heat Burst", "Rage Art", ""]),
+                "input": rnd.choice(["1", "1,2", "f+1+2", "df+2", "b,f+2,1", "d/f+3"]),
+                "parent": rnd.choice(["", f"{chara}-{i - 1}"]),
+                "target": rnd.choice(["h", "m", "l", "h,m", "m,m,h"]),
+                "damage": str(rnd.randint(5, 60)),
+                "reach": "-",
+                "tracksLeft": "",
+                "tracksRight": "",
+                "startup": f"i{rnd.randint(10, 25)}",
+                "recv": rnd.choice(["r30", "r25 FC", "r18"]),
+                "tot": str(rnd.randint(20, 80)),
+                "crush": rnd.choice(["", "js8~30", "cs6~"]),
+                "block": rnd.choice(["-12", "+2", "-5~-4", "+5c"]),
+                "hit": rnd.choice(["+8", "+27a (+17)", "+4c"]),
+                "ch": rnd.choice(["", "+31a", "+8"]),
+                "notes": rnd.choice(NOTES),
+                "alias": rnd.choice([[], ["1+2"], ["f+1+2", "FF1+2"]]),
+                "image": rnd.choice(["", f"T8_{i}.png"]),
+                "video": rnd.choice(["", f"T8_{i}.mp4"]),
+            }
+        )
+    return rows
+
+
+def make_fetcher(rows: list[dict[str, Any]]) -> StripSuffixFetcher:
+    fetcher = StripSuffixFetcher(cargo, "Move", default_key="_pageName")
+    # Skip the network round trip for the table definition
+    fetcher.__dict__["move"] = _table_type("Move", {"cargofields": FIELDS})
+    # and for the file urls, as if they were resolved already
+    urls = {r[k]: f"https://wavu.wiki/w/images/{r[k]}" for r in rows for k in ("image", "video") if r[k]}
+    files = FilePaths(cargo, urls=urls)
+    fetcher_module.file_paths = lambda _: files  # type: ignore
+    return fetcher
+
+
+def legacy_list_to_moves(fetcher: StripSuffixFetcher, moves: list[Any]) -> list[Any]:
+    """The conversion before the field plan: a thread pool per call and a pydantic validated move per row."""
+
+    def fill_move(move: dict[Any, Any]) -> Any:
+        file_fields = fetcher.file_fields
+        wikitext_fields = fetcher.wikitext_fields
+        file_dicts = {k: fetcher._convert_url(v) for k, v in move.items() if k in file_fields()}
+        unescaped_html = {k: fetcher._unescape_html(v) for k, v in move.items() if k in wikitext_fields()}
+        blank_fields = {t.name: None for t in fields(fetcher.move)}  # type: ignore
+        return fetcher.move(**(blank_fields | move | unescaped_html | file_dicts))
+
+    res = []
+    with ThreadPoolExecutor() as executor:
+        for future in as_completed(executor.submit(fill_move, move) for move in moves):
+            res.append(future.result())
+    return res
+
+
+def best_of(repeat: int, convert: Callable[[list[Any]], list[Any]], data: list[dict[str, Any]]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        batch = json.loads(json.dumps(data))
+        start = time.perf_counter()
+        moves = convert(batch)
+        best = min(best, time.perf_counter() - start)
+    assert len(moves) == len(data)
+    return best
+
+
+def bench(rows: int, repeat: int) -> None:
+    # Parsed like the export responses, every value its own object
+    data = json.loads(json.dumps(make_rows(rows)))
+    fetcher = make_fetcher(data)
+    converted = fetcher._list_to_moves(json.loads(json.dumps(data)))
+    assert sorted(map(repr, legacy_list_to_moves(fetcher, json.loads(json.dumps(data))))) == sorted(map(repr, converted))
+
+    runs = {
+        "legacy": best_of(repeat, lambda batch: legacy_list_to_moves(fetcher, batch), data),
+        "field plan": best_of(repeat, fetcher._list_to_moves, data),
+    }
+    for name, seconds in runs.items():
+        print(f"{name}: {rows} rows in {seconds * 1000:.1f}ms, {rows / seconds:,.0f} rows/sec")
+
+    for share in (False, True):
+        fetcher = make_fetcher(data)
+        fetcher.share_values = share
+        memory = table_memory(fetcher._list_to_moves(json.loads(json.dumps(data))))
+        print(f"{'shared' if share else 'unshared'} values: {memory.bytes / 2**20:.2f}MiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    bench(args.rows, args.repeat)
@@ -0,0 +1,75 @@
+"""Wikitext decoding throughput, against the ElementTree based decoder it replaced.
+
+Run from the repository root with: python -m benchmarks.bench_wikitext
+"""
+import argparse
+import random
+import re
+import time
+import xml.etree.ElementTree as ET
+from html import unescape
+from typing import Callable
+
+from hunting_hawk.util import wikitext
+
+# Notes as they come out of wavu's T8 Move table
+NOTES = [
+    "",
+    "* Homing\n* Balcony Break",
+    "&lt;div class=&quot;plainlist&quot;&gt;\n* Heat Engager&lt;/div&gt;",
+    "&amp;lt;b&amp;gt;Tornado&amp;lt;/b&amp;gt;",
+    "-",
+]
+
+
+def legacy_decode(val: str) -> str:
+    wikit = unescape(unescape(val))
+    try:
+        inner = ET.fromstring(wikit).text
+        if not inner:
+            return wikit
+        return re.sub("^'''|'''$", "", inner)
+    except ET.ParseError:
+        pass
+    return wikit
+
+
+def make_values(count: int, distinct: int, seed: int = 0) -> list[str]:
+    """COUNT values drawn from NOTES and DISTINCT free form notes."""
+    rnd = random.Random(seed)
+    free = [f"* Combo from {i} hits\n* Wall splat on hit" for i in range(distinct)]
+    return [rnd.choice(NOTES) if rnd.random() < 0.7 else rnd.choice(free) for _ in range(count)]
+
+
+def best_of(repeat: int, decode: Callable[[str], str], values: list[str], before: Callable[[], None]) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        before()
+        start = time.perf_counter()
+        for v in values:
+            decode(v)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(count: int, distinct: int, repeat: int) -> None:
+    values = make_values(count, distinct)
+    assert [wikitext.decode(v) for v in values] == [legacy_decode(v) for v in values]
+
+    runs = {
+        "legacy": best_of(repeat, legacy_decode, values, lambda: None),
+        "decode, no memo": best_of(repeat, wikitext.decode.__wrapped__, values, lambda: None),
+        "decode, cold memo": best_of(repeat, wikitext.decode, values, wikitext.decode.cache_clear),
+        "decode, warm memo": best_of(repeat, wikitext.decode, values, lambda: None),
+    }
+    for name, seconds in runs.items():
+        print(f"{name}: {count} values in {seconds * 1000:.1f}ms, {count / seconds:,.0f} values/sec")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--values", type=int, default=50_000)
+    parser.add_argument("--distinct", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    bench(args.values, args.distinct, args.repeat)
@@ -1,11 +1,36 @@
 import logging
 import os
+import re
+import threading
+import time
+import uuid
+import zlib
 from abc import ABC, abstractmethod
-from typing import Any, Callable, Generator, Optional
+from collections import Counter
+from json import dumps
+from typing import Any, Callable, Generator, Mapping, Optional, Sequence
 
 import redis
 from redis.commands.search.query import Query
 
+from hunting_hawk.util.normalize import normalize
+
+from .codec import DictionaryCodec, train_dictionary
+from .lru import LRUStore
+
+INVALIDATION_CHANNEL = "hunting_hawk:invalidate"
+# Field of the indexed documents holding the name of their table
+TABLE_FIELD = "table"
+# Id of the current compression dictionary, the dictionaries are stored under DICTIONARY_KEY:{id}
+DICTIONARY_KEY = "hunting_hawk:zdict"
+
+# Leading byte of stored byte values, telling how the rest is encoded
+RAW = b"\x00"
+ZLIB = b"\x01"
+# Followed by the 4 byte id of the dictionary
+DICTIONARY = b"\x02"
+ENCODINGS = {RAW: "raw", ZLIB: "zlib", DICTIONARY: "dictionary"}
+
 
 class Cache(ABC):
     @abstractmethod
@@ -20,6 +45,14 @@ class Cache(ABC):
     def set(self, key: str, val: str) -> Optional[bool]:
         pass
 
+    @abstractmethod
+    def set_many(self, items: Mapping[str, str]) -> list[Any]:
+        pass
+
+    @abstractmethod
+    def get_many(self, keys: Sequence[str]) -> list[Optional[str]]:
+        pass
+
     @abstractmethod
     def get_list(self, key: str) -> list[str]:
         pass
@@ -32,22 +65,64 @@ class Cache(ABC):
     def set_json(self, key: str, val: Any, encoder: Callable[[Any], Any]) -> list[Any]:
         pass
 
+    @abstractmethod
+    def set_json_many(self, items: Mapping[str, Any], encoder: Callable[[Any], Any]) -> list[Any]:
+        pass
+
     @abstractmethod
     def get_json(self, key: str) -> Any:
         pass
 
     @abstractmethod
-    def query(self, table_key: str, char: str, query: str) -> Generator[Any, Any, Any]:
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set_bytes(self, key: str, val: bytes, sample: bool = False) -> Optional[bool]:
+        """Store VAL under KEY, SAMPLE marks a value like the ones a compression dictionary is trained for."""
+
+    @abstractmethod
+    def set_bytes_many(self, items: Mapping[str, bytes], sample: bool = False) -> list[Any]:
+        pass
+
+    @abstractmethod
+    def query(self, table: str, table_key: str, char: str, query: str) -> Generator[Any, Any, Any]:
         pass
 
+    def stats(self) -> dict[str, int]:
+        """Counters of the values stored so far."""
+        return {}
+
 
 class RedisCache(Cache):
     expiry: int = 60 * 60 * 24 * 7
+    # Byte values at least this large are stored compressed
+    compress_min_bytes: int = 1024
+    # Fast and still several times smaller for frame data
+    compress_level: int = 1
+    # Keys written per round trip by the bulk writes
+    pipeline_keys: int = 500
+    # Compress byte values with a dictionary trained on the first ones stored
+    dictionary: bool = os.getenv("HUNTING_HAWK_CACHE_DICTIONARY", "1") != "0"
+    # Bytes of values sampled before the dictionary is trained
+    dictionary_samples_bytes: int = 256 * 1024
+    # With a dictionary even single moves are worth compressing
+    dictionary_min_bytes: int = 64
+    # Seconds between checks for a dictionary published by another worker
+    dictionary_recheck_seconds: int = 60
     _shared_state: dict[Any, Any] = {}
 
     # Red alert: Borg pattern
     def __init__(self) -> None:
         self.__dict__ = self._shared_state
+        if "metrics" not in self.__dict__:
+            self.metrics: Counter[str] = Counter()
+            self.codec: Optional[DictionaryCodec] = None
+            self.codecs: dict[int, DictionaryCodec] = {}
+            # When the dictionary was last looked up or kept alive
+            self.codec_checked: Optional[float] = None
+            self.samples: list[bytes] = []
+            self.codec_lock = threading.Lock()
 
     def connect(self) -> None:
         url = os.environ.get("REDIS_URL", "redis://localhost:6379")
@@ -62,6 +137,26 @@ class RedisCache(Cache):
     def set(self, key: str, val: str) -> Optional[bool]:
         return self.client.set(key, val, ex=self.expiry)
 
+    def set_many(self, items: Mapping[str, str]) -> list[Any]:
+        return self._pipelined(items, lambda pipe, key, val: pipe.set(key, val, ex=self.expiry))
+
+    def get_many(self, keys: Sequence[str]) -> list[Optional[str]]:
+        res: list[Optional[str]] = []
+        for i in range(0, len(keys), self.pipeline_keys):
+            res.extend(r.decode("utf-8") if r else None for r in self.client.mget(keys[i : i + self.pipeline_keys]))
+        return res
+
+    def _pipelined(self, items: Mapping[str, Any], write: Callable[[Any, str, Any], Any]) -> list[Any]:
+        """WRITE every item in pipelines of up to pipeline_keys keys."""
+        res: list[Any] = []
+        keys = list(items)
+        for i in range(0, len(keys), self.pipeline_keys):
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys[i : i + self.pipeline_keys]:
+                write(pipe, key, items[key])
+            res.extend(pipe.execute())
+        return res
+
     def get_list(self, key: str) -> list[str]:
         r = [b.decode("utf-8") for b in self.client.lrange(key, 0, -1)]
         return r
@@ -79,67 +174,245 @@ class RedisCache(Cache):
         pipe.expire(key, self.expiry)
         return pipe.execute()
 
+    def set_json_many(self, items: Mapping[str, Any], encoder: Callable[[Any], Any]) -> list[Any]:
+        def write(pipe: Any, key: str, val: Any) -> None:
+            pipe.json().set(key, "$", encoder(val))
+            pipe.expire(key, self.expiry)
+
+        return self._pipelined(items, write)
+
     def get_json(self, key: str) -> Any:
         return self.client.json().get(key)
 
-    def query(self, table_key: str, char: str, query: str) -> Generator[Any, None, None]:
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        res = self.client.get(key)
+        if res is None:
+            return None
+        return self.decode_bytes(res)
+
+    def set_bytes(self, key: str, val: bytes, sample: bool = False) -> Optional[bool]:
+        if sample:
+            self.sample(val)
+        return self.client.set(key, self.encode_bytes(val), ex=self.expiry)
+
+    def set_bytes_many(self, items: Mapping[str, bytes], sample: bool = False) -> list[Any]:
+        def write(pipe: Any, key: str, val: bytes) -> None:
+            if sample:
+                self.sample(val)
+            pipe.set(key, self.encode_bytes(val), ex=self.expiry)
+
+        return self._pipelined(items, write)
+
+    def encode_bytes(self, val: bytes) -> bytes:
+        """Tag VAL with its encoding, compressing it if it is large enough to be worth it."""
+        codec = self.current_codec() if self.dictionary else None
+        if codec is not None and len(val) >= self.dictionary_min_bytes:
+            encoded = DICTIONARY + codec.id.to_bytes(4, "big") + codec.compress(val)
+        elif len(val) >= self.compress_min_bytes:
+            encoded = ZLIB + zlib.compress(val, self.compress_level)
+        else:
+            encoded = RAW + val
+        if len(encoded) > len(val) + 1:
+            encoded = RAW + val
+
+        self.metrics[f"values_{ENCODINGS[encoded[:1]]}"] += 1
+        self.metrics["raw_bytes"] += len(val)
+        self.metrics["stored_bytes"] += len(encoded)
+        return encoded
+
+    def decode_bytes(self, val: bytes) -> Optional[bytes]:
+        """Restore a value stored with encode_bytes, None if its dictionary is gone."""
+        match val[:1]:
+            case b"\x00":
+                return val[1:]
+            case b"\x01":
+                return zlib.decompress(val[1:])
+            case b"\x02":
+                if self.codec is None:
+                    # Another worker published a dictionary since the last check
+                    self.codec_checked = None
+                codec = self.codec_for(int.from_bytes(val[1:5], "big"))
+                return None if codec is None else codec.decompress(val[5:])
+            case _:
+                raise ValueError(f"Unknown encoding {val[:1]!r}")
+
+    @property
+    def dictionary_ttl(self) -> int:
+        # Outlives every value written before its expiry was last extended
+        return self.expiry + self.dictionary_recheck_seconds
+
+    def current_codec(self) -> Optional[DictionaryCodec]:
+        """The dictionary new values are compressed with, once one was trained by any worker.
+
+        Checked every dictionary_recheck_seconds, picking up a dictionary published by another
+        worker and extending the expiry of the one in use."""
+        now = time.monotonic()
+        if self.codec_checked is not None and now - self.codec_checked < self.dictionary_recheck_seconds:
+            return self.codec
+        self.codec_checked = now
+        try:
+            if (codec := self.codec) is not None:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.expire(DICTIONARY_KEY, self.dictionary_ttl)
+                pipe.expire(f"{DICTIONARY_KEY}:{codec.id}", self.dictionary_ttl)
+                if all(pipe.execute()):
+                    return codec
+                # Evicted or flushed, other workers could not read the values compressed with it
+                logging.warning(f"Compression dictionary {codec.id} is gone, publishing it again")
+                self.codec = None
+                self.publish_codec(codec)
+            elif (current := self.client.get(DICTIONARY_KEY)) is not None:
+                self.codec = self.codec_for(int(current))
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            logging.warning(f"Unable to load the compression dictionary: {e}")
+        return self.codec
+
+    def codec_for(self, id: int) -> Optional[DictionaryCodec]:
+        if (codec := self.codecs.get(id)) is not None:
+            return codec
+        dictionary = self.client.get(f"{DICTIONARY_KEY}:{id}")
+        if dictionary is None:
+            logging.error(f"Compression dictionary {id} is missing")
+            return None
+        codec = self.codecs[id] = DictionaryCodec(dictionary)
+        return codec
+
+    def sample(self, val: bytes) -> None:
+        """Keep VAL to train the dictionary on, training it once enough were kept."""
+        if not self.dictionary or self.current_codec() is not None:
+            return
+        with self.codec_lock:
+            if self.codec is not None:
+                return
+            self.samples.append(val)
+            if sum(len(s) for s in self.samples) < self.dictionary_samples_bytes:
+                return
+            samples, self.samples = self.samples, []
+        self.publish_codec(DictionaryCodec(train_dictionary(samples)))
+
+    def publish_codec(self, codec: DictionaryCodec) -> None:
+        """Make CODEC the dictionary of every worker, unless another one published theirs first."""
+        key = f"{DICTIONARY_KEY}:{codec.id}"
+        self.client.set(key, codec.dictionary, ex=self.dictionary_ttl)
+        published = self.client.set(DICTIONARY_KEY, codec.id, ex=self.dictionary_ttl, nx=True)
+        if not published and (current := self.client.get(DICTIONARY_KEY)) is not None and int(current) == codec.id:
+            # Published again after only the dictionary itself was gone
+            published = self.client.expire(DICTIONARY_KEY, self.dictionary_ttl)
+        if published:
+            logging.info(f"Published compression dictionary {codec.id} of {len(codec.dictionary)} bytes")
+            self.codecs[codec.id] = codec
+            self.codec = codec
+            return
+        self.client.delete(key)
+        self.codec_checked = None
+        self.current_codec()
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.metrics) | {
+            "saved_bytes": self.metrics["raw_bytes"] - self.metrics["stored_bytes"],
+            "dictionary": self.codec.id if self.codec else 0,
+        }
+
+    def query(self, table: str, table_key: str, char: str, query: str) -> Generator[Any, None, None]:
         f = self.client.ft("movesIdx")
-        query = Query(f"@{table_key}:({char}) @input|name:({query})").slop(1)  # type: ignore
+        tag = re.sub(r"(\W)", r"\\\1", table.lower())
+        query = Query(f"@{TABLE_FIELD}:{{{tag}}} @{table_key}:({char}) @input|name:({query})").slop(1)  # type: ignore
         res = f.search(query)
         return (r.json for r in res.docs)
 
 
 class DictCache(Cache):
-    _data: dict[str, Any] = {}
+    """In memory cache used when Redis is unreachable.
+
+    Keys expire like they do in Redis and the least recently used ones are evicted once the
+    entry or byte budget is exceeded."""
+
+    expiry: int = RedisCache.expiry
+    max_entries: int = 10_000
+    max_bytes: int = 64 * 1024 * 1024
+
+    def __init__(self) -> None:
+        self._data = LRUStore(self.max_entries, self.expiry, max_bytes=self.max_bytes)
 
     def connect(self) -> None:
         return None
 
     def get(self, key: str) -> Optional[str]:
-        if key not in self._data:
-            return None
-
-        val = self._data[key]
-        if isinstance(val, str):
+        val = self._data.get(key)
+        if val is None or isinstance(val, str):
             return val
-        raise
+        raise TypeError(f"{key} does not hold a string")
 
     def set(self, key: str, val: str) -> Optional[bool]:
-        self._data[key] = val
+        self._data.set(key, val)
         return True
 
-    def get_list(self, key: str) -> list[str]:
-        if key not in self._data:
-            return []
+    def set_many(self, items: Mapping[str, str]) -> list[Any]:
+        return [self.set(key, val) for key, val in items.items()]
 
-        val = self._data[key]
+    def get_many(self, keys: Sequence[str]) -> list[Optional[str]]:
+        return [self.get(key) for key in keys]
+
+    def get_list(self, key: str) -> list[str]:
+        val = self._data.get(key)
         match val:
+            case None:
+                return []
             case list():
                 return val
             case _:
-                raise
+                raise TypeError(f"{key} does not hold a list")
 
     def set_list(self, key: str, val: list[str]) -> list[Any]:
-        self._data[key] = val
+        self._data.set(key, val)
         return val
 
     def set_json(self, key: str, val: Any, encoder: Callable[[Any], Any]) -> list[Any]:
-        self._data[key] = encoder(val)
+        self._data.set(key, encoder(val))
+        return []
+
+    def set_json_many(self, items: Mapping[str, Any], encoder: Callable[[Any], Any]) -> list[Any]:
+        for key, val in items.items():
+            self._data.set(key, encoder(val))
         return []
 
     def get_json(self, key: str) -> Any:
-        if key not in self._data:
-            return []
-        val = self._data[key]
+        val = self._data.get(key)
         match val:
+            case None:
+                return []
             case list() | dict():
                 return val
             case _:
-                self._data[key] = None
+                self._data.delete(key)
                 return None
 
-    def query(self, table_key: str, char: str, query: str) -> Generator[Any, None, None]:
-        return (v for k, v in self._data.values())
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        val = self._data.get(key)
+        if val is None or isinstance(val, bytes):
+            return val
+        raise TypeError(f"{key} does not hold bytes")
+
+    def set_bytes(self, key: str, val: bytes, sample: bool = False) -> Optional[bool]:
+        self._data.set(key, val)
+        return True
+
+    def set_bytes_many(self, items: Mapping[str, bytes], sample: bool = False) -> list[Any]:
+        return [self.set_bytes(key, val) for key, val in items.items()]
+
+    def query(self, table: str, table_key: str, char: str, query: str) -> Generator[Any, None, None]:
+        """Match QUERY against the input and name of the cached moves of CHAR in TABLE."""
+        needle = normalize(query)
+        chara = char.lower()
+        for key, doc in self._data.items():
+            # moves:{table}:{character}:{normalized input}
+            head, _, _ = key.rpartition(":")
+            prefix, _, rest = head.partition(":")
+            doc_table, _, doc_chara = rest.partition(":")
+            if prefix != "moves" or doc_table != table.lower() or doc_chara != chara or not isinstance(doc, dict):
+                continue
+            if any(isinstance(doc.get(f), str) and needle in normalize(doc[f]) for f in ("input", "name")):
+                yield dumps(doc)
 
 
 class FallbackCache(Cache):
@@ -167,6 +440,12 @@ class FallbackCache(Cache):
     def set(self, key: str, val: str) -> Optional[bool]:
         return self.selected_cache.set(key, val)
 
+    def set_many(self, items: Mapping[str, str]) -> list[Any]:
+        return self.selected_cache.set_many(items)
+
+    def get_many(self, keys: Sequence[str]) -> list[Optional[str]]:
+        return self.selected_cache.get_many(keys)
+
     def get_list(self, key: str) -> list[str]:
         return self.selected_cache.get_list(key)
 
@@ -176,8 +455,157 @@ class FallbackCache(Cache):
     def set_json(self, key: str, val: Any, encoder: Callable[[Any], Any]) -> list[Any]:
         return self.selected_cache.set_json(key, val, encoder)
 
+    def set_json_many(self, items: Mapping[str, Any], encoder: Callable[[Any], Any]) -> list[Any]:
+        return self.selected_cache.set_json_many(items, encoder)
+
     def get_json(self, key: str) -> Any:
         return self.selected_cache.get_json(key)
 
-    def query(self, table_key: str, char: str, query: str) -> Any:
-        return self.selected_cache.query(table_key, char, query)
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self.selected_cache.get_bytes(key)
+
+    def set_bytes(self, key: str, val: bytes, sample: bool = False) -> Optional[bool]:
+        return self.selected_cache.set_bytes(key, val, sample)
+
+    def set_bytes_many(self, items: Mapping[str, bytes], sample: bool = False) -> list[Any]:
+        return self.selected_cache.set_bytes_many(items, sample)
+
+    def query(self, table: str, table_key: str, char: str, query: str) -> Any:
+        return self.selected_cache.query(table, table_key, char, query)
+
+    def stats(self) -> dict[str, int]:
+        return self.selected_cache.stats()
+
+
+class LocalCache(Cache):
+    """In process cache tier in front of another cache.
+
+    Decoded values are kept in a bounded LRU store. When the backend is Redis, writes are
+    announced over pub/sub so every worker drops its local copy of the key."""
+
+    ttl: int = 60 * 5
+    max_entries: int = 1024
+
+    def __init__(self, backend: Cache) -> None:
+        self.backend = backend
+        self.local = LRUStore(self.max_entries, self.ttl)
+        self.id = uuid.uuid4().hex
+        self.publisher: Optional[redis.Redis] = None  # type: ignore
+        self.subscribe()
+
+    def subscribe(self) -> None:
+        """Listen for invalidations from other workers if the backend is Redis."""
+        selected = self.backend.selected_cache if isinstance(self.backend, FallbackCache) else self.backend
+        if not isinstance(selected, RedisCache):
+            return
+
+        try:
+            pubsub = selected.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATION_CHANNEL: self._on_invalidate})
+            pubsub.run_in_thread(sleep_time=1, daemon=True)
+            self.publisher = selected.client
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            logging.warning(f"Unable to subscribe to cache invalidations, disabling the local cache: {e}")
+            self.local = LRUStore(0, self.ttl)
+
+    def _on_invalidate(self, message: dict[str, Any]) -> None:
+        # Sender id, then the keys one per line
+        sender, _, keys = message["data"].decode("utf-8").partition(" ")
+        if sender != self.id:
+            for key in keys.split("\n"):
+                self.local.delete(key)
+
+    def invalidate(self, *keys: str) -> None:
+        """Drop KEYS from this worker and tell every other worker to do the same."""
+        for key in keys:
+            self.local.delete(key)
+        if self.publisher is None or not keys:
+            return
+        try:
+            self.publisher.publish(INVALIDATION_CHANNEL, " ".join((self.id, "\n".join(keys))))
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+            logging.error(f"Failed to publish an invalidation for {', '.join(keys)}: {e}")
+
+    def _cached(self, key: str, fetch: Callable[[str], Any]) -> Any:
+        if (val := self.local.get(key)) is not None:
+            return val
+        val = fetch(key)
+        if val:
+            self.local.set(key, val)
+        return val
+
+    def connect(self) -> None:
+        return self.backend.connect()
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cached(key, self.backend.get)  # type: ignore
+
+    def set(self, key: str, val: str) -> Optional[bool]:
+        res = self.backend.set(key, val)
+        self.invalidate(key)
+        self.local.set(key, val)
+        return res
+
+    def set_many(self, items: Mapping[str, str]) -> list[Any]:
+        res = self.backend.set_many(items)
+        self._stored(items)
+        return res
+
+    def get_many(self, keys: Sequence[str]) -> list[Optional[str]]:
+        found = {key: val for key in keys if (val := self.local.get(key)) is not None}
+        if missing := [key for key in keys if key not in found]:
+            for key, val in zip(missing, self.backend.get_many(missing)):
+                if val:
+                    self.local.set(key, val)
+                    found[key] = val
+        return [found.get(key) for key in keys]
+
+    def _stored(self, items: Mapping[str, Any]) -> None:
+        self.invalidate(*items)
+        for key, val in items.items():
+            self.local.set(key, val)
+
+    def get_list(self, key: str) -> list[str]:
+        return self._cached(key, self.backend.get_list)  # type: ignore
+
+    def set_list(self, key: str, vals: list[str]) -> list[Any]:
+        res = self.backend.set_list(key, vals)
+        self.invalidate(key)
+        self.local.set(key, vals)
+        return res
+
+    def set_json(self, key: str, val: Any, encoder: Callable[[Any], Any]) -> list[Any]:
+        encoded = encoder(val)
+        res = self.backend.set_json(key, encoded, lambda v: v)
+        self.invalidate(key)
+        self.local.set(key, encoded)
+        return res
+
+    def set_json_many(self, items: Mapping[str, Any], encoder: Callable[[Any], Any]) -> list[Any]:
+        encoded = {key: encoder(val) for key, val in items.items()}
+        res = self.backend.set_json_many(encoded, lambda v: v)
+        self._stored(encoded)
+        return res
+
+    def get_json(self, key: str) -> Any:
+        return self._cached(key, self.backend.get_json)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        return self._cached(key, self.backend.get_bytes)  # type: ignore
+
+    def set_bytes(self, key: str, val: bytes, sample: bool = False) -> Optional[bool]:
+        res = self.backend.set_bytes(key, val, sample)
+        self.invalidate(key)
+        self.local.set(key, val)
+        return res
+
+    def set_bytes_many(self, items: Mapping[str, bytes], sample: bool = False) -> list[Any]:
+        res = self.backend.set_bytes_many(items, sample)
+        self._stored(items)
+        return res
+
+    def query(self, table: str, table_key: str, char: str, query: str) -> Any:
+        return self.backend.query(table, table_key, char, query)
+
+    def stats(self) -> dict[str, int]:
+        return self.backend.stats()
@@ -0,0 +1,66 @@
+"""Compression of small JSON payloads with a shared preset dictionary."""
+import re
+import zlib
+from collections import Counter
+from typing import Sequence
+
+__all__ = ["DictionaryCodec", "train_dictionary"]
+
+# zlib only looks this far back, larger dictionaries are wasted
+MAX_DICTIONARY_BYTES = 32 * 1024
+
+# Share of the dictionary given to the most common key value pairs, the rest holds segments of the samples
+PAIRS_SHARE = 4
+# Bytes of a sample segment, and how far apart segments of the same sample are
+SEGMENT_BYTES = 256
+SEGMENT_STRIDE = 8 * SEGMENT_BYTES
+
+# A JSON object key with its value if the value is a scalar
+_PAIR = re.compile(rb'"(?:[^"\\]|\\.)*":(?:"(?:[^"\\]|\\.)*"|-?\d+(?:\.\d+)?|\[)?,?')
+
+
+def train_dictionary(samples: Sequence[bytes], size: int = MAX_DICTIONARY_BYTES) -> bytes:
+    """Build a preset dictionary out of SAMPLES of the values to compress.
+
+    The key value pairs that repeat the most across the samples go last, where they are
+    cheapest to reference, after segments of the most recent samples that capture the
+    overall layout of the documents."""
+    counts: Counter[bytes] = Counter()
+    for sample in samples:
+        counts.update(_PAIR.findall(sample))
+
+    ranked = sorted(((count * len(pair), pair) for pair, count in counts.items() if count > 1), reverse=True)
+    pairs: list[bytes] = []
+    total = 0
+    for _, pair in ranked:
+        if total + len(pair) > size // PAIRS_SHARE:
+            break
+        pairs.append(pair)
+        total += len(pair)
+
+    segments: list[bytes] = []
+    for sample in reversed(samples):
+        for i in range(0, len(sample), SEGMENT_STRIDE):
+            segment = sample[i : i + SEGMENT_BYTES]
+            if total + len(segment) > size:
+                return b"".join(reversed(segments)) + b"".join(reversed(pairs))
+            segments.append(segment)
+            total += len(segment)
+    return b"".join(reversed(segments)) + b"".join(reversed(pairs))
+
+
+class DictionaryCodec:
+    """Raw deflate with a preset dictionary, identified by the checksum of the dictionary."""
+
+    def __init__(self, dictionary: bytes, level: int = 6) -> None:
+        self.dictionary = dictionary
+        self.level = level
+        self.id = zlib.crc32(dictionary)
+
+    def compress(self, val: bytes) -> bytes:
+        c = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=self.dictionary)
+        return c.compress(val) + c.flush()
+
+    def decompress(self, val: bytes) -> bytes:
+        d = zlib.decompressobj(-zlib.MAX_WBITS, zdict=self.dictionary)
+        return d.decompress(val) + d.flush()
@@ -0,0 +1,96 @@
+"""Bounded in memory key value store."""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterator, Optional
+
+__all__ = ["LRUStore", "approximate_size"]
+
+
+def approximate_size(val: Any) -> int:
+    """Rough payload size of VAL in bytes, good enough for budgeting."""
+    match val:
+        case str() | bytes():
+            return len(val)
+        case list() | tuple():
+            return sum(approximate_size(v) for v in val)
+        case dict():
+            return sum(approximate_size(k) + approximate_size(v) for k, v in val.items())
+        case _:
+            return sys.getsizeof(val)
+
+
+class LRUStore:
+    """A thread safe mapping with per key expiry that evicts the least recently used keys."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: Optional[float],
+        max_bytes: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expiry deadline, size, value)
+        self._data: OrderedDict[str, tuple[Optional[float], int, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def _pop(self, key: str) -> None:
+        _, size, _ = self._data.pop(key)
+        self.bytes -= size
+
+    def get(self, key: str) -> Any:
+        """Return the value stored under KEY, None if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            deadline, _, val = entry
+            if deadline is not None and deadline <= self._clock():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return val
+
+    def set(self, key: str, val: Any, ttl: Optional[float] = None) -> None:
+        """Store VAL under KEY for TTL seconds, defaults to the store TTL."""
+        ttl = self.ttl if ttl is None else ttl
+        deadline = None if ttl is None else self._clock() + ttl
+        size = approximate_size(val) if self.max_bytes is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (deadline, size, val)
+            self.bytes += size
+            while self._data and (
+                len(self._data) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes)
+            ):
+                self._pop(next(iter(self._data)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def items(self) -> Iterator[tuple[str, Any]]:
+        """Iterate over a copy of the live entries without touching their recency."""
+        now = self._clock()
+        with self._lock:
+            entries = [(k, v) for k, (deadline, _, v) in self._data.items() if deadline is None or deadline > now]
+        return iter(entries)
@@ -0,0 +1,80 @@
+"""Versioned on disk cache of cargo table definitions."""
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Optional
+
+__all__ = ["SchemaCache", "schema_cache_path", "schemas"]
+
+# Bump whenever the stored format changes, older files are ignored
+SCHEMA_CACHE_VERSION = 1
+
+
+def schema_cache_path() -> Path:
+    if path := os.getenv("HUNTING_HAWK_SCHEMA_CACHE"):
+        return Path(path)
+    cache_home = os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "hunting_hawk" / "schemas.json"
+
+
+class SchemaCache:
+    """Table definitions keyed by wiki and table name, stored as a single JSON file."""
+
+    def __init__(self, path: Path, revalidate: bool = True) -> None:
+        self.path = path
+        # Whether definitions loaded from disk are checked against the wiki in the background
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+        self._tables: Optional[dict[str, Any]] = None
+
+    def _read(self) -> dict[str, Any]:
+        try:
+            data = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable schema cache {self.path}: {e}")
+            return {}
+
+        if isinstance(data, dict) and data.get("version") == SCHEMA_CACHE_VERSION:
+            return dict(data.get("tables", {}))
+        logging.info(f"Ignoring schema cache {self.path} from another version")
+        return {}
+
+    def _load(self) -> dict[str, Any]:
+        if self._tables is None:
+            self._tables = self._read()
+        return self._tables
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            return self._load().get(key)
+
+    def set(self, key: str, schema: Any) -> None:
+        """Store SCHEMA under KEY and write the file atomically."""
+        with self._lock:
+            tables = self._load()
+            if tables.get(key) == schema:
+                return
+            tables[key] = schema
+            data = json.dumps({"version": SCHEMA_CACHE_VERSION, "tables": tables}, indent=2, sort_keys=True)
+            tmp = None
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=".schemas")
+                with os.fdopen(fd, "w") as f:
+                    f.write(data)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logging.warning(f"Failed to write the schema cache {self.path}: {e}")
+                if tmp is not None:
+                    # Failed writes would otherwise leave a temp file each
+                    with contextlib.suppress(OSError):
+                        os.unlink(tmp)
+
+
+schemas = SchemaCache(schema_cache_path(), revalidate=os.getenv("HUNTING_HAWK_SCHEMA_REVALIDATE", "1") != "0")
@@ -0,0 +1,79 @@
+"""Serve cached values past their freshness while they are refreshed in the background."""
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from .cache import Cache
+
+__all__ = ["StaleWhileRevalidate"]
+
+
+class StaleWhileRevalidate:
+    """Track when cache keys were last written to tell fresh values from stale ones.
+
+    The write time of a key is stored under a sidecar key in the same cache, so the hard
+    expiry of the backend still applies and only values past the soft TTL get refreshed."""
+
+    prefix: str = "stamp:"
+
+    def __init__(self, cache: Cache, soft_ttl: int, clock: Callable[[], float] = time.time) -> None:
+        self.cache = cache
+        self.soft_ttl = soft_ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+
+    def touch(self, key: str) -> None:
+        """Mark KEY as freshly written."""
+        try:
+            self.cache.set(f"{self.prefix}{key}", str(self.clock()))
+        except Exception as e:
+            logging.error(f"Failed to stamp {key}: {e}")
+
+    def touch_many(self, keys: Iterable[str]) -> None:
+        """Mark every one of KEYS as freshly written at once."""
+        now = str(self.clock())
+        try:
+            self.cache.set_many({f"{self.prefix}{key}": now for key in keys})
+        except Exception as e:
+            logging.error(f"Failed to stamp keys: {e}")
+
+    def written(self, key: str) -> Optional[float]:
+        """Time KEY was last written, None if unknown."""
+        stamp = self.cache.get(f"{self.prefix}{key}")
+        try:
+            return float(stamp) if stamp is not None else None
+        except ValueError:
+            return None
+
+    def is_stale(self, key: str) -> bool:
+        """Whether the value of KEY is past the soft TTL, values without a stamp are stale."""
+        try:
+            written = self.written(key)
+        except Exception as e:
+            logging.error(f"Failed to read the stamp of {key}: {e}")
+            return False
+        return written is None or self.clock() - written >= self.soft_ttl
+
+    def revalidate(self, key: str, refresh: Callable[[], bool]) -> bool:
+        """Run REFRESH for KEY unless KEY is fresh or a refresh of KEY is already running.
+
+        REFRESH returns whether it stored a new value, KEY is only stamped then so a
+        refresh that came back empty is retried. Returns whether REFRESH ran."""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+        try:
+            # Refreshes queued behind one that already finished have nothing left to do
+            if not self.is_stale(key):
+                return False
+            if refresh():
+                self.touch(key)
+        except Exception as e:
+            logging.error(f"Refreshing {key} failed with {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+        return True
@@ -0,0 +1,399 @@
+import time
+from json import dumps, loads
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
+
+import pytest
+
+from .cache import DICTIONARY, DICTIONARY_KEY, RAW, ZLIB, DictCache, LocalCache, RedisCache
+from .codec import DictionaryCodec, train_dictionary
+from .lru import LRUStore
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingCache(DictCache):
+    def __init__(self) -> None:
+        super().__init__()
+        self.reads = 0
+
+    def get_json(self, key: str) -> Any:
+        self.reads += 1
+        return super().get_json(key)
+
+
+def test_lru_store_evicts_least_recently_used() -> None:
+    store = LRUStore(2, None)
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1
+    store.set("c", 3)
+
+    assert store.get("b") is None
+    assert store.get("a") == 1
+    assert store.get("c") == 3
+    assert len(store) == 2
+
+
+def test_lru_store_expires() -> None:
+    clock = Clock()
+    store = LRUStore(2, 10, clock=clock)
+    store.set("a", 1)
+    store.set("b", 2, ttl=30)
+    clock.now = 10
+
+    assert store.get("a") is None
+    assert store.get("b") == 2
+
+
+def test_local_cache_serves_hits_locally() -> None:
+    backend = CountingCache()
+    cache = LocalCache(backend)
+    key = "moves:test_local:ky:236s"
+    cache.set_json(key, {"input": "236S"}, lambda v: v)
+
+    assert cache.get_json(key) == {"input": "236S"}
+    assert backend.reads == 0
+
+    cache.local.clear()
+    assert cache.get_json(key) == {"input": "236S"}
+    assert cache.get_json(key) == {"input": "236S"}
+    assert backend.reads == 1
+
+
+def test_local_cache_invalidation() -> None:
+    cache = LocalCache(DictCache())
+    cache.set_list("characterlist_test_local", ["Ky Kiske"])
+
+    # Messages published by this worker are ignored
+    cache._on_invalidate({"data": f"{cache.id} characterlist_test_local".encode()})
+    assert "characterlist_test_local" in cache.local
+
+    cache._on_invalidate({"data": b"other-worker characterlist_test_local"})
+    assert "characterlist_test_local" not in cache.local
+    assert cache.get_list("characterlist_test_local") == ["Ky Kiske"]
+
+
+def test_local_cache_bulk_writes() -> None:
+    backend = CountingCache()
+    cache = LocalCache(backend)
+    docs = {"moves:test_bulk:ky:236s": {"input": "236S"}, "moves:test_bulk:ky:623s": {"input": "623S"}}
+    cache.set_json_many(docs, lambda v: v)
+
+    assert [cache.get_json(k) for k in docs] == list(docs.values())
+    assert backend.reads == 0
+    # One message invalidates every key of a bulk write
+    cache._on_invalidate({"data": b"other-worker " + "\n".join(docs).encode()})
+    assert not any(k in cache.local for k in docs)
+    assert [cache.get_json(k) for k in docs] == list(docs.values())
+
+
+def test_dict_cache_is_bounded() -> None:
+    cache = DictCache()
+    cache._data = LRUStore(3, cache.expiry, max_bytes=12)
+    cache.set("a", "1234")
+    cache.set("b", "1234")
+    cache.set("c", "1234")
+    cache.set("d", "1234")
+
+    assert cache.get("a") is None
+    assert cache.get("d") == "1234"
+    assert cache._data.bytes <= 12
+
+
+def test_dict_cache_expires() -> None:
+    clock = Clock()
+    cache = DictCache()
+    cache._data = LRUStore(10, cache.expiry, clock=clock)
+    cache.set_list("characterlist_test", ["Ky Kiske"])
+    clock.now = cache.expiry
+
+    assert cache.get_list("characterlist_test") == []
+
+
+def test_dict_cache_query() -> None:
+    cache = DictCache()
+    moves = {
+        "moves:movedata_ggst:ky kiske:236S": {"chara": "Ky Kiske", "input": "236S", "name": "Stun Edge"},
+        "moves:movedata_ggst:ky kiske:623S": {"chara": "Ky Kiske", "input": "623S", "name": "Vapor Thrust"},
+        "moves:movedata_ggst:sol badguy:236S": {"chara": "Sol Badguy", "input": "236S", "name": "Gun Flame"},
+    }
+    for key, move in moves.items():
+        cache.set_json(key, move, lambda v: v)
+
+    assert [loads(r)["name"] for r in cache.query("MoveData_GGST", "chara", "Ky Kiske", "236S")] == ["Stun Edge"]
+    assert [loads(r)["name"] for r in cache.query("MoveData_GGST", "chara", "Ky Kiske", "vapor")] == ["Vapor Thrust"]
+    assert list(cache.query("MoveData_GGST", "chara", "Ky Kiske", "41236H")) == []
+
+
+def test_dict_cache_query_stays_in_the_table() -> None:
+    cache = DictCache()
+    moves = {
+        "moves:movedata_ggst:ky kiske:236S": {"chara": "Ky Kiske", "input": "236S", "name": "Stun Edge"},
+        "moves:movedata_ggacr:ky kiske:236S": {"chara": "Ky Kiske", "input": "236S", "name": "Stun Edge (Ground)"},
+    }
+    for key, move in moves.items():
+        cache.set_json(key, move, lambda v: v)
+
+    assert [loads(r)["name"] for r in cache.query("MoveData_GGACR", "chara", "Ky Kiske", "236S")] == [
+        "Stun Edge (Ground)"
+    ]
+    assert [loads(r)["name"] for r in cache.query("MoveData_GGST", "chara", "Ky Kiske", "236S")] == ["Stun Edge"]
+    assert list(cache.query("MoveData_BBCF", "chara", "Ky Kiske", "236S")) == []
+
+
+def test_bytes_roundtrip() -> None:
+    cache = LocalCache(DictCache())
+    cache.set_bytes("body:movedata_test:ky kiske", b'[{"input":"236S"}]')
+    cache.local.clear()
+
+    assert cache.get_bytes("body:movedata_test:ky kiske") == b'[{"input":"236S"}]'
+    assert cache.get_bytes("body:movedata_test:sol badguy") is None
+
+
+class FakeRedis:
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.ttls: dict[str, int] = {}
+        self.executed = 0
+        self.searches: list[str] = []
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.data.get(key)
+
+    def mget(self, keys: list[str]) -> list[Optional[bytes]]:
+        self.executed += 1
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key: str, val: Any, ex: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        if nx and key in self.data:
+            return None
+        self.data[key] = val if isinstance(val, bytes) else str(val).encode("utf-8")
+        self.ttls.pop(key, None)
+        if ex is not None:
+            self.ttls[key] = ex
+        return True
+
+    def expire(self, key: str, ex: int) -> bool:
+        if key not in self.data:
+            return False
+        self.ttls[key] = ex
+        return True
+
+    def delete(self, key: str) -> int:
+        return int(self.data.pop(key, None) is not None)
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    def ft(self, index: str) -> "FakeRedis":
+        return self
+
+    def search(self, query: Any) -> Any:
+        self.searches.append(query.query_string())
+        return SimpleNamespace(docs=[])
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis) -> None:
+        self.client = client
+        self.commands: list[Callable[[], Any]] = []
+
+    def set(self, key: str, val: Any, ex: Optional[int] = None) -> None:
+        self.commands.append(lambda: self.client.set(key, val, ex=ex))
+
+    def expire(self, key: str, ex: int) -> None:
+        self.commands.append(lambda: self.client.expire(key, ex))
+
+    def execute(self) -> list[Any]:
+        self.client.executed += 1
+        return [command() for command in self.commands]
+
+
+def frame_data(i: int) -> bytes:
+    move = {
+        "chara": "Ky Kiske",
+        "input": f"{i}S",
+        "name": f"Move {i}",
+        "damage": str(20 + i % 7),
+        "startup": str(5 + i % 11),
+        "active": "3",
+        "recovery": str(10 + i % 13),
+        "onBlock": f"-{i % 9}",
+        "guard": "Mid",
+        "images": [f"https://www.dustloop.com/wiki/images/{i}.png"],
+    }
+    return dumps(move, separators=(",", ":")).encode("utf-8")
+
+
+@pytest.fixture
+def redis_cache(monkeypatch: pytest.MonkeyPatch) -> RedisCache:
+    cache = RedisCache()
+    for key, val in {
+        "client": FakeRedis(),
+        "metrics": type(cache.metrics)(),
+        "codec": None,
+        "codecs": {},
+        "codec_checked": None,
+        "samples": [],
+    }.items():
+        monkeypatch.setitem(RedisCache._shared_state, key, val)
+    return cache
+
+
+def test_train_dictionary() -> None:
+    samples = [frame_data(i) for i in range(100)]
+    dictionary = train_dictionary(samples, size=512)
+
+    assert 0 < len(dictionary) <= 512
+    # The most valuable pairs end up last
+    assert dictionary.endswith(b'"chara":"Ky Kiske",')
+    codec = DictionaryCodec(dictionary)
+    assert codec.decompress(codec.compress(samples[0])) == samples[0]
+
+
+def test_redis_dictionary_encoding(redis_cache: RedisCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(RedisCache, "dictionary", True)
+    monkeypatch.setattr(RedisCache, "dictionary_samples_bytes", 10_000)
+    samples = [frame_data(i) for i in range(100)]
+    # Other values are not what the dictionary is trained for
+    redis_cache.set_bytes("fileurls:test", dumps({f"{i}.png": f"/{i}.png" for i in range(1000)}).encode())
+    assert redis_cache.samples == []
+    for i, sample in enumerate(samples):
+        redis_cache.set_bytes(f"body:movedata_test:ky kiske:{i}s", sample, sample=True)
+    assert redis_cache.codec is not None
+
+    move = frame_data(1000)
+    encoded = redis_cache.encode_bytes(move)
+    assert encoded.startswith(DICTIONARY)
+    assert len(encoded) < len(move) // 5
+    assert redis_cache.decode_bytes(encoded) == move
+
+    # Other workers load the published dictionary to decode it
+    redis_cache.codecs.clear()
+    assert redis_cache.decode_bytes(encoded) == move
+    stats = redis_cache.stats()
+    assert stats["values_dictionary"] >= 1
+    assert stats["saved_bytes"] == stats["raw_bytes"] - stats["stored_bytes"] > 0
+
+    # Values whose dictionary is gone are misses
+    client = redis_cache.client
+    assert isinstance(client, FakeRedis)
+    client.data.clear()
+    redis_cache.codecs.clear()
+    assert redis_cache.decode_bytes(encoded) is None
+
+
+def test_redis_dictionary_is_picked_up_and_kept_alive(redis_cache: RedisCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(RedisCache, "dictionary", True)
+    client = redis_cache.client
+    assert isinstance(client, FakeRedis)
+    now = 0.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+
+    # Started before any worker published a dictionary
+    assert redis_cache.current_codec() is None
+    codec = DictionaryCodec(train_dictionary([frame_data(i) for i in range(100)]))
+    client.set(f"{DICTIONARY_KEY}:{codec.id}", codec.dictionary, ex=redis_cache.dictionary_ttl)
+    client.set(DICTIONARY_KEY, codec.id, ex=redis_cache.dictionary_ttl)
+    assert redis_cache.current_codec() is None
+
+    # Values compressed by the other worker trigger a check right away
+    encoded = DICTIONARY + codec.id.to_bytes(4, "big") + codec.compress(frame_data(1))
+    assert redis_cache.decode_bytes(encoded) == frame_data(1)
+    current = redis_cache.current_codec()
+    assert current is not None and current.id == codec.id
+
+    # The dictionary in use outlives the values written with it
+    client.ttls.clear()
+    assert redis_cache.encode_bytes(frame_data(2)).startswith(DICTIONARY)
+    assert client.ttls == {}
+    now = redis_cache.dictionary_recheck_seconds
+    redis_cache.encode_bytes(frame_data(3))
+    assert client.ttls == {DICTIONARY_KEY: redis_cache.dictionary_ttl, f"{DICTIONARY_KEY}:{codec.id}": redis_cache.dictionary_ttl}
+    assert redis_cache.dictionary_ttl > redis_cache.expiry
+
+
+def test_redis_dictionary_is_published_again(redis_cache: RedisCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(RedisCache, "dictionary", True)
+    client = redis_cache.client
+    assert isinstance(client, FakeRedis)
+    now = 0.0
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    codec = DictionaryCodec(train_dictionary([frame_data(i) for i in range(100)]))
+    redis_cache.publish_codec(codec)
+    encoded = redis_cache.encode_bytes(frame_data(1))
+
+    # Evicted while this worker kept using it
+    for key in (DICTIONARY_KEY, f"{DICTIONARY_KEY}:{codec.id}"):
+        client.delete(key)
+        now += redis_cache.dictionary_recheck_seconds
+        current = redis_cache.current_codec()
+        assert current is not None and current.id == codec.id
+        assert client.get(DICTIONARY_KEY) == str(codec.id).encode()
+        assert client.ttls[f"{DICTIONARY_KEY}:{codec.id}"] == redis_cache.dictionary_ttl
+
+    # Other workers can read what was compressed with it again
+    redis_cache.codecs.clear()
+    assert redis_cache.decode_bytes(encoded) == frame_data(1)
+
+    # Another worker published theirs in the meantime
+    other = DictionaryCodec(train_dictionary([frame_data(i) for i in range(50)], size=1024))
+    client.delete(DICTIONARY_KEY)
+    client.set(f"{DICTIONARY_KEY}:{other.id}", other.dictionary)
+    client.set(DICTIONARY_KEY, other.id)
+    client.delete(f"{DICTIONARY_KEY}:{codec.id}")
+    now += redis_cache.dictionary_recheck_seconds
+    current = redis_cache.current_codec()
+    assert current is not None and current.id == other.id
+    assert f"{DICTIONARY_KEY}:{codec.id}" not in client.data
+
+
+def test_redis_bytes_encoding(redis_cache: RedisCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(RedisCache, "dictionary", False)
+    cache = redis_cache
+    small = b'{"input":"236S"}'
+    large = b"[" + b",".join([small] * 200) + b"]"
+
+    assert cache.encode_bytes(small) == RAW + small
+    assert cache.encode_bytes(large).startswith(ZLIB)
+    assert len(cache.encode_bytes(large)) < len(large) // 10
+    for val in (small, large, b""):
+        assert cache.decode_bytes(cache.encode_bytes(val)) == val
+
+
+def test_redis_bulk_writes_are_pipelined(redis_cache: RedisCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(RedisCache, "dictionary", False)
+    monkeypatch.setattr(RedisCache, "pipeline_keys", 2)
+    bodies = {f"body:movedata_test:ky kiske:{i}s": frame_data(i) for i in range(5)}
+    redis_cache.set_bytes_many(bodies)
+
+    client = redis_cache.client
+    assert isinstance(client, FakeRedis)
+    assert client.executed == 3
+    assert {k: redis_cache.get_bytes(k) for k in bodies} == bodies
+
+
+def test_redis_get_many(redis_cache: RedisCache, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(RedisCache, "pipeline_keys", 2)
+    redis_cache.set_many({"fileurls:a": "/a.png", "fileurls:c": "/c.png"})
+    client = redis_cache.client
+    assert isinstance(client, FakeRedis)
+    client.executed = 0
+
+    assert redis_cache.get_many(["fileurls:a", "fileurls:b", "fileurls:c"]) == ["/a.png", None, "/c.png"]
+    assert client.executed == 2
+
+
+def test_redis_query_stays_in_the_table(redis_cache: RedisCache) -> None:
+    client = redis_cache.client
+    assert isinstance(client, FakeRedis)
+
+    assert list(redis_cache.query("MoveData_GGST", "chara", "Ky Kiske", "236S")) == []
+    assert client.searches == ["@table:{movedata_ggst} @chara:(Ky Kiske) @input|name:(236S)"]
@@ -0,0 +1,68 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from hunting_hawk.mediawiki.cargo import CargoClient, CargoField, CargoFields
+from hunting_hawk.sources import fetcher
+
+from .schema import SCHEMA_CACHE_VERSION, SchemaCache
+
+FIELDS = CargoFields(cargofields={"chara": CargoField(type="String"), "images": CargoField(type="File", isList="")})
+
+test_cargo = CargoClient(
+    "https://example.com",
+    "/wiki",
+    "/api.php",
+    "?title=Special:CargoExport",
+    "/Special:CargoTables",
+)
+
+
+def test_schema_cache_roundtrip(tmp_path: Path) -> None:
+    path = tmp_path / "nested" / "schemas.json"
+    SchemaCache(path).set("wiki:MoveData_Test", FIELDS.dict())
+
+    assert CargoFields.parse_obj(SchemaCache(path).get("wiki:MoveData_Test")) == FIELDS
+    assert json.loads(path.read_text())["version"] == SCHEMA_CACHE_VERSION
+
+
+def test_schema_cache_ignores_other_versions(tmp_path: Path) -> None:
+    path = tmp_path / "schemas.json"
+    path.write_text(json.dumps({"version": -1, "tables": {"wiki:MoveData_Test": FIELDS.dict()}}))
+    assert SchemaCache(path).get("wiki:MoveData_Test") is None
+
+    path.write_text("{")
+    assert SchemaCache(path).get("wiki:MoveData_Test") is None
+
+
+def test_failed_writes_leave_no_temp_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def replace(src: str, dst: str) -> None:
+        raise OSError("read-only")
+
+    monkeypatch.setattr(os, "replace", replace)
+    SchemaCache(tmp_path / "schemas.json").set("wiki:MoveData_Test", FIELDS.dict())
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_fetcher_boots_from_schema_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    def parse_cargo_fields(*_: object) -> CargoFields:
+        calls.append(1)
+        return FIELDS
+
+    monkeypatch.setattr(fetcher, "parse_cargo_fields", parse_cargo_fields)
+    schemas = SchemaCache(tmp_path / "schemas.json", revalidate=False)
+
+    cold = fetcher.CargoFetcher(test_cargo, "MoveData_Test")
+    cold.schemas = schemas
+    assert hasattr(cold.move(), "images")
+    assert len(calls) == 1
+
+    warm = fetcher.CargoFetcher(test_cargo, "MoveData_Test")
+    warm.schemas = SchemaCache(schemas.path, revalidate=False)
+    assert hasattr(warm.move(), "images")
+    assert len(calls) == 1
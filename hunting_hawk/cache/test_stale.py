@@ -0,0 +1,63 @@
+import threading
+
+from .cache import DictCache
+from .stale import StaleWhileRevalidate
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_values_go_stale_after_the_soft_ttl() -> None:
+    clock = Clock()
+    freshness = StaleWhileRevalidate(DictCache(), 10, clock=clock)
+
+    # Values cached without a stamp are refreshed
+    assert freshness.is_stale("characterlist_test")
+    freshness.touch("characterlist_test")
+    assert not freshness.is_stale("characterlist_test")
+    clock.now = 10
+    assert freshness.is_stale("characterlist_test")
+
+
+def test_revalidate_refreshes_once() -> None:
+    clock = Clock()
+    freshness = StaleWhileRevalidate(DictCache(), 10, clock=clock)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def refresh() -> bool:
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return True
+
+    thread = threading.Thread(target=freshness.revalidate, args=("moves:test:ky:236s", refresh))
+    thread.start()
+    assert started.wait(5)
+    # A refresh of the same key is already running
+    assert not freshness.revalidate("moves:test:ky:236s", refresh)
+    release.set()
+    thread.join()
+
+    # Queued refreshes see the fresh stamp
+    assert not freshness.revalidate("moves:test:ky:236s", refresh)
+    assert calls == [1]
+    assert not freshness.is_stale("moves:test:ky:236s")
+
+
+def test_failed_refresh_stays_stale() -> None:
+    freshness = StaleWhileRevalidate(DictCache(), 10, clock=Clock())
+
+    def refresh() -> bool:
+        raise ValueError("Upstream is down")
+
+    assert freshness.revalidate("characterlist_test", refresh)
+    assert freshness.is_stale("characterlist_test")
+    # Nothing came back, the stale value is kept and refreshed again later
+    assert freshness.revalidate("characterlist_test", lambda: False)
+    assert freshness.is_stale("characterlist_test")
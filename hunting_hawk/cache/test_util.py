@@ -0,0 +1,47 @@
+from typing import Any
+
+import time
+
+import pytest
+from redis.exceptions import ConnectionError
+
+from . import util
+
+
+class Session:
+    def __init__(self, **kwargs: Any) -> None:
+        self.kwargs = kwargs
+
+
+def test_requests_session_retries_redis(monkeypatch: pytest.MonkeyPatch) -> None:
+    up = False
+    now = 0.0
+
+    class Client:
+        def ping(self) -> bool:
+            if not up:
+                raise ConnectionError("down")
+            return True
+
+    class Cache:
+        client = Client()
+
+    monkeypatch.setattr(util, "CargoCache", Cache)
+    monkeypatch.setattr(util, "RedisCache", lambda connection: connection)
+    monkeypatch.setattr(util, "CachedSession", Session)
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    monkeypatch.setattr(util, "_redis_session", None)
+    monkeypatch.setattr(util, "_fallback_session", None)
+
+    fallback: Any = util.get_requests_session()
+    assert fallback.kwargs == {"use_temp": True}
+
+    # Redis is not asked again until the retry interval passed
+    up = True
+    assert util.get_requests_session() is fallback
+    now = util.REDIS_RETRY_SECONDS
+    redis: Any = util.get_requests_session()
+    assert "backend" in redis.kwargs
+
+    up = False
+    assert util.get_requests_session() is redis
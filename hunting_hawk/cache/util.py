@@ -1,24 +1,59 @@
 import logging
+import threading
+import time
+from functools import cache
+from typing import Optional
 
-from redis.commands.search.field import TextField
+from redis.commands.search.field import TagField, TextField
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 from redis.exceptions import ConnectionError, ResponseError, TimeoutError
 from requests_cache import CachedSession, RedisCache  # type: ignore
 
+from .cache import TABLE_FIELD, Cache, FallbackCache
 from .cache import RedisCache as CargoCache
 
 TABLE_NAME = "movesIdx"
+# Fields of the moves the index covers, the only ones stored in the indexed documents
+SEARCH_FIELDS = ("chara", "name", "input")
+
+
+# Seconds between attempts to reconnect to Redis while the temp file session is used
+REDIS_RETRY_SECONDS = 60
+
+_session_lock = threading.Lock()
+_redis_session: Optional[CachedSession] = None
+# The temp file session and when Redis was last found unreachable
+_fallback_session: Optional[tuple[CachedSession, float]] = None
 
 
 # TODO: definitely not the right place for this
 def get_requests_session() -> CachedSession:
-    try:
-        backend = RedisCache(connection=CargoCache().client)
-        CargoCache().client.ping()
-        return CachedSession(backend=backend, expire_after=60 * 60 * 24)
-    except (AttributeError, ValueError, ConnectionError, TimeoutError) as e:
-        logging.warning(f"Unable to connect to Redis, falling back to temp files: {e}")
-        return CachedSession(use_temp=True)
+    """Session caching responses in Redis, in temp files while Redis is unreachable.
+
+    Only the Redis session is kept for good, Redis is tried again every
+    REDIS_RETRY_SECONDS while the temp file session is in use."""
+    global _redis_session, _fallback_session
+    with _session_lock:
+        if _redis_session is not None:
+            return _redis_session
+        if _fallback_session is not None and time.monotonic() - _fallback_session[1] < REDIS_RETRY_SECONDS:
+            return _fallback_session[0]
+        try:
+            backend = RedisCache(connection=CargoCache().client)
+            CargoCache().client.ping()
+            _redis_session = CachedSession(backend=backend, expire_after=60 * 60 * 24)
+            return _redis_session
+        except (AttributeError, ValueError, ConnectionError, TimeoutError) as e:
+            logging.warning(f"Unable to connect to Redis, falling back to temp files: {e}")
+            session = _fallback_session[0] if _fallback_session is not None else CachedSession(use_temp=True)
+            _fallback_session = (session, time.monotonic())
+            return session
+
+
+@cache
+def get_http_cache() -> Cache:
+    """Shared cache for responses fetched outside of requests-cache."""
+    return FallbackCache()
 
 
 def create_redis_index() -> None:
@@ -32,9 +67,8 @@ def create_redis_index() -> None:
             return
 
         schema = (
-            TextField("$.chara", as_name="chara", phonetic_matcher="dm:en"),
-            TextField("$.name", as_name="name", phonetic_matcher="dm:en"),
-            TextField("$.input", as_name="input", phonetic_matcher="dm:en"),
+            TagField(f"$.{TABLE_FIELD}", as_name=TABLE_FIELD),
+            *(TextField(f"$.{f}", as_name=f, phonetic_matcher="dm:en") for f in SEARCH_FIELDS),
         )
 
         rs = c.ft(TABLE_NAME)
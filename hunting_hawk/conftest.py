@@ -0,0 +1,39 @@
+from typing import Any
+
+import pytest
+
+from hunting_hawk.mediawiki import client, imageinfo
+
+# The wiki of the fake clients, and where it serves its files from
+API_ENDPOINT = "https://example.com/api.php"
+CDN = "https://cdn.example.com/images"
+
+
+@pytest.fixture
+def cdn() -> str:
+    return CDN
+
+
+@pytest.fixture
+def fake_api(monkeypatch: pytest.MonkeyPatch) -> list[list[str]]:
+    """Answer imageinfo requests for every file but Missing.png, returns the requested titles."""
+    requests: list[list[str]] = []
+
+    def get(_: client.Client, path: str, params: dict[str, Any]) -> dict[str, Any]:
+        assert path == API_ENDPOINT and params["iiprop"] == "url"
+        titles = params["titles"].split("|")
+        requests.append(titles)
+        # Underscores are normalized to spaces like the wiki does
+        normalized = [{"from": t, "to": t.replace("_", " ")} for t in titles if "_" in t]
+        pages = {}
+        for i, title in enumerate(t.replace("_", " ") for t in titles):
+            page: dict[str, Any] = {"ns": 6, "title": title, "imagerepository": "local"}
+            if title == "File:Missing.png":
+                page |= {"missing": "", "imagerepository": ""}
+            else:
+                page["imageinfo"] = [{"url": f"{CDN}/{title.removeprefix('File:')}"}]
+            pages[str(-i - 1 if "missing" in page else i + 1)] = page
+        return {"batchcomplete": "", "query": {"normalized": normalized, "pages": pages}}
+
+    monkeypatch.setattr(imageinfo, "get", get)
+    return requests
@@ -1,12 +1,15 @@
 """Cargo wrapper."""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field, make_dataclass
-from typing import Any, Generator, List, Literal, NewType, Optional, TypedDict
+from typing import Any, AsyncIterator, Generator, Iterator, List, Literal, NewType, Optional, TypedDict
 
 from pydantic import BaseModel, ValidationError
 from pydantic.dataclasses import DataclassProxy
 from pydantic.dataclasses import dataclass as pydantic_dataclass
 
-from .client import Client, ClientError, cached_get, get
+from .client import Client, ClientError, acached_get, aget, cached_get, get
 
 DEFAULT_TABLE_EXPORT_PATH = "?title=Special:CargoExport"
 DEFAULT_TABLES_PATH = "Special:CargoTables"
@@ -159,17 +162,10 @@ class CargoParseError(CargoError):
     """Exception class for cargo exceptions related to parsing Cargo tables."""
 
 
-def parse_cargo_table(client: Client, table_name: str) -> DataclassProxy:
-    """Dynamically construct a type for a cargo table with TABLE_NAME."""
-    params = CargoFieldsParams(table=table_name).__dict__
-    res = cached_get(client, client.api_endpoint(), params)
-    try:
-        c = CargoFields.parse_obj(res)
-
-    except ValidationError as e:
-        raise TypeError("Failed to unmarshal the model") from e
-
-    fields = [(k, Optional[to_type(v)], field(default=None)) for k, v in c.cargofields.items()]
+def build_table_type(table_name: str, c: CargoFields) -> DataclassProxy:
+    """Construct a type for TABLE_NAME from its field definitions."""
+    # Keep the cargo definition around for decoders, e.g. for list delimiters
+    fields = [(k, Optional[to_type(v)], field(default=None, metadata={"cargo": v})) for k, v in c.cargofields.items()]
     result = make_dataclass(table_name, fields, frozen=True)  # type: ignore
     proxy = pydantic_dataclass(result)
 
@@ -180,6 +176,45 @@ def parse_cargo_table(client: Client, table_name: str) -> DataclassProxy:
             raise CargoParseError(f"Failed to construct a data class proxy for {table_name}. Got {default}")
 
 
+def _cargo_fields(res: list[str] | dict[Any, Any]) -> CargoFields:
+    try:
+        return CargoFields.parse_obj(res)
+
+    except ValidationError as e:
+        raise TypeError("Failed to unmarshal the model") from e
+
+
+def _table_type(table_name: str, res: list[str] | dict[Any, Any]) -> DataclassProxy:
+    """Construct a type for TABLE_NAME from a cargofields response RES."""
+    return build_table_type(table_name, _cargo_fields(res))
+
+
+def parse_cargo_fields(client: Client, table_name: str) -> CargoFields:
+    """Retrieve the field definitions of the cargo table TABLE_NAME."""
+    params = CargoFieldsParams(table=table_name).__dict__
+    return _cargo_fields(cached_get(client, client.api_endpoint(), params))
+
+
+def parse_cargo_table(client: Client, table_name: str) -> DataclassProxy:
+    """Dynamically construct a type for a cargo table with TABLE_NAME."""
+    return build_table_type(table_name, parse_cargo_fields(client, table_name))
+
+
+async def aparse_cargo_table(client: Client, table_name: str) -> DataclassProxy:
+    """Dynamically construct a type for a cargo table with TABLE_NAME without blocking."""
+    params = CargoFieldsParams(table=table_name).__dict__
+    res = await acached_get(client, client.api_endpoint(), params)
+    return _table_type(table_name, res)
+
+
+def _export_result(res: list[str] | dict[Any, Any]) -> list[Any]:
+    match res:
+        case list():
+            return res
+        case _:
+            raise CargoParseError("Endpoint expected to return list.")
+
+
 def cargo_export(cargo: CargoClient, params: CargoParameters) -> list[Any]:
     # TODO: Leaky Typing
     """Call the export point. Caches the URL."""
@@ -190,8 +225,127 @@ def cargo_export(cargo: CargoClient, params: CargoParameters) -> list[Any]:
     except ClientError as e:
         raise CargoNetworkError from e
 
-    match res:
-        case list():
-            return res
-        case _:
-            raise CargoParseError("Endpoint expected to return list.")
+    return _export_result(res)
+
+
+async def acargo_export(cargo: CargoClient, params: CargoParameters) -> list[Any]:
+    """Call the export point without blocking the event loop."""
+    try:
+        res = await aget(cargo, cargo.export_endpoint(), dict(params))
+    except ClientError as e:
+        raise CargoNetworkError from e
+
+    return _export_result(res)
+
+
+def _paged(cargo: CargoClient, params: CargoParameters) -> tuple[CargoParameters, Optional[int]]:
+    """Split PARAMS into the parameters shared by every page and the total row limit."""
+    base = CargoParameters(**params)
+    total = base.pop("limit", None)
+    base.pop("offset", None)
+    if "order_by" not in base:
+        # Offsets are only meaningful in a stable order
+        match base:
+            case {"group_by": group_by}:
+                base["order_by"] = group_by
+            case {"tables": str(tables)}:
+                base["order_by"] = f"{tables.split(',')[0].strip()}._ID"
+            case {"tables": [table, *_]}:
+                base["order_by"] = f"{table}._ID"
+    return base, total
+
+
+# Wikis cap pages at $wgCargoMaxQueryLimit rows, never at fewer than this. A shorter page
+# always ends an export, a longer one short of the limit may have been capped
+MIN_PAGE_CAP = 100
+# Page caps confirmed per export endpoint
+_page_caps: dict[str, int] = {}
+# Shared by every export, each one keeps at most one page in flight
+_prefetch = ThreadPoolExecutor(8, thread_name_prefix="cargo-export")
+
+
+class _Pages:
+    """Offsets and sizes of the pages of an export, detecting wikis capping the page size."""
+
+    def __init__(self, cargo: CargoClient, total: Optional[int]) -> None:
+        self.endpoint = cargo.export_endpoint()
+        self.total = total
+        self.limit = min(cargo.limit, _page_caps.get(self.endpoint, cargo.limit))
+        self.probing = False
+        self.offset = 0
+
+    def size(self, offset: int) -> int:
+        return self.limit if self.total is None else min(self.limit, self.total - offset)
+
+    def advance(self, rows: int, size: int) -> bool:
+        """Move past a page of ROWS rows out of SIZE requested, returns whether it was the last one."""
+        self.offset += rows
+        if self.probing:
+            self.probing = False
+            if rows:
+                logging.warning(f"{self.endpoint} caps pages at {self.limit} rows")
+                _page_caps[self.endpoint] = self.limit
+        if size <= 0 or rows == 0:
+            return True
+        if rows >= size:
+            return False
+        if self.endpoint not in _page_caps and rows >= MIN_PAGE_CAP:
+            # The next page tells a capped page from the end of the table
+            self.limit = rows
+            self.probing = True
+            return False
+        return True
+
+
+def iter_cargo_export(cargo: CargoClient, params: CargoParameters, prefetch: bool = True) -> Iterator[Any]:
+    """Yield every row matching PARAMS, walking pages of CARGO.limit rows with limit and offset.
+
+    A limit in PARAMS caps the total number of rows. With PREFETCH the next page is requested
+    while the rows of the current one are consumed, at most two pages are held at a time."""
+    base, total = _paged(cargo, params)
+    pages = _Pages(cargo, total)
+
+    def fetch(offset: int) -> tuple[list[Any], int]:
+        size = pages.size(offset)
+        if size <= 0:
+            return [], size
+        return cargo_export(cargo, base | {"limit": size, "offset": offset}), size
+
+    pending = _prefetch.submit(fetch, pages.offset) if prefetch else None
+    try:
+        while True:
+            page, size = pending.result() if pending else fetch(pages.offset)
+            last = pages.advance(len(page), size)
+            pending = _prefetch.submit(fetch, pages.offset) if prefetch and not last else None
+            yield from page
+            if last:
+                return
+    finally:
+        if pending:
+            pending.cancel()
+
+
+async def aiter_cargo_export(cargo: CargoClient, params: CargoParameters, prefetch: bool = True) -> AsyncIterator[Any]:
+    """Yield every row matching PARAMS like iter_cargo_export without blocking the event loop."""
+    base, total = _paged(cargo, params)
+    pages = _Pages(cargo, total)
+
+    async def fetch(offset: int) -> tuple[list[Any], int]:
+        size = pages.size(offset)
+        if size <= 0:
+            return [], size
+        return await acargo_export(cargo, base | {"limit": size, "offset": offset}), size
+
+    pending = asyncio.ensure_future(fetch(pages.offset)) if prefetch else None
+    try:
+        while True:
+            page, size = await pending if pending else await fetch(pages.offset)
+            last = pages.advance(len(page), size)
+            pending = asyncio.ensure_future(fetch(pages.offset)) if prefetch and not last else None
+            for row in page:
+                yield row
+            if last:
+                return
+    finally:
+        if pending:
+            pending.cancel()
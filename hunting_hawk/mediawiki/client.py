@@ -1,11 +1,15 @@
 """A wrapper for basic Mediawiki API features"""
+import asyncio
 import logging
+import weakref
 from dataclasses import dataclass, field
+from json import JSONDecodeError, loads
 from typing import Any
 
+import httpx
 import requests
 
-from hunting_hawk.cache.util import get_requests_session
+from hunting_hawk.cache.util import get_http_cache, get_requests_session
 
 from .__version__ import VERSION
 
@@ -46,13 +50,55 @@ class ClientApiError(ClientError):
     """Exception class for cargo exceptions related to API failures."""
 
 
+# Long lived connection pools, one per Client.domain. An async session is bound to the
+# event loop it was created on, so those are kept per loop as well
+_sessions: dict[str, requests.Session] = {}
+_async_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_session(client: Client) -> requests.Session:
+    """Return the pooled session for the domain of CLIENT."""
+    if client.domain not in _sessions:
+        _sessions[client.domain] = requests.session()
+    return _sessions[client.domain]
+
+
+def get_async_session(client: Client) -> httpx.AsyncClient:
+    """Return the pooled async session of the running event loop for the domain of CLIENT."""
+    sessions = _async_sessions.setdefault(asyncio.get_running_loop(), {})
+    if client.domain not in sessions:
+        sessions[client.domain] = httpx.AsyncClient(follow_redirects=True)
+    return sessions[client.domain]
+
+
+async def aclose_sessions() -> None:
+    """Close the pooled async sessions of the running event loop."""
+    sessions = _async_sessions.pop(asyncio.get_running_loop(), {})
+    while sessions:
+        _, session = sessions.popitem()
+        await session.aclose()
+
+
+def _unwrap(js: Any) -> list[str] | dict[Any, Any]:
+    """Raise on API errors and unexpected payloads."""
+    match js:
+        case {"error": err}:
+            raise ClientApiError(err)
+        case list() | dict():
+            return js
+        case _:
+            raise TypeError("Unknown return type")
+
+
 def raw_get(client: Client, path: str, params: dict[str, Any]) -> requests.Response:
     """Call a given URL. Caches the response"""
     req_params = params
     req = requests.Request("GET", path, headers=client.headers, params=req_params)
     prepped = req.prepare()
 
-    s = requests.session()
+    s = get_session(client)
     url = prepped.url
     logging.info(f"Making a request to {url}")
 
@@ -74,16 +120,9 @@ def get(client: Client, path: str, params: dict[str, Any]) -> list[str] | dict[A
     except requests.exceptions.JSONDecodeError as e:
         raise ClientDecodeError(f"Failed to decode {response.text}") from e
 
-    match js:
-        case {"error": err}:
-            raise ClientApiError(err)
-        case list() | dict():
-            return js
-        case _:
-            raise TypeError("Unknown return type")
+    return _unwrap(js)
 
 
-# TODO: Deduplicate
 def cached_get(client: Client, path: str, params: dict[str, Any]) -> list[str] | dict[Any, Any]:
     """Get a json from a given URL. Caches the response"""
     try:
@@ -93,10 +132,49 @@ def cached_get(client: Client, path: str, params: dict[str, Any]) -> list[str] |
     except requests.exceptions.JSONDecodeError as e:
         raise ClientDecodeError from e
 
-    match res:
-        case {"error": err}:
-            raise ClientApiError(err)
-        case list() | dict():
-            return res
-        case _:
-            raise TypeError("Unknown return type")
+    return _unwrap(res)
+
+
+async def araw_get(client: Client, path: str, params: dict[str, Any]) -> httpx.Response:
+    """Call a given URL over the pooled async session of CLIENT."""
+    s = get_async_session(client)
+    logging.info(f"Making an async request to {path}")
+
+    try:
+        response = await s.get(path, headers=client.headers, params=params, timeout=client.timeout)
+        response.raise_for_status()
+        return response
+    except (httpx.HTTPStatusError, httpx.TransportError) as e:
+        raise ClientNetworkError from e
+
+
+async def aget(client: Client, path: str, params: dict[str, Any]) -> list[str] | dict[Any, Any]:
+    """Get a json from a given URL without blocking the event loop."""
+    response = await araw_get(client, path, params)
+    try:
+        js = response.json()
+    except JSONDecodeError as e:
+        raise ClientDecodeError(f"Failed to decode {response.text}") from e
+
+    return _unwrap(js)
+
+
+async def acached_get(client: Client, path: str, params: dict[str, Any]) -> list[str] | dict[Any, Any]:
+    """Get a json from a given URL without blocking the event loop. Caches the response"""
+    cache = get_http_cache()
+    cache_key = f"http:{httpx.URL(path, params=params)}"
+    try:
+        # The cache is synchronous, its round trips run off the event loop
+        if cached := await asyncio.to_thread(cache.get, cache_key):
+            return _unwrap(loads(cached))
+    except JSONDecodeError as e:
+        raise ClientDecodeError from e
+
+    response = await araw_get(client, path, params)
+    try:
+        res = _unwrap(response.json())
+    except JSONDecodeError as e:
+        raise ClientDecodeError from e
+
+    await asyncio.to_thread(cache.set, cache_key, response.text)
+    return res
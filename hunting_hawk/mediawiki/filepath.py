@@ -1,20 +1,108 @@
+import logging
+import threading
+from typing import Iterable, Optional
+
+from hunting_hawk.cache.cache import Cache
+from hunting_hawk.cache.util import get_http_cache
+
 from .client import Client
+from .imageinfo import get_image_urls
 
 ImageName = str
 
 
 def get_file_path(client: Client, file: ImageName) -> str:
+    """Url of FILE that redirects to wherever the wiki stores it."""
     if not file:
         return ""
     return f"{client.index_endpoint()}/Special:FilePath/{file}"
-    # TODO: Cache can be populated with:
-    # try:
-    #     res = requests.get(
-    #         url, allow_redirects=True, headers=client.headers, stream=True
-    #     )
-    #     res.raise_for_status()
-    #     res.close()
-    #     url = res.url
-    #     return url
-    # except requests.exceptions.HTTPError as e:
-    #     return file
+
+
+class FilePaths:
+    """Direct urls of the files of a wiki, resolved in batches.
+
+    Resolved urls skip the Special:FilePath redirect. Every url is cached under a key of its
+    own, so workers read only the files they need and write only the ones they looked up."""
+
+    def __init__(
+        self, client: Client, cache: Optional[Cache] = None, urls: Optional[dict[ImageName, str]] = None
+    ) -> None:
+        """URLS are known direct urls."""
+        self.client = client
+        self.cache = cache
+        self.prefix = f"fileurls:{client.index_endpoint()}:"
+        self._lock = threading.Lock()
+        self._urls: dict[ImageName, str] = dict(urls or {})
+        # Files being looked up by some thread, set once they are
+        self._resolving: dict[ImageName, threading.Event] = {}
+
+    def _cached(self, files: list[ImageName]) -> dict[ImageName, str]:
+        try:
+            if self.cache is not None:
+                urls = self.cache.get_many([f"{self.prefix}{f}" for f in files])
+                return {f: url for f, url in zip(files, urls) if url}
+        except Exception as e:
+            logging.error(f"Failed to load the file urls of {self.client.index_endpoint()}: {e}")
+        return {}
+
+    def _store(self, urls: dict[ImageName, str]) -> None:
+        try:
+            if self.cache is not None:
+                self.cache.set_many({f"{self.prefix}{f}": url for f, url in urls.items()})
+        except Exception as e:
+            logging.error(f"Failed to store the file urls of {self.client.index_endpoint()}: {e}")
+
+    def resolve(self, files: Iterable[ImageName]) -> None:
+        """Look up the direct urls of the FILES that were not resolved yet.
+
+        The lookup runs outside of the lock. Files another thread is looking up are waited
+        for, so their urls are known once this returns unless that lookup failed."""
+        with self._lock:
+            unknown = [f for f in dict.fromkeys(files) if f and f not in self._urls]
+            pending = {self._resolving[f] for f in unknown if f in self._resolving}
+            missing = [f for f in unknown if f not in self._resolving]
+            done = threading.Event()
+            self._resolving.update(dict.fromkeys(missing, done))
+        try:
+            if missing:
+                self._lookup(missing)
+        finally:
+            with self._lock:
+                for f in missing:
+                    del self._resolving[f]
+            done.set()
+        for event in pending:
+            event.wait()
+
+    def _lookup(self, files: list[ImageName]) -> None:
+        """Resolve FILES from the cache, asking the wiki for the ones no worker stored yet."""
+        resolved = self._cached(files)
+        if missing := [f for f in files if f not in resolved]:
+            try:
+                found = get_image_urls(self.client, missing)
+            except Exception as e:
+                logging.error(f"Resolving {len(missing)} files failed with {e}")
+            else:
+                # Files missing from the wiki keep redirecting, without asking for them again
+                new = {f: found.get(f, get_file_path(self.client, f)) for f in missing}
+                logging.info(f"Resolved {len(found)} of {len(missing)} files of {self.client.index_endpoint()}")
+                self._store(new)
+                resolved |= new
+        with self._lock:
+            self._urls.update(resolved)
+
+    def url(self, file: ImageName) -> str:
+        """Direct url of FILE if it was resolved, its Special:FilePath url otherwise."""
+        return self._urls.get(file) or get_file_path(self.client, file)
+
+
+# One per wiki, shared by the tables of the wiki
+_file_paths: dict[str, FilePaths] = {}
+
+
+def file_paths(client: Client) -> FilePaths:
+    """Return the file urls of the wiki of CLIENT."""
+    endpoint = client.index_endpoint()
+    if endpoint not in _file_paths:
+        _file_paths[endpoint] = FilePaths(client, get_http_cache())
+    return _file_paths[endpoint]
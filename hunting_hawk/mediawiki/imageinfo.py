@@ -1,5 +1,5 @@
 """Image info api endpoint wrapper"""
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 
 from pydantic import BaseModel, ValidationError
 
@@ -8,10 +8,14 @@ from .client import Client, get
 ImageName = str
 ImageInfoNormalized = Dict[str, ImageName]
 
+# Most titles per request, the api maximum for regular users
+TITLES_PER_QUERY = 50
+
 
 class ImageInfoInfo(BaseModel):
-    timestamp: str
-    user: str
+    # Only returned for the default iiprop
+    timestamp: Optional[str]
+    user: Optional[str]
     url: Optional[str]
     descriptionurl: Optional[str]
     descriptionshorturl: Optional[str]
@@ -19,19 +23,21 @@ class ImageInfoInfo(BaseModel):
 
 class ImageInfoPage(BaseModel):
     pageid: Optional[int]
-    ns: int
+    # Missing for invalid titles
+    ns: Optional[int]
     title: str
-    imagerepository: str
+    imagerepository: Optional[str]
     imageinfo: Optional[List[ImageInfoInfo]]
 
 
 class ImageInfoQuery(BaseModel):
-    normalized: List[ImageInfoNormalized]
+    # Only returned when a title was not in its canonical form
+    normalized: List[ImageInfoNormalized] = []
     pages: Dict[str, ImageInfoPage]
 
 
 class ImageInfoResponse(BaseModel):
-    batchcomplete: str
+    batchcomplete: Optional[str]
     query: ImageInfoQuery
 
 
@@ -40,16 +46,38 @@ class ImageInfoResponse(BaseModel):
 class ImageInfoParams(BaseModel):
     """A dict that only permits imageinfo parameters."""
 
+    # Several titles are separated by |
     titles: ImageName
     action: str = "query"
     format: str = "json"
     prop: str = "imageinfo"
+    iiprop: Optional[str]
 
 
-def get_image_info(client: Client, image_name: ImageName) -> ImageInfoResponse:
-    params = ImageInfoParams(titles=image_name).__dict__
+def get_image_info(client: Client, image_name: ImageName, iiprop: Optional[str] = None) -> ImageInfoResponse:
+    params = ImageInfoParams(titles=image_name, iiprop=iiprop).dict(exclude_none=True)
     res = get(client, client.api_endpoint(), params)
     try:
         return ImageInfoResponse.parse_obj(res)
     except ValidationError as e:
         raise TypeError("Failed to unmarshal the model") from e
+
+
+def get_image_urls(client: Client, files: Iterable[ImageName]) -> Dict[ImageName, str]:
+    """Direct urls of FILES, given without the File: prefix, TITLES_PER_QUERY files per request.
+
+    Files that do not exist on the wiki are left out."""
+    names = list(dict.fromkeys(f for f in files if f))
+    urls: Dict[ImageName, str] = {}
+    for i in range(0, len(names), TITLES_PER_QUERY):
+        batch = names[i : i + TITLES_PER_QUERY]
+        query = get_image_info(client, "|".join(f"File:{f}" for f in batch), iiprop="url").query
+
+        canonical = {n["from"]: n["to"] for n in query.normalized}
+        by_title = {p.title: p for p in query.pages.values()}
+        for name in batch:
+            title = f"File:{name}"
+            page = by_title.get(canonical.get(title, title))
+            if page is not None and page.imageinfo and page.imageinfo[0].url:
+                urls[name] = page.imageinfo[0].url
+    return urls
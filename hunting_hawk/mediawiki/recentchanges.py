@@ -0,0 +1,76 @@
+"""Recent changes api endpoint wrapper"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ValidationError
+
+from .client import Client, get
+
+# Most changes returned per request, the api maximum for regular users
+RC_LIMIT = 500
+
+
+class RecentChange(BaseModel):
+    type: Optional[str]
+    title: str
+    timestamp: datetime
+
+
+class RecentChangesQuery(BaseModel):
+    recentchanges: List[RecentChange]
+
+
+class RecentChangesResponse(BaseModel):
+    query: RecentChangesQuery
+    # Parameters to pass along to fetch the next batch
+    # https://www.mediawiki.org/wiki/API:Continue
+    continue_: Optional[Dict[str, str]]
+
+    class Config:
+        fields = {"continue_": "continue"}
+
+
+# As documented here:
+# https://www.mediawiki.org/wiki/API:RecentChanges
+class RecentChangesParams(BaseModel):
+    """A dict that only permits recentchanges parameters."""
+
+    rcstart: str
+    rcend: Optional[str]
+    action: str = "query"
+    format: str = "json"
+    list: str = "recentchanges"
+    rcdir: str = "newer"
+    rcprop: str = "title|timestamp"
+    rctype: str = "edit|new"
+    rclimit: int = RC_LIMIT
+
+
+def to_timestamp(t: datetime) -> str:
+    """Format T the way the api expects timestamps."""
+    return t.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def get_recent_changes(client: Client, since: datetime, until: Optional[datetime] = None) -> List[RecentChange]:
+    """Return the page edits and creations on the wiki of CLIENT between SINCE and UNTIL, oldest first."""
+    params: dict[str, Any] = RecentChangesParams(
+        rcstart=to_timestamp(since), rcend=to_timestamp(until) if until else None
+    ).dict(exclude_none=True)
+
+    changes: List[RecentChange] = []
+    while True:
+        res = get(client, client.api_endpoint(), params)
+        try:
+            parsed = RecentChangesResponse.parse_obj(res)
+        except ValidationError as e:
+            raise TypeError("Failed to unmarshal the model") from e
+
+        changes.extend(parsed.query.recentchanges)
+        if not parsed.continue_:
+            return changes
+        params = {**params, **parsed.continue_}
+
+
+def changed_pages(client: Client, since: datetime, until: Optional[datetime] = None) -> List[str]:
+    """Titles of the pages changed on the wiki of CLIENT between SINCE and UNTIL."""
+    return list(dict.fromkeys(c.title for c in get_recent_changes(client, since, until)))
@@ -1,47 +1,50 @@
 """Scrape wikipedia for type definitons of a cargo table."""
 import logging
-from dataclasses import field, make_dataclass
 from io import StringIO
-from typing import Optional, cast
 
 import requests
 from lxml import etree
-from pydantic.dataclasses import DataclassProxy, dataclass
+from pydantic.dataclasses import DataclassProxy
 
 from hunting_hawk.cache.util import get_requests_session
 from hunting_hawk.mediawiki.cargo import (
     CargoClient,
+    CargoField,
+    CargoFields,
     CargoNetworkError,
     CargoParseError,
-    File,
-    Wikitext,
+    build_table_type,
+    to_type,
 )
 
 """Web scraping functions that do not call the mediawiki API."""
 
 
-def name_to_type(name: str) -> type:
-    """Match a name to a type."""
-    # TODO: Refactor into a more generic method
+def name_to_field(name: str) -> CargoField:
+    """Match a name to a field definition."""
     normalized_name = name.lower().strip(",").split()
     match normalized_name:
         case ["integer"]:
-            return int
+            return CargoField(type="Integer")
         case ["file"]:
-            return File
+            return CargoField(type="File")
         case ["string", *_]:
-            return str
+            return CargoField(type="String")
         case ["wikitext", *_]:
-            return Wikitext
+            return CargoField(type="Wikitext")
         case ["list", "of", t, *_]:
-            # Mypy does not handle dynamic type names
-            return cast(type, list[name_to_type(t)])  # type: ignore
+            return CargoField(type=name_to_field(t).type, isList="")
         case default:
             raise CargoParseError(f'Unknown type: "{default}"')
 
 
-def parse_cargo_table(cargo: CargoClient, table_name: str) -> DataclassProxy:
-    """Dynamically construct a type for a cargo table with TABLE_NAME."""
+def name_to_type(name: str) -> type:
+    """Match a name to a type."""
+    return to_type(name_to_field(name))
+
+
+def parse_cargo_fields(cargo: CargoClient, table_name: str) -> CargoFields:
+    """Scrape the field definitions of the cargo table TABLE_NAME."""
     tables_endpoint = cargo.tables_endpoint()
 
     table_url = f"{tables_endpoint}/{table_name}"
@@ -80,18 +83,9 @@ def parse_cargo_table(cargo: CargoClient, table_name: str) -> DataclassProxy:
         for tag in items
     ]
 
-    fields = [(f[0], Optional[name_to_type(f[1])], field(default=None)) for f in field_names]
+    return CargoFields(cargofields={f[0]: name_to_field(f[1]) for f in field_names})
 
-    result = make_dataclass(
-        table_name,
-        # Mypy does not handle dynamic type names
-        fields,  # type: ignore
-        frozen=True,
-    )
 
-    proxy = dataclass(result)
-    match proxy:
-        case DataclassProxy():
-            return proxy
-        case default:
-            raise CargoParseError(f"Failed to construct a data class proxy for {table_url}. Got {default}")
+def parse_cargo_table(cargo: CargoClient, table_name: str) -> DataclassProxy:
+    """Dynamically construct a type for a cargo table with TABLE_NAME."""
+    return build_table_type(table_name, parse_cargo_fields(cargo, table_name))
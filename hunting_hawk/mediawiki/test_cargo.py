@@ -1,11 +1,14 @@
 # mypy: disable-error-code="call-arg"
 # MyPy complains about optional dataclass fields
+import asyncio
 import os
 import pytest
 from inspect import signature
+from typing import Any
 
 
-from .cargo import CargoClient, CargoField, File, Wikitext, parse_cargo_table, to_type
+from . import cargo
+from .cargo import CargoClient, CargoParameters, CargoField, File, Wikitext, parse_cargo_table, to_type
 
 RUN_SMOKE = os.getenv("HUNTING_HAWK_SMOKE", False)
 
@@ -84,3 +87,79 @@ def test_scrape_ggst() -> None:
     instance = table(*attributes)
     for attr, type in ggst_attributes.items():
         assert hasattr(instance, attr)
+
+
+def paged_export(monkeypatch: pytest.MonkeyPatch, rows: list[Any]) -> list[CargoParameters]:
+    calls: list[CargoParameters] = []
+
+    def export(_: CargoClient, params: CargoParameters) -> list[Any]:
+        calls.append(params)
+        offset = params.get("offset", 0)
+        # The wiki caps pages at 100 rows no matter the limit
+        return rows[offset : offset + min(params.get("limit", 100), 100)]
+
+    async def aexport(client: CargoClient, params: CargoParameters) -> list[Any]:
+        return export(client, params)
+
+    monkeypatch.setattr(cargo, "cargo_export", export)
+    monkeypatch.setattr(cargo, "acargo_export", aexport)
+    return calls
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_cargo_export_walks_pages(monkeypatch: pytest.MonkeyPatch, prefetch: bool) -> None:
+    rows = [{"input": str(i)} for i in range(250)]
+    calls = paged_export(monkeypatch, rows)
+    client = CargoClient("https://example.com", "/wiki", "/api.php", "?title=Special:CargoExport", "", limit=100)
+
+    assert list(cargo.iter_cargo_export(client, {"tables": "MoveData_Test", "fields": "input"}, prefetch)) == rows
+    assert [(c["offset"], c["limit"]) for c in calls] == [(0, 100), (100, 100), (200, 100)]
+    assert calls[0]["order_by"] == "MoveData_Test._ID"
+
+
+def test_iter_cargo_export_limit_caps_rows(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [{"input": str(i)} for i in range(250)]
+    calls = paged_export(monkeypatch, rows)
+    client = CargoClient("https://example.com", "/wiki", "/api.php", "?title=Special:CargoExport", "", limit=100)
+
+    params: CargoParameters = {"tables": "MoveData_Test", "group_by": "chara", "limit": 150}
+    assert list(cargo.iter_cargo_export(client, params)) == rows[:150]
+    assert [(c["offset"], c["limit"], c["order_by"]) for c in calls] == [(0, 100, "chara"), (100, 50, "chara")]
+
+
+def test_aiter_cargo_export_walks_pages(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [{"input": str(i)} for i in range(250)]
+    paged_export(monkeypatch, rows)
+    client = CargoClient("https://example.com", "/wiki", "/api.php", "?title=Special:CargoExport", "", limit=100)
+
+    async def collect() -> list[Any]:
+        return [r async for r in cargo.aiter_cargo_export(client, {"tables": "MoveData_Test"})]
+
+    assert asyncio.run(collect()) == rows
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_iter_cargo_export_detects_page_caps(monkeypatch: pytest.MonkeyPatch, prefetch: bool) -> None:
+    rows = [{"input": str(i)} for i in range(250)]
+    calls = paged_export(monkeypatch, rows)
+    monkeypatch.setattr(cargo, "_page_caps", {})
+    client = CargoClient("https://example.com", "/wiki", "/api.php", "?title=Special:CargoExport", "", limit=500)
+
+    assert list(cargo.iter_cargo_export(client, {"tables": "MoveData_Test"}, prefetch)) == rows
+    assert [(c["offset"], c["limit"]) for c in calls] == [(0, 500), (100, 100), (200, 100)]
+
+    # Later exports page at the cap right away
+    calls.clear()
+    assert list(cargo.iter_cargo_export(client, {"tables": "MoveData_Test"}, prefetch)) == rows
+    assert [(c["offset"], c["limit"]) for c in calls] == [(0, 100), (100, 100), (200, 100)]
+
+
+def test_short_pages_end_the_export(monkeypatch: pytest.MonkeyPatch) -> None:
+    rows = [{"input": str(i)} for i in range(40)]
+    calls = paged_export(monkeypatch, rows)
+    monkeypatch.setattr(cargo, "_page_caps", {})
+    client = CargoClient("https://example.com", "/wiki", "/api.php", "?title=Special:CargoExport", "", limit=500)
+
+    assert list(cargo.iter_cargo_export(client, {"tables": "MoveData_Test"})) == rows
+    assert len(calls) == 1
+    assert cargo._page_caps == {}
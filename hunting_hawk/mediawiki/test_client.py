@@ -0,0 +1,74 @@
+import asyncio
+
+import httpx
+import pytest
+
+from . import client
+
+test_client = client.Client("https://example.com", "/wiki", "/api.php")
+
+
+def mock_session(handler: httpx.MockTransport) -> None:
+    client._async_sessions[asyncio.get_running_loop()] = {test_client.domain: httpx.AsyncClient(transport=handler)}
+
+
+def test_aget() -> None:
+    seen: list[httpx.Request] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, json={"cargofields": {}})
+
+    async def run() -> None:
+        mock_session(httpx.MockTransport(handler))
+        pool = client.get_async_session(test_client)
+        assert await client.aget(test_client, test_client.api_endpoint(), {"action": "cargofields"}) == {
+            "cargofields": {}
+        }
+        await client.aget(test_client, test_client.api_endpoint(), {})
+        # Every request goes through the same pooled session
+        assert client.get_async_session(test_client) is pool
+        await client.aclose_sessions()
+
+    asyncio.run(run())
+    assert str(seen[0].url) == "https://example.com/api.php?action=cargofields"
+    assert seen[0].headers["User-Agent"] == test_client.headers["User-Agent"]
+    assert len(client._async_sessions) == 0
+
+
+def test_sessions_per_loop() -> None:
+    async def session() -> httpx.AsyncClient:
+        return client.get_async_session(test_client)
+
+    async def other_loop(pool: httpx.AsyncClient) -> bool:
+        other = client.get_async_session(test_client)
+        await client.aclose_sessions()
+        return other is not pool
+
+    loop = asyncio.new_event_loop()
+    try:
+        pool = loop.run_until_complete(session())
+        assert loop.run_until_complete(session()) is pool
+        # Another event loop gets its own session, the first one is bound to its loop
+        assert asyncio.run(other_loop(pool))
+        loop.run_until_complete(client.aclose_sessions())
+        assert pool.is_closed
+    finally:
+        loop.close()
+
+
+def test_aget_errors() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, json={"error": {"code": "badtable"}})
+
+    async def run() -> None:
+        mock_session(httpx.MockTransport(handler))
+        with pytest.raises(client.ClientApiError):
+            await client.aget(test_client, test_client.api_endpoint(), {})
+        with pytest.raises(client.ClientNetworkError):
+            await client.aget(test_client, "https://example.com/missing", {})
+        await client.aclose_sessions()
+
+    asyncio.run(run())
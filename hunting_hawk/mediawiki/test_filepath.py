@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from hunting_hawk.cache.cache import DictCache
+
+from . import client, filepath, imageinfo
+from .filepath import FilePaths
+
+test_client = client.Client(domain="https://example.com", index_path="/wiki", api_path="/api.php")
+
+
+def test_get_image_urls_batches_titles(fake_api: list[list[str]], cdn: str) -> None:
+    files = [f"Ky_{i}.png" for i in range(120)] + ["Missing.png", "Ky_0.png", ""]
+    urls = imageinfo.get_image_urls(test_client, files)
+
+    assert [len(r) for r in fake_api] == [50, 50, 21]
+    assert urls["Ky_0.png"] == f"{cdn}/Ky 0.png"
+    assert len(urls) == 120 and "Missing.png" not in urls
+
+
+def test_file_paths_are_resolved_once(fake_api: list[list[str]], cdn: str) -> None:
+    cache = DictCache()
+    files = FilePaths(test_client, cache)
+    files.resolve(["Ky_236S.png", "Missing.png"])
+    files.resolve(["Ky_236S.png", "Missing.png"])
+
+    assert len(fake_api) == 1
+    assert files.url("Ky_236S.png") == f"{cdn}/Ky 236S.png"
+    # Files that are not resolved keep redirecting
+    assert files.url("Missing.png") == "https://example.com/wiki/Special:FilePath/Missing.png"
+    assert files.url("Sol_5P.png") == "https://example.com/wiki/Special:FilePath/Sol_5P.png"
+
+    # Other workers start from the cached urls
+    other = FilePaths(test_client, cache)
+    other.resolve(["Ky_236S.png"])
+    assert len(fake_api) == 1
+    assert other.url("Ky_236S.png") == f"{cdn}/Ky 236S.png"
+
+
+def test_workers_store_the_files_they_resolved(fake_api: list[list[str]], cdn: str) -> None:
+    cache = DictCache()
+    first = FilePaths(test_client, cache)
+    second = FilePaths(test_client, cache)
+    first.resolve(["Ky_236S.png"])
+    second.resolve(["Sol_5P.png"])
+
+    # Every file is its own key, neither worker overwrites what the other one stored
+    assert cache.get("fileurls:https://example.com/wiki:Ky_236S.png") == f"{cdn}/Ky 236S.png"
+    third = FilePaths(test_client, cache)
+    third.resolve(["Ky_236S.png", "Sol_5P.png"])
+    assert len(fake_api) == 2
+    assert third.url("Sol_5P.png") == f"{cdn}/Sol 5P.png"
+
+
+def test_files_in_flight_are_waited_for(monkeypatch: pytest.MonkeyPatch, cdn: str) -> None:
+    files = FilePaths(test_client, DictCache())
+    started, release = threading.Event(), threading.Event()
+    lookups: list[list[str]] = []
+
+    def get_image_urls(_: client.Client, names: list[str]) -> dict[str, str]:
+        lookups.append(names)
+        if "Ky_236S.png" in names:
+            started.set()
+            release.wait(5)
+        return {n: f"{cdn}/{n}" for n in names}
+
+    monkeypatch.setattr(filepath, "get_image_urls", get_image_urls)
+    thread = threading.Thread(target=files.resolve, args=(["Ky_236S.png"],))
+    thread.start()
+    assert started.wait(5)
+
+    waiter = threading.Thread(target=files.resolve, args=(["Ky_236S.png", "Sol_5P.png"],))
+    waiter.start()
+    # Its own files are looked up, then it waits for the ones already in flight
+    deadline = time.monotonic() + 5
+    while len(lookups) < 2 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    waiter.join(0.05)
+    assert waiter.is_alive()
+    assert lookups == [["Ky_236S.png"], ["Sol_5P.png"]]
+    release.set()
+    waiter.join(5)
+    thread.join(5)
+    assert files.url("Ky_236S.png") == f"{cdn}/Ky_236S.png"
+
+
+def test_lookups_run_outside_the_lock(monkeypatch: pytest.MonkeyPatch, cdn: str) -> None:
+    files = FilePaths(test_client, DictCache())
+
+    def get_image_urls(_: client.Client, names: list[str]) -> dict[str, str]:
+        # Another thread resolving files would deadlock if the lock was held here
+        assert files._lock.acquire(blocking=False)
+        files._lock.release()
+        return {n: f"{cdn}/{n}" for n in names}
+
+    monkeypatch.setattr(filepath, "get_image_urls", get_image_urls)
+    files.resolve(["Ky_236S.png"])
+    assert files.url("Ky_236S.png") == f"{cdn}/Ky_236S.png"
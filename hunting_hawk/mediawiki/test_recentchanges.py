@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+
+from . import recentchanges
+from .client import Client
+
+wiki = Client(domain="https://example.com", index_path="/wiki/", api_path="/api.php")
+
+
+def test_changed_pages_follows_continuation(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[dict[str, Any]] = []
+    batches = [
+        {
+            "continue": {"rccontinue": "20240101000100|2", "continue": "-||"},
+            "query": {
+                "recentchanges": [
+                    {"type": "edit", "title": "GGACR/Ky Kiske/Data", "timestamp": "2024-01-01T00:00:00Z"},
+                    {"type": "new", "title": "GGACR/Baiken/Data", "timestamp": "2024-01-01T00:00:30Z"},
+                ]
+            },
+        },
+        {
+            "batchcomplete": "",
+            "query": {
+                "recentchanges": [
+                    {"type": "edit", "title": "GGACR/Ky Kiske/Data", "timestamp": "2024-01-01T00:01:00Z"},
+                ]
+            },
+        },
+    ]
+
+    def get(_: Client, path: str, params: dict[str, Any]) -> Any:
+        calls.append(params)
+        return batches[len(calls) - 1]
+
+    monkeypatch.setattr(recentchanges, "get", get)
+    since = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    assert recentchanges.changed_pages(wiki, since) == ["GGACR/Ky Kiske/Data", "GGACR/Baiken/Data"]
+    assert calls[0]["rcstart"] == "2024-01-01T00:00:00Z"
+    assert "rcend" not in calls[0]
+    assert calls[1]["rccontinue"] == "20240101000100|2"
@@ -0,0 +1,100 @@
+"""Self contained dumps of whole cargo tables the api can boot from"""
+import gzip
+import json
+import logging
+import os
+import tempfile
+from dataclasses import fields
+from pathlib import Path
+from typing import Any
+
+from hunting_hawk.mediawiki.cargo import CargoFields, Move
+
+from .fetcher import CargoFetcher, Snapshot
+
+__all__ = ["ArtifactError", "artifact_path", "dump", "load"]
+
+ARTIFACT_FORMAT = "hunting_hawk.table"
+# Bump whenever the layout changes, older artifacts are rejected
+ARTIFACT_VERSION = 1
+
+
+class ArtifactError(ValueError):
+    """Raised for artifacts that can not be loaded into a fetcher."""
+
+
+def artifact_path(directory: Path, fetcher: CargoFetcher) -> Path:
+    return directory / f"{fetcher.table_name}.jsonl.gz"
+
+
+def dump(fetcher: CargoFetcher, path: Path) -> int:
+    """Write every move of FETCHER to PATH and return how many were written.
+
+    The artifact is gzipped JSON lines. The first line is a header holding the table
+    definition and the column order, every further line is a single character as
+    [default key, [[column values of a move], ...]] with the values already converted."""
+    snapshot = fetcher.snapshot or fetcher.load_snapshot()
+    columns = [f.name for f in fields(fetcher.move)]  # type: ignore
+    header = {
+        "format": ARTIFACT_FORMAT,
+        "version": ARTIFACT_VERSION,
+        "wiki": fetcher.client.index_endpoint(),
+        "table": fetcher.table_name,
+        "default_key": fetcher.default_key,
+        "schema": fetcher.table_fields.dict(),
+        "columns": columns,
+        "characters": len(snapshot.characters),
+    }
+
+    count = 0
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}")
+    try:
+        # A fixed mtime keeps the output identical for identical tables
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as f:
+            f.write(_line(header))
+            for char in snapshot.characters:
+                moves = snapshot.get(char)
+                count += len(moves)
+                f.write(_line([char, [[getattr(m, c) for c in columns] for m in moves]]))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    logging.info(f"Wrote {count} moves of {fetcher.table_name} to {path}")
+    return count
+
+
+def _line(val: Any) -> bytes:
+    return json.dumps(val, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def load(fetcher: CargoFetcher, path: Path) -> Snapshot:
+    """Serve FETCHER from the artifact at PATH, without any network access."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "null")
+        valid = isinstance(header, dict) and header.get("format") == ARTIFACT_FORMAT
+        if not valid or header.get("version") != ARTIFACT_VERSION:
+            raise ArtifactError(f"{path} is not a version {ARTIFACT_VERSION} artifact")
+        if header.get("table") != fetcher.table_name:
+            raise ArtifactError(f"{path} holds {header.get('table')}, not {fetcher.table_name}")
+        columns: list[str] = header["columns"]
+
+        if "move" not in fetcher.__dict__:
+            fetcher.use_fields(CargoFields.parse_obj(header["schema"]))
+
+        decoder = fetcher.decoder
+        known = {f.name for f in fields(fetcher.move)}  # type: ignore
+        empty = dict.fromkeys(known)
+        characters: list[str] = []
+        moves: dict[str, list[Move]] = {}
+        for line in f:
+            char, rows = json.loads(line)
+            characters.append(char)
+            # Values were converted before they were written
+            moves[char.casefold()] = [
+                decoder.build(decoder.shared(empty | {k: v for k, v in zip(columns, row) if k in known}))
+                for row in rows
+            ]
+
+    return fetcher.set_snapshot(Snapshot(characters, moves))
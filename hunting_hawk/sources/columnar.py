@@ -0,0 +1,481 @@
+"""Columnar copies of loaded tables, filtered and sorted with a subset of cargo's SQL.
+
+Integer, Float and Boolean fields are kept in typed arrays, strings are dictionary
+encoded and list fields are kept as they are. Where clauses are evaluated a column at a
+time into row masks with SQL's three valued logic, string comparisons ignore case like
+the MySQL collations of the wikis do.
+
+Every single text field also gets integer columns of the first, lowest and highest number
+of its values, startup_first, startup_min and startup_max for a startup of 7~9. The wikis
+name their frame data differently, onBlock on one and block on another, so every text
+field of the table definition gets them, built on first use. The wikis do not know these
+columns, queries using them are only answered locally, see frame_columns. The moves do not
+carry the parsed numbers either: they mirror the table definition, which is also the
+response model of the API, and a parse of free form text is only good enough to filter
+and sort by."""
+import operator
+import re
+from array import array
+from dataclasses import dataclass, fields
+from itertools import compress
+from typing import Any, Callable, Iterable, Optional, Union, get_args, get_origin
+
+from hunting_hawk.mediawiki.cargo import CargoParameters, Move, Wikitext
+from hunting_hawk.util.framedata import parse_frames
+
+__all__ = ["ColumnarTable", "UnsupportedQuery", "frame_columns", "frame_fields"]
+
+# Parameters evaluated locally, any other one is sent to the wiki
+LOCAL_PARAMETERS = frozenset({"tables", "where", "order_by", "limit", "offset"})
+
+
+class UnsupportedQuery(ValueError):
+    """Raised for queries outside of the subset that is evaluated locally."""
+
+
+@dataclass(frozen=True)
+class NumberColumn:
+    values: array  # type: ignore[type-arg]
+    # 1 for every row without a value
+    nulls: bytes
+    boolean: bool = False
+
+
+@dataclass(frozen=True)
+class TextColumn:
+    # Index into DICTIONARY per row, -1 for rows without a value
+    codes: array  # type: ignore[type-arg]
+    dictionary: list[str]
+
+
+@dataclass(frozen=True)
+class ListColumn:
+    values: list[Optional[list[Any]]]
+
+
+Column = Union[NumberColumn, TextColumn, ListColumn]
+
+# Columns parsed from each frame data field, named {field}_{suffix}
+FRAME_SUFFIXES = ("first", "min", "max")
+
+_quoted = re.compile(r"'(?:[^']|'')*'")
+_frame_column = re.compile(rf"\b(\w+)_({'|'.join(FRAME_SUFFIXES)})\b", re.IGNORECASE)
+
+
+def frame_fields(move: Any) -> frozenset[str]:
+    """Casefolded names of the fields of the table definition MOVE parsed into frame data columns."""
+    return frozenset(f.name.casefold() for f in fields(move) if _unwrap(f.type) in (str, Wikitext))
+
+
+def frame_columns(query: CargoParameters, text_fields: frozenset[str]) -> set[str]:
+    """Casefolded names of the frame data columns of TEXT_FIELDS the where and order by of QUERY use."""
+    names = set()
+    for clause in (query.get("where"), query.get("order_by")):
+        if isinstance(clause, str):
+            for match in _frame_column.finditer(_quoted.sub("''", clause)):
+                if match[1].casefold() in text_fields:
+                    names.add(match[0].casefold())
+    return names
+
+
+# Masks hold one byte per row, 1 for the rows that are selected, so that the masks of
+# several conditions combine with a single integer operation
+Mask = int
+
+
+def _mask(flags: Iterable[int]) -> Mask:
+    return int.from_bytes(bytes(flags), "little")
+
+
+def _unwrap(tp: Any) -> Any:
+    """TP without its Optional."""
+    if get_origin(tp) is Union:
+        (tp,) = (a for a in get_args(tp) if a is not type(None))
+    return tp
+
+
+def _number_type(tp: Any) -> Optional[str]:
+    """Array typecode of the number annotation TP, ? for booleans and None for anything else."""
+    return {int: "q", bool: "?", float: "d"}.get(_unwrap(tp))
+
+
+def _is_list(tp: Any) -> bool:
+    return get_origin(_unwrap(tp)) is list
+
+
+def _encode(values: list[Any], annotation: Any) -> Column:
+    if (typecode := _number_type(annotation)) is not None:
+        nulls = bytes(v is None for v in values)
+        boolean = typecode == "?"
+        return NumberColumn(array("q" if boolean else typecode, (0 if v is None else v for v in values)), nulls, boolean)
+    if _is_list(annotation):
+        return ListColumn(values)
+
+    codes: dict[str, int] = {}
+    return TextColumn(array("l", (-1 if v is None else codes.setdefault(v, len(codes)) for v in values)), list(codes))
+
+
+_LEADING_NUMBER = re.compile(r"\s*[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?")
+
+
+def to_number(v: str) -> float:
+    """The number a string is compared as, its leading number or 0 like in MySQL."""
+    match = _LEADING_NUMBER.match(v)
+    return float(match[0]) if match else 0.0
+
+
+def like_pattern(pattern: str) -> re.Pattern[str]:
+    """Compile a LIKE PATTERN, % matches any run of characters and _ a single one."""
+    parts = []
+    escaped = False
+    for c in pattern:
+        if escaped:
+            parts.append(re.escape(c))
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif c == "%":
+            parts.append(".*")
+        elif c == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(c))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def _text_key(v: str) -> str:
+    # Trailing spaces do not count in comparisons
+    return v.rstrip(" ").casefold()
+
+
+_COMPARISONS: dict[str, Callable[[Any, Any], bool]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<>": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+    (?P<string>'(?:[^']|'')*')
+    |(?P<number>[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<operator><=|>=|<>|!=|=|<|>)
+    |(?P<punctuation>[(),])
+    |(?P<name>`[^`]+`|[A-Za-z_][\w.]*)
+    )""",
+    re.VERBOSE,
+)
+
+Token = tuple[str, Any]
+
+
+def tokenize(sql: str) -> list[Token]:
+    tokens: list[Token] = []
+    pos = 0
+    sql = sql.rstrip()
+    while pos < len(sql):
+        match = _TOKEN.match(sql, pos)
+        if match is None:
+            raise UnsupportedQuery(f"Can not parse {sql[pos:]!r}")
+        kind = match.lastgroup
+        text = match[kind]  # type: ignore[index]
+        match kind:
+            case "string":
+                tokens.append(("literal", text[1:-1].replace("''", "'")))
+            case "number":
+                tokens.append(("literal", float(text) if any(c in text for c in ".eE") else int(text)))
+            case "name" if text.upper() in _KEYWORDS:
+                tokens.append(("keyword", text.upper()))
+            case "name":
+                tokens.append(("name", text.strip("`")))
+            case _:
+                tokens.append((kind, text))  # type: ignore[arg-type]
+        pos = match.end()
+    return tokens
+
+
+_KEYWORDS = {"AND", "OR", "NOT", "LIKE", "IN", "IS", "NULL", "HOLDS", "ASC", "DESC"}
+
+
+class ColumnarTable:
+    """A table of moves stored column by column."""
+
+    def __init__(
+        self,
+        name: str,
+        move: Any,
+        moves: list[Move],
+        extra: Optional[dict[str, list[Any]]] = None,
+    ) -> None:
+        """Store MOVES of the table NAME, EXTRA holds the values of columns the moves lack."""
+        self.name = name
+        self.moves = moves
+        self.columns: dict[str, Column] = {}
+        for f in fields(move):
+            self.columns[f.name.casefold()] = _encode([getattr(m, f.name) for m in moves], f.type)
+        for column, values in (extra or {}).items():
+            self.columns.setdefault(column.casefold(), _encode(values, str))
+        self.frame_fields = frame_fields(move)
+        self.all: Mask = _mask(b"\x01" * len(moves))
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def column(self, name: str) -> Column:
+        table, _, field = name.rpartition(".")
+        if table and table.casefold() != self.name.casefold():
+            raise UnsupportedQuery(f"{name} is not a field of {self.name}")
+        if (column := self.columns.get(field.casefold()) or self._frame_column(field.casefold())) is None:
+            raise UnsupportedQuery(f"{name} is not a stored field of {self.name}")
+        return column
+
+    def _frame_column(self, name: str) -> Optional[Column]:
+        """The frame data column NAME, parsed from its text field on first use."""
+        if not (match := _frame_column.fullmatch(name)) or match[1] not in self.frame_fields:
+            return None
+        if not isinstance(text := self.columns.get(match[1]), TextColumn):
+            return None
+        for suffix, numbers in _frame_columns(text).items():
+            self.columns.setdefault(f"{match[1]}_{suffix}", numbers)
+        return self.columns[name]
+
+    def where(self, clause: str) -> list[int]:
+        """Indexes of the rows CLAUSE holds for."""
+        parser = _Parser(self, tokenize(clause))
+        selected, _ = parser.expression()
+        if parser.tokens:
+            raise UnsupportedQuery(f"Unexpected {parser.tokens[0][1]!r} in {clause!r}")
+        return list(compress(range(len(self.moves)), selected.to_bytes(len(self.moves), "little")))
+
+    def order_by(self, rows: list[int], clause: str) -> list[int]:
+        """Sort ROWS by CLAUSE, rows without a value sort first like in MySQL."""
+        keys: list[tuple[Column, bool]] = []
+        for term in clause.split(","):
+            if not term.strip():
+                raise UnsupportedQuery(f"Empty term in order by {clause!r}")
+            name, *direction = term.split()
+            if len(direction) > 1 or (direction and direction[0].upper() not in ("ASC", "DESC")):
+                raise UnsupportedQuery(f"Can not order by {term!r}")
+            keys.append((self.column(name), bool(direction) and direction[0].upper() == "DESC"))
+
+        # Stable sorts from the last key to the first one
+        for column, descending in reversed(keys):
+            rows = sorted(rows, key=_sort_key(column), reverse=descending)
+        return rows
+
+    def select(self, query: CargoParameters) -> list[int]:
+        """Indexes of the rows selected by the where, order by, limit and offset of QUERY."""
+        if unsupported := set(query) - LOCAL_PARAMETERS:
+            raise UnsupportedQuery(f"{', '.join(sorted(unsupported))} are not evaluated locally")
+        tables = query.get("tables", self.name)
+        if not isinstance(tables, str) or tables.strip().casefold() != self.name.casefold():
+            raise UnsupportedQuery(f"Only {self.name} is stored")
+
+        where = query.get("where")
+        rows = self.where(where) if isinstance(where, str) and where.strip() else list(range(len(self.moves)))
+        if isinstance(order_by := query.get("order_by"), str) and order_by.strip():
+            rows = self.order_by(rows, order_by)
+        limit = query.get("limit")
+        try:
+            offset = int(query.get("offset", 0))
+            end = None if limit is None else offset + int(limit)
+        except (TypeError, ValueError) as e:
+            raise UnsupportedQuery(f"Can not page by {limit!r} rows from {query.get('offset')!r}") from e
+        return rows[offset:end]
+
+    def query(self, query: CargoParameters) -> list[Move]:
+        """The moves selected by QUERY, in order."""
+        return [self.moves[i] for i in self.select(query)]
+
+    def project(self, rows: list[int], names: list[str]) -> list[dict[str, Any]]:
+        """Values of the fields NAMES of ROWS."""
+        columns = [(name, self.column(name)) for name in names]
+        return [{name: _value(column, i) for name, column in columns} for i in rows]
+
+
+def _frame_columns(column: TextColumn) -> dict[str, NumberColumn]:
+    """Integer columns of the first, lowest and highest number of every value of COLUMN."""
+    # Parsed once per distinct value, the last entry is looked up for rows without a value
+    frames = [parse_frames(v) for v in column.dictionary] + [None]
+    rows = [frames[c] for c in column.codes]
+    nulls = bytes(f is None for f in rows)
+    return {
+        suffix: NumberColumn(array("q", (0 if f is None else getattr(f, suffix) for f in rows)), nulls)
+        for suffix in FRAME_SUFFIXES
+    }
+
+
+def _value(column: Column, row: int) -> Any:
+    match column:
+        case NumberColumn():
+            if column.nulls[row]:
+                return None
+            return bool(column.values[row]) if column.boolean else column.values[row]
+        case TextColumn():
+            code = column.codes[row]
+            return None if code < 0 else column.dictionary[code]
+        case ListColumn():
+            return column.values[row]
+
+
+def _sort_key(column: Column) -> Callable[[int], Any]:
+    match column:
+        case NumberColumn():
+            return lambda i: (not column.nulls[i], column.values[i])
+        case TextColumn():
+            keys = [_text_key(v) for v in column.dictionary]
+            return lambda i: (column.codes[i] >= 0, keys[column.codes[i]] if column.codes[i] >= 0 else "")
+        case ListColumn():
+            raise UnsupportedQuery("Can not order by a list field")
+
+
+# A condition evaluates to the rows it is true for and the rows it is unknown for
+Truth = tuple[Mask, Mask]
+
+
+class _Parser:
+    """Recursive descent over the tokens of a where clause, evaluating it along the way."""
+
+    def __init__(self, table: ColumnarTable, tokens: list[Token]) -> None:
+        self.table = table
+        self.tokens = tokens
+
+    def peek(self, kind: str, value: Any = None) -> bool:
+        return bool(self.tokens) and self.tokens[0][0] == kind and (value is None or self.tokens[0][1] == value)
+
+    def take(self, kind: str, value: Any = None) -> Any:
+        if not self.peek(kind, value):
+            found = self.tokens[0][1] if self.tokens else "the end"
+            raise UnsupportedQuery(f"Expected {value or kind}, found {found!r}")
+        return self.tokens.pop(0)[1]
+
+    def expression(self) -> Truth:
+        true, unknown = self.conjunction()
+        while self.peek("keyword", "OR"):
+            self.take("keyword")
+            other_true, other_unknown = self.conjunction()
+            true |= other_true
+            unknown = (unknown | other_unknown) & ~true
+        return true, unknown
+
+    def conjunction(self) -> Truth:
+        true, unknown = self.negation()
+        while self.peek("keyword", "AND"):
+            self.take("keyword")
+            other_true, other_unknown = self.negation()
+            false = self.table.all & ~(true | unknown)
+            other_false = self.table.all & ~(other_true | other_unknown)
+            true &= other_true
+            unknown = (unknown | other_unknown) & ~(false | other_false)
+        return true, unknown
+
+    def negation(self) -> Truth:
+        if self.peek("keyword", "NOT"):
+            self.take("keyword")
+            true, unknown = self.negation()
+            return self.table.all & ~(true | unknown), unknown
+        if self.peek("punctuation", "("):
+            self.take("punctuation")
+            truth = self.expression()
+            self.take("punctuation", ")")
+            return truth
+        return self.condition()
+
+    def literals(self) -> list[Any]:
+        self.take("punctuation", "(")
+        values = [self.take("literal")]
+        while self.peek("punctuation", ","):
+            self.take("punctuation")
+            values.append(self.take("literal"))
+        self.take("punctuation", ")")
+        return values
+
+    def condition(self) -> Truth:
+        column = self.table.column(self.take("name"))
+        if self.peek("keyword", "IS"):
+            self.take("keyword")
+            negated = self.peek("keyword", "NOT") and bool(self.take("keyword"))
+            self.take("keyword", "NULL")
+            nulls = _nulls(column)
+            return (self.table.all & ~nulls if negated else nulls), 0
+        if self.peek("keyword", "HOLDS"):
+            self.take("keyword")
+            like = self.peek("keyword", "LIKE") and bool(self.take("keyword"))
+            return _holds(column, self.take("literal"), like)
+
+        negated = self.peek("keyword", "NOT") and bool(self.take("keyword"))
+        if self.peek("keyword", "LIKE"):
+            self.take("keyword")
+            pattern = like_pattern(str(self.take("literal")))
+            true, unknown = _test(column, lambda v: isinstance(v, str) and pattern.fullmatch(v) is not None, text=True)
+        elif self.peek("keyword", "IN"):
+            self.take("keyword")
+            true, unknown = 0, _nulls(column)
+            for literal in self.literals():
+                true |= _compare(column, "=", literal)[0]
+        elif negated:
+            raise UnsupportedQuery("NOT is only supported before LIKE and IN here")
+        else:
+            return _compare(column, self.take("operator"), self.take("literal"))
+        if negated:
+            return self.table.all & ~(true | unknown), unknown
+        return true, unknown
+
+
+def _nulls(column: Column) -> Mask:
+    match column:
+        case NumberColumn():
+            return _mask(column.nulls)
+        case TextColumn():
+            return _mask(c < 0 for c in column.codes)
+        case ListColumn():
+            return _mask(v is None for v in column.values)
+    return 0
+
+
+def _test(column: Column, test: Callable[[Any], bool], text: bool = False) -> Truth:
+    """Rows whose value passes TEST, TEST gets the distinct values of text columns once."""
+    match column:
+        case TextColumn():
+            # The last entry is looked up for rows without a value
+            passed = [1 if test(v) else 0 for v in column.dictionary] + [0]
+            return _mask(map(passed.__getitem__, column.codes)), _nulls(column)
+        case NumberColumn() if not text:
+            return _mask(0 if null else 1 if test(v) else 0 for v, null in zip(column.values, column.nulls)), _mask(
+                column.nulls
+            )
+    raise UnsupportedQuery(f"Can not compare a {type(column).__name__} like that")
+
+
+def _compare(column: Column, op: str, literal: Any) -> Truth:
+    compare = _COMPARISONS[op]
+    match column, literal:
+        case TextColumn(), str():
+            key = _text_key(literal)
+            return _test(column, lambda v: compare(_text_key(v), key))
+        case TextColumn(), _:
+            return _test(column, lambda v: compare(to_number(v), literal))
+        case NumberColumn(), str():
+            number = to_number(literal)
+            return _test(column, lambda v: compare(v, number))
+        case NumberColumn(), _:
+            return _test(column, lambda v: compare(v, literal))
+    raise UnsupportedQuery("List fields are only matched with HOLDS")
+
+
+def _holds(column: Column, literal: Any, like: bool) -> Truth:
+    if not isinstance(column, ListColumn):
+        raise UnsupportedQuery("HOLDS only applies to list fields")
+    pattern = like_pattern(str(literal)) if like else None
+    key = _text_key(str(literal))
+
+    def matches(v: Any) -> bool:
+        if pattern is not None:
+            return isinstance(v, str) and pattern.fullmatch(v) is not None
+        return _text_key(str(v)) == key
+
+    nulls = _nulls(column)
+    return _mask(0 if v is None else any(map(matches, v)) for v in column.values), nulls
@@ -0,0 +1,68 @@
+from dataclasses import field, make_dataclass
+from typing import Any, Optional
+
+import pytest
+from pydantic.dataclasses import dataclass as pydantic_dataclass
+
+from hunting_hawk.mediawiki.cargo import CargoClient, CargoParameters, Wikitext
+
+from hunting_hawk.mediawiki import cargo
+from .fetcher import CargoFetcher
+
+ROWS = [
+    {"chara": "Ky Kiske", "input": "236S", "name": "S Stun Edge", "damage": "20"},
+    {"chara": "Ky Kiske", "input": "623S", "name": "Vapor Thrust", "damage": "40"},
+    {"chara": "Baiken", "input": "41236H", "name": "Tatami Gaeshi", "damage": "30"},
+    {"chara": "Ky Kiske", "input": "5P", "name": "5P", "damage": "8"},
+    {"chara": "Baiken", "input": "j.D", "name": "j.D", "damage": "&amp;lt;b&amp;gt;32&amp;lt;/b&amp;gt;"},
+]
+
+
+@pytest.fixture
+def cargo_client() -> CargoClient:
+    return CargoClient(
+        "https://example.com",
+        "/wiki",
+        "/api.php",
+        "?title=Special:CargoExport",
+        "/Special:CargoTables",
+        limit=2,
+    )
+
+
+@pytest.fixture
+def rows() -> list[dict[str, Any]]:
+    """The rows of the fake upstream table, tests change them to change the table."""
+    return [dict(r) for r in ROWS]
+
+
+@pytest.fixture
+def cargo_calls(monkeypatch: pytest.MonkeyPatch, rows: list[dict[str, Any]]) -> list[CargoParameters]:
+    """Serve ROWS as every export, returns the parameters of the exports made."""
+    calls: list[CargoParameters] = []
+
+    def export(_: CargoClient, params: CargoParameters) -> list[Any]:
+        calls.append(params)
+        offset = params.get("offset", 0)
+        limit = params.get("limit", len(rows))
+        return [dict(r) for r in rows[offset : offset + limit]]
+
+    monkeypatch.setattr(cargo, "cargo_export", export)
+    return calls
+
+
+@pytest.fixture
+def fetcher(cargo_client: CargoClient, cargo_calls: list[CargoParameters]) -> CargoFetcher:
+    """A fetcher of the fake upstream table."""
+    flds = [
+        ("chara", Optional[str], field(default=None)),
+        ("input", Optional[str], field(default=None)),
+        ("name", Optional[str], field(default=None)),
+        ("damage", Optional[Wikitext], field(default=None)),
+    ]
+    move = pydantic_dataclass(make_dataclass("MoveData_Test", flds, frozen=True))  # type: ignore
+
+    f = CargoFetcher(cargo_client, "MoveData_Test")
+    # Skip the network round trip for the table definition
+    f.__dict__["move"] = move
+    return f
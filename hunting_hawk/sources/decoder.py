@@ -0,0 +1,235 @@
+"""Per table row decoders generated from the cargo table definition."""
+from dataclasses import fields
+from typing import Any, Callable, Optional, Union, get_args, get_origin
+
+from pydantic.dataclasses import DataclassProxy
+
+from hunting_hawk.mediawiki.cargo import CargoField, File, Move, Wikitext
+
+__all__ = ["Converter", "RowDecoder", "ValuePool"]
+
+Converter = Callable[[Any], Any]
+
+# Cargo's default list delimiter
+DEFAULT_DELIMITER = ","
+# Distinct values of a field that are shared, fields past it are mostly ids and free form notes
+POOL_SIZE = 4096
+
+# The coercions below mirror the pydantic validators of the table definition so that
+# decoded moves are identical to validated ones.
+
+_FALSE = {"0", "off", "f", "false", "n", "no"}
+_TRUE = {"1", "on", "t", "true", "y", "yes"}
+
+
+def _to_str(v: Any) -> str:
+    match v:
+        case str():
+            return v
+        case int() | float():
+            return str(v)
+        case bytes():
+            return v.decode()
+        case _:
+            raise TypeError(f"{v!r} is not a valid string")
+
+
+def _to_text(v: Any) -> str:
+    if not isinstance(v, str):
+        raise TypeError("Not a string value")
+    return v
+
+
+def _to_int(v: Any) -> int:
+    if isinstance(v, int) and not isinstance(v, bool):
+        return v
+    return int(v)
+
+
+def _to_float(v: Any) -> float:
+    if isinstance(v, float):
+        return v
+    return float(v)
+
+
+def _to_bool(v: Any) -> bool:
+    if v is True or v is False:
+        return v
+    key = v.decode() if isinstance(v, bytes) else v
+    if isinstance(key, str):
+        key = key.lower()
+    if key in _FALSE or key == 0:
+        return False
+    if key in _TRUE or key == 1:
+        return True
+    raise ValueError(f"{v!r} is not a valid boolean")
+
+
+_SCALARS: dict[Any, Converter] = {
+    str: _to_str,
+    int: _to_int,
+    float: _to_float,
+    bool: _to_bool,
+    File: _to_text,
+    Wikitext: _to_text,
+}
+
+
+class ValuePool:
+    """Hands out a single shared object for every distinct string value of a field.
+
+    Frame data repeats a handful of values like "-", "Mid" or the character name across
+    thousands of rows, each parsed into its own string. Once MAX_VALUES distinct values
+    were seen, new ones are passed through unshared."""
+
+    def __init__(self, max_values: int = POOL_SIZE) -> None:
+        self.max_values = max_values
+        self.values: dict[str, str] = {}
+
+    def share(self, v: str) -> str:
+        if len(self.values) < self.max_values:
+            return self.values.setdefault(v, v)
+        return self.values.get(v, v)
+
+    def __call__(self, v: Any) -> Any:
+        match v:
+            case str():
+                return self.share(v)
+            case list():
+                return [self.share(i) if isinstance(i, str) else i for i in v]
+            case _:
+                return v
+
+
+def _is_text(tp: Any) -> bool:
+    """Whether TP holds strings or lists of strings."""
+    inner = _unwrap_optional(tp)
+    if get_origin(inner) is list:
+        (inner,) = get_args(inner)
+    return inner in (str, File, Wikitext)
+
+
+def _unwrap_optional(tp: Any) -> Any:
+    if get_origin(tp) is Union:
+        (inner,) = (a for a in get_args(tp) if a is not type(None))
+        return inner
+    return tp
+
+
+def _coercer(tp: Any) -> tuple[Converter, bool]:
+    """Return a coercion for the annotation TP and whether TP is a list."""
+    inner = _unwrap_optional(tp)
+    if get_origin(inner) is list:
+        (item_type,) = get_args(inner)
+        item = _SCALARS[item_type]
+
+        def to_list(v: Any) -> list[Any]:
+            if not isinstance(v, (list, tuple, set, frozenset)):
+                raise TypeError(f"{v!r} is not a valid list")
+            return [item(i) for i in v]
+
+        return to_list, True
+    return _SCALARS[inner], False
+
+
+def _compile(coerce: Converter, transform: Optional[Converter], delimiter: Optional[str]) -> Converter:
+    """Chain splitting, the fetcher transform and the type coercion of a single field."""
+
+    def split(v: Any) -> Any:
+        if not isinstance(v, str) or delimiter is None:
+            return v
+        return [i.strip() for i in v.split(delimiter)] if v.strip() else []
+
+    match (transform, delimiter):
+        case (None, None):
+            return coerce
+        case (None, _):
+            return lambda v: coerce(split(v))
+        case (_, None):
+
+            def transformed(v: Any) -> Any:
+                v = transform(v)  # type: ignore
+                return None if v is None else coerce(v)
+
+            return transformed
+        case _:
+
+            def split_transformed(v: Any) -> Any:
+                v = transform(split(v))  # type: ignore
+                return None if v is None else coerce(v)
+
+            return split_transformed
+
+
+class RowDecoder:
+    """Decode cargo export rows into moves of a single table.
+
+    Every field gets a converter chosen once from its type, so a row costs one call per
+    field and the moves skip the generic pydantic validation. The string values of every
+    field are shared between the moves through a pool per field."""
+
+    def __init__(self, move: DataclassProxy, transforms: dict[str, Converter], pool: bool = True) -> None:
+        self.move = move
+        self.cls: Any = move.__dataclass__
+        self.steps: list[tuple[str, Converter, Optional[ValuePool]]] = []
+        # Delimiters of the list fields
+        self.delimiters: dict[str, str] = {}
+        self.pools: dict[str, ValuePool] = {}
+        for f in fields(self.cls):
+            coerce, is_list = _coercer(f.type)
+            delimiter = None
+            if is_list:
+                cargo_field: Optional[CargoField] = f.metadata.get("cargo")
+                delimiter = (cargo_field.delimiter if cargo_field else None) or DEFAULT_DELIMITER
+                self.delimiters[f.name] = delimiter
+            shared = ValuePool() if pool and _is_text(f.type) else None
+            if shared is not None:
+                self.pools[f.name] = shared
+            self.steps.append((f.name, _compile(coerce, transforms.get(f.name), delimiter), shared))
+
+    def items(self, row: dict[Any, Any], name: str) -> list[Any]:
+        """Raw values of field NAME of ROW, split like the field is before it is converted."""
+        v = row.get(name)
+        match v:
+            case None:
+                return []
+            case str() if name in self.delimiters:
+                return [i.strip() for i in v.split(self.delimiters[name])]
+            case list() | tuple():
+                return list(v)
+            case _:
+                return [v]
+
+    def values(self, row: dict[Any, Any]) -> dict[str, Any]:
+        """Converted field values of ROW, missing fields are None."""
+        values = {}
+        for name, convert, pool in self.steps:
+            v = row.get(name)
+            if v is not None:
+                v = convert(v)
+                if pool is None or v is None:
+                    pass
+                # Inlined ValuePool.share, this runs for most values of every row
+                elif v.__class__ is str:
+                    shared = pool.values
+                    v = shared.setdefault(v, v) if len(shared) < pool.max_values else shared.get(v, v)
+                else:
+                    v = pool(v)
+            values[name] = v
+        return values
+
+    def shared(self, values: dict[str, Any]) -> dict[str, Any]:
+        """VALUES converted elsewhere, sharing their strings with the moves decoded so far."""
+        pools = self.pools
+        return {k: pools[k](v) if k in pools and v is not None else v for k, v in values.items()}
+
+    def build(self, values: dict[str, Any]) -> Move:
+        """Construct a move from already converted VALUES without validating them again."""
+        move = self.cls.__new__(self.cls)
+        move.__dict__.update(values)
+        # Tells pydantic the values have been validated
+        object.__setattr__(move, "__pydantic_initialised__", True)
+        return move  # type: ignore[no-any-return]
+
+    def __call__(self, row: dict[Any, Any]) -> Move:
+        return self.build(self.values(row))
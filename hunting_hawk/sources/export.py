@@ -0,0 +1,36 @@
+"""Dump whole sources to artifacts the api can boot from"""
+import argparse
+import importlib
+import logging
+from pathlib import Path
+from typing import Optional
+
+from .artifact import artifact_path, dump
+from .fetcher import CargoFetcher
+
+
+def resolve(name: str) -> CargoFetcher:
+    """Find a source by NAME, e.g. dustloop.GGST, sources.dustloop.GGST or hunting_hawk.sources.dustloop.GGST."""
+    module, _, attr = name.removeprefix("hunting_hawk.").removeprefix("sources.").rpartition(".")
+    if not module:
+        raise ValueError(f"Expected a source like dustloop.GGST, got {name}")
+    source = getattr(importlib.import_module(f"hunting_hawk.sources.{module}"), attr, None)
+    if not isinstance(source, CargoFetcher):
+        raise ValueError(f"{name} is not a source")
+    return source
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Dump whole cargo tables to artifacts the api can boot from.")
+    parser.add_argument("sources", nargs="+", help="sources to dump, e.g. dustloop.GGST wavu.T8")
+    parser.add_argument("-o", "--output", type=Path, default=Path("artifacts"), help="directory to write to")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    fetchers = [resolve(name) for name in args.sources]
+    for fetcher in fetchers:
+        dump(fetcher, artifact_path(args.output, fetcher))
+
+
+if __name__ == "__main__":
+    main()
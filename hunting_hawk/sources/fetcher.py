@@ -1,34 +1,53 @@
 """Generic wrapper for a MediaWiki cargo page."""
+import asyncio
 import logging
-import re
-import xml.etree.ElementTree as ET
+import threading
 from abc import abstractmethod
 from collections.abc import Mapping
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from dataclasses import fields
+from dataclasses import dataclass, fields, replace
 from functools import cached_property
-from html import unescape
-from typing import Any, Iterator, Optional
+from typing import Any, Iterable, Iterator, Optional
 
 from pydantic.dataclasses import DataclassProxy
 
+from hunting_hawk.cache.schema import SchemaCache, schemas
 from hunting_hawk.mediawiki.cargo import (
     CargoClient,
+    CargoFields,
     CargoParameters,
     File,
     Move,
     Wikitext,
-    cargo_export,
-    parse_cargo_table,
+    aiter_cargo_export,
+    build_table_type,
+    iter_cargo_export,
+    parse_cargo_fields,
 )
 from hunting_hawk.mediawiki.client import ClientError
-from hunting_hawk.mediawiki.filepath import get_file_path
+from hunting_hawk.mediawiki.filepath import FilePaths, file_paths
 from hunting_hawk.mediawiki.scrape.scrape import (
-    parse_cargo_table as fallback_parse_table,
+    parse_cargo_fields as fallback_parse_fields,
 )
-from hunting_hawk.util.normalize import fuzzy_string, reverse_notation
+from hunting_hawk.util import wikitext
+from hunting_hawk.util.normalize import fuzzy_string, normalize, reverse_notation
+from hunting_hawk.util.singleflight import SingleFlight
 
-__all__ = ["CargoFetcher", "MoveDataFetcher"]
+from .columnar import ColumnarTable, UnsupportedQuery, frame_columns, frame_fields
+from .decoder import RowDecoder
+from .index import MoveIndex
+
+__all__ = ["CargoFetcher", "MoveDataFetcher", "Snapshot"]
+
+# Page names per lookup of the characters stored on them
+PAGES_PER_QUERY = 50
+# Rows whose files are resolved together while a whole table is loaded
+ROWS_PER_RESOLVE = 1000
+
+
+def quote_sql(value: str) -> str:
+    """Quote VALUE as a string literal of a cargo where clause."""
+    escaped = value.replace("'", "''")
+    return f"'{escaped}'"
 
 
 class MoveDataFetcher(Mapping[Any, Any]):
@@ -50,56 +69,135 @@ class MoveDataFetcher(Mapping[Any, Any]):
         pass
 
 
+@dataclass(frozen=True)
+class FieldPlan:
+    """How the fields of a table are converted, computed once per table."""
+
+    file_fields: frozenset[str]
+    wikitext_fields: frozenset[str]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """An in-process copy of a whole cargo table grouped by character."""
+
+    # Raw values of the default key in upstream order
+    characters: list[str]
+    # Keyed by the casefolded raw value of the default key
+    moves: dict[str, list[Move]]
+
+    def get(self, char: str) -> list[Move]:
+        return list(self.moves.get(char.casefold(), []))
+
+
 class CargoFetcher(MoveDataFetcher):
     """Fetcher more specific to Fighting game wikis."""
 
     client: CargoClient
     table_name: str
+    snapshot: Optional[Snapshot]
+    # Coalesces concurrent upstream lookups of the same moves
+    flight: SingleFlight[list[Move]]
+    # Local search over every full movelist fetched so far
+    index: MoveIndex
+    # Table definitions persisted across restarts
+    schemas: SchemaCache = schemas
+    # Share equal string values between the decoded moves of the table
+    share_values: bool = True
 
     def __init__(self, cargo: CargoClient, table_name: str, default_key: str = "chara") -> None:
         """Init a cargo object and fetch move definition."""
         self.client = cargo
         self.table_name = table_name
         self.default_key = default_key
-
-    @cached_property
-    def move(self) -> DataclassProxy:
-        """Lazy load the cargo table definition."""
+        self.snapshot = None
+        self.flight = SingleFlight()
+        self.index = MoveIndex()
+        # Columnar copy of the snapshot it was built from
+        self._columns: Optional[tuple[Snapshot, ColumnarTable]] = None
+        self._columns_lock = threading.Lock()
+        # Serializes the snapshot updates of refreshes, readers use whichever snapshot is current
+        self._snapshot_lock = threading.Lock()
+
+    def _fetch_fields(self) -> CargoFields:
+        """Retrieve the table definition from the wiki."""
         logging.info(f"Retrieving table definition for {self.table_name}")
         try:
-            return parse_cargo_table(self.client, self.table_name)
+            return parse_cargo_fields(self.client, self.table_name)
         except ClientError as e:
             logging.info(f"Table parse failed with:{e} . Falling back to an HTML parser.")
-            return fallback_parse_table(self.client, self.table_name)
+            return fallback_parse_fields(self.client, self.table_name)
+
+    @property
+    def schema_key(self) -> str:
+        return f"{self.client.index_endpoint()}:{self.table_name}"
+
+    def _revalidate_fields(self, cached: CargoFields) -> None:
+        """Compare a table definition loaded from disk with the wiki and store it if it changed."""
+        try:
+            fields = self._fetch_fields()
+        except Exception as e:
+            logging.warning(f"Failed to revalidate the table definition of {self.table_name}: {e}")
+            return
+
+        if fields != cached:
+            logging.warning(f"Table definition of {self.table_name} changed. Restart to pick it up")
+            self.schemas.set(self.schema_key, fields.dict())
+
+    @cached_property
+    def table_fields(self) -> CargoFields:
+        """Lazy load the cargo field definitions, from the schema cache when possible."""
+        if (cached := self.schemas.get(self.schema_key)) is not None:
+            table_fields = CargoFields.parse_obj(cached)
+            if self.schemas.revalidate:
+                threading.Thread(target=self._revalidate_fields, args=(table_fields,), daemon=True).start()
+            return table_fields
+
+        table_fields = self._fetch_fields()
+        self.schemas.set(self.schema_key, table_fields.dict())
+        return table_fields
+
+    def use_fields(self, table_fields: CargoFields) -> None:
+        """Use TABLE_FIELDS as the table definition instead of resolving it."""
+        if "move" in self.__dict__:
+            raise ValueError(f"The table definition of {self.table_name} is already in use")
+        self.__dict__["table_fields"] = table_fields
+
+    @cached_property
+    def move(self) -> DataclassProxy:
+        """Lazy load the cargo table definition."""
+        return build_table_type(self.table_name, self.table_fields)
+
+    @property
+    def files(self) -> FilePaths:
+        """Direct urls of the files of the wiki."""
+        return file_paths(self.client)
 
     # TODO: Use type annotations
     def _convert_url(self, val: list[str] | str) -> list[str] | str:
+        files = self.files
         match val:
             case list():
-                return [get_file_path(self.client, f) for f in val]
+                return [files.url(f) for f in val]
             case str():
-                return get_file_path(self.client, val)
+                return files.url(val)
+
+    def _resolve_files(self, rows: list[dict[Any, Any]]) -> None:
+        """Resolve the files of ROWS in batches, before the rows are converted one by one."""
+        decoder = self.decoder
+        names = [f for row in rows for k in self.plan.file_fields for f in decoder.items(row, k) if isinstance(f, str)]
+        if names:
+            self.files.resolve(names)
 
-    # TODO:
-    # Send this to the abyss
     def _parse_wikitext(self, val: Wikitext) -> str:
         """Attempt to get the text value of a wikitext tag."""
-        wikit = unescape(unescape(val))
-        try:
-            inner = ET.fromstring(wikit).text
-            if not inner:
-                return wikit
-            return re.sub("^'''|'''$", "", inner)
-        except ET.ParseError:
-            pass
-        return wikit
+        return wikitext.decode(val)
 
     def _unescape_html(self, val: list[Wikitext] | Wikitext) -> list[str] | str:
         match val:
             case list():
-                # TODO: DEFINITELY NUKE THIS
                 # Wiki returns &amp for incomplete codes
-                return [unescape(unescape(link)) for link in val if unescape(unescape(link)).strip()]
+                return wikitext.decode_list(val)
             case str():
                 return self._parse_wikitext(val)
             case int() | float():
@@ -119,94 +217,295 @@ class CargoFetcher(MoveDataFetcher):
     def wikitext_fields(self) -> list[str]:
         return [f.name for f in fields(self.move) if f.type == Optional[Wikitext] or f.type == Optional[list[Wikitext]]]  # type: ignore
 
+    @cached_property
+    def plan(self) -> FieldPlan:
+        """Conversion plan for the fields of the table definition."""
+        return FieldPlan(frozenset(self.file_fields()), frozenset(self.wikitext_fields()))
+
+    @cached_property
+    def decoder(self) -> RowDecoder:
+        """Row decoder generated from the table definition."""
+        plan = self.plan
+        # File conversion wins for fields that are both
+        transforms = {k: self._unescape_html for k in plan.wikitext_fields} | {
+            k: self._convert_url for k in plan.file_fields
+        }
+        return RowDecoder(self.move, transforms, pool=self.share_values)  # type: ignore
+
     def _mutate_fields(self, flds: dict[Any, Any]) -> dict[Any, Any]:
-        file_dicts = {k: self._convert_url(v) for k, v in flds.items() if k in self.file_fields()}
-        unescaped_html = {k: self._unescape_html(v) for k, v in flds.items() if k in self.wikitext_fields()}
+        plan = self.plan
+        converted = {}
+        for k, v in flds.items():
+            if k in plan.file_fields:
+                converted[k] = self._convert_url(v)
+            elif k in plan.wikitext_fields:
+                converted[k] = self._unescape_html(v)
 
-        return flds | unescaped_html | file_dicts
+        return flds | converted
 
     def fill_move(self, move: dict[Any, Any]) -> Any:
-        flds = fields(self.move)  # type: ignore
-        blank_fields = {t.name: None for t in flds}
-        filled_move = blank_fields | self._mutate_fields(move)
-        return self.move(**filled_move)
-
-    def _list_to_moves(self, moves: list[Any]) -> list[Move]:
-        """Copy all keys from res to Character."""
-
-        res = []
-        with ThreadPoolExecutor() as executor:
-            futures = (executor.submit(self.fill_move, move) for move in moves)
-            done = as_completed(futures)
-            for future in done:
-                try:
-                    mv = future.result()
-                    res.append(mv)
-                except Exception as e:
-                    logging.warning(f"Move retrieval failed with {e}. Skipping move")
-
-        return res
-
-    def _get(self, params: CargoParameters) -> list[Move]:
-        """Wrap around cargo_export."""
+        return self.decoder(move)
 
+    def _to_move(self, row: dict[Any, Any]) -> Optional[Move]:
+        try:
+            return self.fill_move(row)  # type: ignore[no-any-return]
+        except Exception as e:
+            logging.warning(f"Move retrieval failed with {e}. Skipping move")
+            return None
+
+    def _list_to_moves(self, moves: Iterable[Any]) -> list[Move]:
+        """Convert every row to a move, keeping the upstream order."""
+        rows = list(moves)
+        self._resolve_files(rows)
+        return [m for m in map(self._to_move, rows) if m is not None]
+
+    def _params(self) -> CargoParameters:
+        """Parameters selecting every field of the table."""
         field_param = [f.name for f in fields(self.move)] + [self.default_key]  # type: ignore
 
-        merged_params: CargoParameters = {
+        return {
             "fields": ",".join(field_param),
             "tables": self.table_name,
         }
-        result = cargo_export(self.client, merged_params | params)
-        return self._list_to_moves(result)
 
-    def get_moves(self, char: str) -> list[Move]:
-        """Return the movelist for a character CHARA."""
+    def _get(self, params: CargoParameters) -> list[Move]:
+        """Wrap around iter_cargo_export."""
+        return self._list_to_moves(iter_cargo_export(self.client, self._params() | params))
+
+    async def _aget(self, params: CargoParameters) -> list[Move]:
+        """Wrap around aiter_cargo_export."""
+        rows = [row async for row in aiter_cargo_export(self.client, self._params() | params)]
+        await asyncio.to_thread(self._resolve_files, rows)
+        return [m for m in map(self._to_move, rows) if m is not None]
+
+    def load_snapshot(self) -> Snapshot:
+        """Fetch the whole table once and serve every further lookup from memory."""
+        logging.info(f"Loading a snapshot of {self.table_name}")
+        grouped: dict[str, list[Move]] = {}
+        characters: list[str] = []
+        # Rows are converted page by page while the next one is fetched
+        for row in self._files_resolved(iter_cargo_export(self.client, self._params())):
+            key = row.get(self.default_key)
+            if not isinstance(key, str):
+                logging.warning(f"Row without a {self.default_key} in {self.table_name}. Skipping move")
+                continue
+            if key.casefold() not in grouped:
+                characters.append(key)
+                grouped[key.casefold()] = []
+            if (move := self._to_move(row)) is not None:
+                grouped[key.casefold()].append(move)
+
+        return self.set_snapshot(Snapshot(characters, grouped))
+
+    def _files_resolved(self, rows: Iterable[dict[Any, Any]]) -> Iterator[dict[Any, Any]]:
+        """Pass ROWS through, resolving their files every ROWS_PER_RESOLVE rows."""
+        pending: list[dict[Any, Any]] = []
+        for row in rows:
+            pending.append(row)
+            if len(pending) == ROWS_PER_RESOLVE:
+                self._resolve_files(pending)
+                yield from pending
+                pending = []
+        self._resolve_files(pending)
+        yield from pending
+
+    def set_snapshot(self, snapshot: Snapshot) -> Snapshot:
+        """Serve every further lookup from SNAPSHOT."""
+        for key, moves in snapshot.moves.items():
+            self.index.add(key, moves)
+        self.snapshot = snapshot
+        logging.info(f"Loaded {len(snapshot.characters)} characters from {self.table_name}")
+        return snapshot
+
+    def _search(self, char: str, query: str) -> list[Move]:
+        return self.index.lookup(char, query) or self.index.search(char, query)
+
+    def search(self, char: str, query: str) -> list[Move]:
+        """Search the locally indexed moves of CHAR, empty if CHAR was never fully fetched."""
+        return self._search(char, query)
+
+    def _moves_params(self, char: str) -> CargoParameters:
+        return {"where": f"{self.table_name}.{self.default_key}={quote_sql(char)}"}
+
+    def _exact_params(self, char: str, input: str) -> CargoParameters:
+        return {
+            "where": (
+                f"{self.table_name}.{self.default_key}={quote_sql(char)}"
+                f" AND input={quote_sql(input)} OR name={quote_sql(input)}"
+            ),
+        }
 
-        params: CargoParameters = {"where": f"{self.table_name}.{self.default_key}='{char}'"}
-        return self._get(params)
+    def _fuzzy_params(self, char: str, input: str) -> CargoParameters:
+        key = f"{self.table_name}.{self.default_key}={quote_sql(char)}"
+        return {
+            "where": (
+                f"({key} AND input LIKE {quote_sql(fuzzy_string(input))})"
+                f" OR ({key} AND input LIKE {quote_sql(fuzzy_string(reverse_notation(input)))})"
+                f" OR (name LIKE {quote_sql(fuzzy_string(input))})"
+            )
+        }
 
-    def get_moves_by_input(self, char: str, input: str) -> list[Move]:
+    def _flight_key(self, char: str, input: Optional[str] = None) -> tuple[str, str, Optional[str]]:
+        return (self.table_name, char.casefold(), normalize(input) if input is not None else None)
+
+    def _indexed(self, char: str, moves: list[Move]) -> list[Move]:
+        if moves:
+            self.index.add(char, moves)
+        return moves
+
+    def get_moves(self, char: str) -> list[Move]:
         """Return the movelist for a character CHARA."""
-        exact_params: CargoParameters = {
-            "where": f"{self.table_name}.{self.default_key}='{char}' AND input='{input}' OR name='{input}'",
-        }
-        result = self._get(exact_params)
+        if self.snapshot is not None:
+            return self.snapshot.get(char)
+
+        return self.flight.do(self._flight_key(char), lambda: self._indexed(char, self._get(self._moves_params(char))))
+
+    def refresh(self, char: str, input: Optional[str] = None) -> list[Move]:
+        """Fetch the movelist of CHAR, or its moves matching INPUT, from upstream again.
+
+        Skips the snapshot and the local index, a refreshed movelist replaces both."""
+        if input is not None:
+            return self.flight.do(self._flight_key(char, input), lambda: self._get_moves_by_input(char, input))
+
+        moves = self.flight.do(self._flight_key(char), lambda: self._indexed(char, self._get(self._moves_params(char))))
+        if moves:
+            with self._snapshot_lock:
+                if (snapshot := self.snapshot) is not None:
+                    # A new snapshot replaces the current one, readers may be iterating it
+                    characters = snapshot.characters
+                    if char.casefold() not in snapshot.moves:
+                        characters = [*characters, char]
+                    self.snapshot = replace(snapshot, characters=characters, moves=snapshot.moves | {char.casefold(): moves})
+        return moves
+
+    def changed_characters(self, pages: list[str]) -> list[str]:
+        """Return the characters with moves stored on any of PAGES."""
+        characters: list[str] = []
+        # Keeps the where clause well within url length limits
+        for i in range(0, len(pages), PAGES_PER_QUERY):
+            titles = ",".join(quote_sql(p) for p in pages[i : i + PAGES_PER_QUERY])
+            params: CargoParameters = {
+                "tables": self.table_name,
+                "fields": self.default_key,
+                "where": f"{self.table_name}._pageName IN ({titles})",
+                "group_by": f"{self.table_name}.{self.default_key}",
+            }
+            for row in iter_cargo_export(self.client, params):
+                if (char := self._mutate_fields(row)[self.default_key]) not in characters:
+                    characters.append(char)
+        return characters
+
+    def _get_moves_by_input(self, char: str, input: str) -> list[Move]:
+        result = self._get(self._exact_params(char, input))
         if result:
             return result
 
-        fuzzy_params: CargoParameters = {
-            "where": (
-                f"({self.table_name}.{self.default_key}='{char}'"
-                f" AND input LIKE '{fuzzy_string(input)}')"
-                f" OR ({self.table_name}.{self.default_key}='{char}'"
-                f" AND input LIKE '{fuzzy_string(reverse_notation(input))}')"
-                f" OR (name LIKE '{fuzzy_string(input)}')"
-            )
-        }
+        return self._get(self._fuzzy_params(char, input))
 
-        return self._get(fuzzy_params)
+    def get_moves_by_input(self, char: str, input: str) -> list[Move]:
+        """Return the moves of CHAR matching INPUT.
+
+        Searches the local index first, moves added upstream since the snapshot or the last
+        fetch of the movelist are only found by the upstream queries."""
+        if local := self._search(char, input):
+            return local
+
+        return self.flight.do(self._flight_key(char, input), lambda: self._get_moves_by_input(char, input))
+
+    def columns(self) -> Optional[ColumnarTable]:
+        """Columnar copy of the snapshot, built on first use and None without a snapshot."""
+        if (snapshot := self.snapshot) is None:
+            return None
+        with self._columns_lock:
+            if self._columns is None or self._columns[0] is not snapshot:
+                moves: list[Move] = []
+                keys: list[str] = []
+                for char in snapshot.characters:
+                    grouped = snapshot.moves.get(char.casefold(), [])
+                    moves.extend(grouped)
+                    keys.extend(char for _ in grouped)
+                self._columns = (snapshot, ColumnarTable(self.table_name, self.move, moves, {self.default_key: keys}))
+            return self._columns[1]
+
+    def _local_query(self, query: CargoParameters) -> Optional[list[Move]]:
+        """Answer QUERY from the snapshot, None if it has to be sent upstream."""
+        if (columns := self.columns()) is None:
+            return None
+        try:
+            return columns.query(query)
+        except UnsupportedQuery as e:
+            logging.debug(f"Sending a query of {self.table_name} upstream: {e}")
+            return None
+
+    def _check_upstream(self, query: CargoParameters) -> None:
+        """Raise UnsupportedQuery if QUERY uses parsed frame data columns the wiki does not know."""
+        stored = {f.name.casefold() for f in fields(self.move)}  # type: ignore
+        if local := sorted(frame_columns(query, frame_fields(self.move)) - stored):
+            raise UnsupportedQuery(
+                f"{', '.join(local)} of {self.table_name} are only answered from a loaded snapshot"
+                " and with the where and order by syntax evaluated locally"
+            )
 
     def query(self, query: CargoParameters) -> list[Move]:
+        if (local := self._local_query(query)) is not None:
+            return local
+        self._check_upstream(query)
         return self._get(query)
 
+    async def _aget_moves(self, char: str) -> list[Move]:
+        return self._indexed(char, await self._aget(self._moves_params(char)))
+
+    async def aget_moves(self, char: str) -> list[Move]:
+        """Return the movelist for a character CHARA without blocking the event loop."""
+        if self.snapshot is not None:
+            return self.snapshot.get(char)
+
+        return await self.flight.ado(self._flight_key(char), lambda: self._aget_moves(char))
+
+    async def _aget_moves_by_input(self, char: str, input: str) -> list[Move]:
+        result = await self._aget(self._exact_params(char, input))
+        if result:
+            return result
+
+        return await self._aget(self._fuzzy_params(char, input))
+
+    async def aget_moves_by_input(self, char: str, input: str) -> list[Move]:
+        """Return the moves of CHAR matching INPUT without blocking the event loop."""
+        if local := self._search(char, input):
+            return local
+
+        return await self.flight.ado(self._flight_key(char, input), lambda: self._aget_moves_by_input(char, input))
+
+    async def aquery(self, query: CargoParameters) -> list[Move]:
+        if (local := await asyncio.to_thread(self._local_query, query)) is not None:
+            return local
+        self._check_upstream(query)
+        return await self._aget(query)
+
     def __getitem__(self, char: str) -> list[Move]:
         """Return the movelist for a character CHARA."""
         return self.get_moves(char)
 
     def __iter__(self) -> Iterator[Move]:
         """Iterate over all characters."""
+        if self.snapshot is not None:
+            return (self._mutate_fields({self.default_key: c})[self.default_key] for c in self.snapshot.characters)
+
         iter_params: CargoParameters = {
             "group_by": f"{self.table_name}.{self.default_key}",
             "tables": self.table_name,
             "fields": self.default_key,
         }
-        data = cargo_export(self.client, iter_params)
+        data = iter_cargo_export(self.client, iter_params)
         return (self._mutate_fields(c)[self.default_key] for c in data)
 
     def __len__(self) -> int:
         """Get the character count."""
+        if self.snapshot is not None:
+            return len(self.snapshot.characters)
+
         length_params: CargoParameters = {
             "group_by": self.default_key,
             "tables": self.table_name,
         }
-        return len(cargo_export(self.client, length_params))
+        return sum(1 for _ in iter_cargo_export(self.client, length_params))
@@ -0,0 +1,118 @@
+"""In-process search index over fetched moves."""
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from hunting_hawk.mediawiki.cargo import Move
+from hunting_hawk.util.normalize import canonical_notation, normalize, notation_variants
+
+__all__ = ["MoveIndex"]
+
+# Attributes of a move that are matched against
+SEARCH_FIELDS = ("input", "name")
+
+
+def text(move: Move, attr: str) -> str:
+    """Normalized text value of a move attribute, empty if missing."""
+    val = getattr(move, attr, None)
+    if not isinstance(val, str):
+        return ""
+    return normalize(val)
+
+
+def grams(term: str, n: int = 3) -> set[str]:
+    """Character n-grams of TERM padded with boundary markers."""
+    padded = f"^{term}$"
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i : i + n] for i in range(len(padded) - n + 1)}
+
+
+def score(query: str, query_grams: set[str], term: str) -> float:
+    """Rank how well TERM matches QUERY between 0 and 1."""
+    if query == term:
+        return 1.0
+    if term.startswith(query):
+        return 0.9
+    if query in term:
+        return 0.8
+    term_grams = grams(term)
+    # Dice coefficient of the two gram sets
+    return 0.7 * 2 * len(query_grams & term_grams) / (len(query_grams) + len(term_grams))
+
+
+@dataclass(frozen=True)
+class _Doc:
+    move: Move
+    terms: tuple[str, ...]
+
+
+class _CharacterIndex:
+    def __init__(self, moves: list[Move]) -> None:
+        self.docs: list[_Doc] = []
+        self.postings: dict[str, set[int]] = {}
+        # Canonical notation of every input and name -> moves
+        self.aliases: dict[str, list[Move]] = {}
+        for move in moves:
+            terms = {text(move, f) for f in SEARCH_FIELDS}
+            # Every notation variant of the input is searchable as well
+            terms |= notation_variants(text(move, "input"))
+            terms.discard("")
+
+            doc_id = len(self.docs)
+            self.docs.append(_Doc(move, tuple(terms)))
+            for term in terms:
+                for gram in grams(term):
+                    self.postings.setdefault(gram, set()).add(doc_id)
+
+            for alias in {canonical_notation(t) for t in terms}:
+                self.aliases.setdefault(alias, []).append(move)
+
+
+class MoveIndex:
+    """N-gram index over the input, name and notation alias of every move, per character."""
+
+    # Matches scoring below this are dropped
+    min_score: float = 0.4
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._characters: dict[str, _CharacterIndex] = {}
+
+    def __contains__(self, char: str) -> bool:
+        return char.casefold() in self._characters
+
+    def add(self, char: str, moves: list[Move]) -> None:
+        """Index the full movelist of CHAR, replacing what was indexed before."""
+        index = _CharacterIndex(moves)
+        with self._lock:
+            self._characters[char.casefold()] = index
+
+    def lookup(self, char: str, query: str) -> list[Move]:
+        """Return the moves of CHAR with an input, name or notation variant equal to QUERY."""
+        index = self._characters.get(char.casefold())
+        if index is None:
+            return []
+        return list(index.aliases.get(canonical_notation(query), []))
+
+    def search(self, char: str, query: str, limit: Optional[int] = None) -> list[Move]:
+        """Return the moves of CHAR matching QUERY, best matches first."""
+        return [m for _, m in self._ranked(char, query)][:limit]
+
+    def _ranked(self, char: str, query: str) -> list[tuple[float, Move]]:
+        index = self._characters.get(char.casefold())
+        needle = normalize(query)
+        if index is None or not needle:
+            return []
+
+        query_grams = grams(needle)
+        candidates = sorted(set().union(*(index.postings.get(g, set()) for g in query_grams)))
+        ranked = []
+        for doc_id in candidates:
+            doc = index.docs[doc_id]
+            best = max(score(needle, query_grams, t) for t in doc.terms)
+            if best >= self.min_score:
+                ranked.append((best, doc_id, doc.move))
+        # Stable on upstream order for equal scores
+        ranked.sort(key=lambda r: (-r[0], r[1]))
+        return [(s, m) for s, _, m in ranked]
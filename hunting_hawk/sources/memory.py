@@ -0,0 +1,49 @@
+"""Memory held by the moves of loaded tables"""
+import sys
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Iterable
+
+from hunting_hawk.mediawiki.cargo import Move
+
+from .fetcher import Snapshot
+
+__all__ = ["TableMemory", "snapshot_memory", "table_memory"]
+
+
+@dataclass(frozen=True)
+class TableMemory:
+    moves: int
+    # Bytes of the moves and their values, shared values counted once
+    bytes: int
+    # Bytes the same moves would take if none of their values were shared
+    unshared_bytes: int
+
+
+def table_memory(moves: Iterable[Move]) -> TableMemory:
+    """Measure the memory held by MOVES."""
+    seen: set[int] = set()
+    count = total = unshared = 0
+
+    def add(obj: Any) -> None:
+        nonlocal total, unshared
+        size = sys.getsizeof(obj)
+        unshared += size
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            total += size
+
+    for move in moves:
+        count += 1
+        add(move)
+        add(move.__dict__)
+        for val in move.__dict__.values():
+            add(val)
+            if isinstance(val, list):
+                for item in val:
+                    add(item)
+    return TableMemory(count, total, unshared)
+
+
+def snapshot_memory(snapshot: Snapshot) -> TableMemory:
+    return table_memory(chain.from_iterable(snapshot.moves.values()))
@@ -0,0 +1,71 @@
+"""Incrementally refresh sources from the recent changes of their wikis"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from hunting_hawk.mediawiki.cargo import Move
+from hunting_hawk.mediawiki.recentchanges import changed_pages
+
+from .fetcher import CargoFetcher
+
+__all__ = ["Sync"]
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Sync:
+    """Refetch only the characters whose pages changed since the previous run.
+
+    Every wiki is asked for its changed pages once per run, no matter how many of its
+    tables are synced, and each table maps those pages to the characters stored on them."""
+
+    # Changes are looked up a little before the previous run to make up for clock skew
+    overlap: timedelta = timedelta(minutes=1)
+
+    def __init__(
+        self,
+        fetchers: list[CargoFetcher],
+        on_refresh: Callable[[CargoFetcher, str, list[Move]], object],
+        since: Optional[datetime] = None,
+        clock: Callable[[], datetime] = now,
+    ) -> None:
+        self.on_refresh = on_refresh
+        self.clock = clock
+        self.wikis: dict[str, list[CargoFetcher]] = {}
+        for fetcher in fetchers:
+            self.wikis.setdefault(fetcher.client.api_endpoint(), []).append(fetcher)
+        start = since or clock()
+        # Wiki api endpoint -> time of the last complete sync
+        self.since: dict[str, datetime] = {wiki: start for wiki in self.wikis}
+
+    def _refresh(self, fetcher: CargoFetcher, pages: list[str]) -> list[str]:
+        characters = fetcher.changed_characters(pages)
+        for char in characters:
+            logging.info(f"Refreshing {char} of {fetcher.table_name}")
+            self.on_refresh(fetcher, char, fetcher.refresh(char))
+        return characters
+
+    def run(self) -> dict[str, list[str]]:
+        """Refresh every changed character once, returns the refreshed characters per table."""
+        refreshed: dict[str, list[str]] = {}
+        for wiki, fetchers in self.wikis.items():
+            until = self.clock()
+            try:
+                pages = changed_pages(fetchers[0].client, self.since[wiki] - self.overlap, until)
+                for fetcher in fetchers:
+                    refreshed[fetcher.table_name] = self._refresh(fetcher, pages) if pages else []
+            except Exception as e:
+                # The same window is synced again on the next run
+                logging.error(f"Syncing {wiki} failed with {e}")
+                continue
+            self.since[wiki] = until
+        return refreshed
+
+    def run_forever(self, interval: float, stop: Optional[threading.Event] = None) -> None:
+        """Run a sync every INTERVAL seconds until STOP is set."""
+        stop = stop or threading.Event()
+        while not stop.wait(interval):
+            self.run()
@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from hunting_hawk.mediawiki.cargo import CargoClient, CargoField, CargoFields
+
+from hunting_hawk.mediawiki import cargo
+from .artifact import ArtifactError, artifact_path, dump, load
+from .export import resolve
+from .fetcher import CargoFetcher
+
+# The fake upstream table is exported before going offline
+pytestmark = pytest.mark.usefixtures("cargo_calls")
+
+FIELDS = CargoFields(
+    cargofields={
+        "chara": CargoField(type="String"),
+        "input": CargoField(type="String"),
+        "name": CargoField(type="String"),
+        "damage": CargoField(type="Wikitext"),
+    }
+)
+
+
+def exported(client: CargoClient, rows: list[dict[str, Any]], tmp_path: Path) -> tuple[Path, CargoFetcher]:
+    f = CargoFetcher(client, "MoveData_Test")
+    f.use_fields(FIELDS)
+    path = artifact_path(tmp_path, f)
+    assert dump(f, path) == len(rows)
+    return path, f
+
+
+def offline(monkeypatch: pytest.MonkeyPatch, client: CargoClient) -> CargoFetcher:
+    def export(*_: Any) -> list[Any]:
+        raise AssertionError("Artifacts load without network access")
+
+    monkeypatch.setattr(cargo, "cargo_export", export)
+    return CargoFetcher(client, "MoveData_Test")
+
+
+# The fake upstream table is exported before going offline
+pytestmark = pytest.mark.usefixtures("cargo_calls")
+
+def test_artifact_roundtrip(
+    monkeypatch: pytest.MonkeyPatch, cargo_client: CargoClient, rows: list[dict[str, Any]], tmp_path: Path
+) -> None:
+    path, online = exported(cargo_client, rows, tmp_path)
+    f = offline(monkeypatch, cargo_client)
+    load(f, path)
+
+    for char in ("Ky Kiske", "Baiken"):
+        assert [vars(m) for m in f[char]] == [vars(m) for m in online[char]]
+
+    assert list(f) == ["Ky Kiske", "Baiken"]
+    assert [m.name for m in f["Ky Kiske"]] == ["S Stun Edge", "Vapor Thrust", "5P"]  # type: ignore
+    assert [m.damage for m in f.get_moves_by_input("Baiken", "j.D")] == ["32"]  # type: ignore
+
+
+def test_artifact_is_deterministic(cargo_client: CargoClient, rows: list[dict[str, Any]], tmp_path: Path) -> None:
+    first, _ = exported(cargo_client, rows, tmp_path / "a")
+    second, _ = exported(cargo_client, rows, tmp_path / "b")
+    assert first.read_bytes() == second.read_bytes()
+
+
+def test_artifact_of_another_table(cargo_client: CargoClient, rows: list[dict[str, Any]], tmp_path: Path) -> None:
+    path, _ = exported(cargo_client, rows, tmp_path)
+    with pytest.raises(ArtifactError):
+        load(CargoFetcher(cargo_client, "MoveData_Other"), path)
+
+
+def test_resolve_sources() -> None:
+    from .dustloop import GGST
+
+    assert resolve("dustloop.GGST") is GGST
+    assert resolve("hunting_hawk.sources.dustloop.GGST") is GGST
+    with pytest.raises(ValueError):
+        resolve("dustloop.cargo")
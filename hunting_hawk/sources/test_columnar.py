@@ -0,0 +1,194 @@
+from dataclasses import field, make_dataclass
+from typing import Any, Optional
+
+import pytest
+
+from hunting_hawk.mediawiki.cargo import CargoParameters, File, Wikitext
+
+from .columnar import ColumnarTable, UnsupportedQuery, frame_fields, like_pattern, to_number
+from .fetcher import CargoFetcher
+
+FIELDS: list[Any] = [
+    ("input", Optional[str], field(default=None)),
+    ("name", Optional[str], field(default=None)),
+    ("damage", Optional[int], field(default=None)),
+    ("startup", Optional[float], field(default=None)),
+    ("guard", Optional[str], field(default=None)),
+    ("airborne", Optional[bool], field(default=None)),
+    ("cancel", Optional[list[str]], field(default=None)),
+]
+Move = make_dataclass("Move", FIELDS, frozen=True)
+
+MOVES = [
+    Move("5P", "5P", 8, 4, "Mid", False, ["Special", "Super"]),
+    Move("236S", "S Stun Edge", 20, 13.5, "Mid", False, None),
+    Move("623S", "Vapor Thrust", 40, 9, "mid ", True, ["Super"]),
+    Move("j.D", "j.D", None, 11, "High", True, []),
+    Move("632146H", "Ride the Lightning", 50, None, None, False, None),
+]
+CHARACTERS = ["Ky Kiske", "Ky Kiske", "Ky Kiske", "Baiken", "Ky Kiske"]
+
+
+@pytest.fixture
+def table() -> ColumnarTable:
+    return ColumnarTable("MoveData_Test", Move, MOVES, {"chara": CHARACTERS})
+
+
+def names(table: ColumnarTable, where: str, **query: Any) -> list[str]:
+    return [m.name for m in table.query({"where": where, **query})]  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "where,expected",
+    [
+        ("damage > 10", ["S Stun Edge", "Vapor Thrust", "Ride the Lightning"]),
+        ("damage >= 20 AND startup < 10", ["Vapor Thrust"]),
+        ("startup = 13.5", ["S Stun Edge"]),
+        # Strings compare without case and trailing spaces
+        ("guard = 'MID'", ["5P", "S Stun Edge", "Vapor Thrust"]),
+        ("guard <> 'mid'", ["j.D"]),
+        ("MoveData_Test.chara = 'baiken'", ["j.D"]),
+        ("name LIKE '%thrust'", ["Vapor Thrust"]),
+        ("input LIKE '_P'", ["5P"]),
+        ("input NOT LIKE '%S'", ["5P", "j.D", "Ride the Lightning"]),
+        ("input IN ('5P', 'j.D')", ["5P", "j.D"]),
+        ("damage NOT IN (8, 20)", ["Vapor Thrust", "Ride the Lightning"]),
+        ("damage IS NULL", ["j.D"]),
+        ("startup IS NOT NULL AND airborne = 1", ["Vapor Thrust", "j.D"]),
+        ("cancel HOLDS 'super'", ["5P", "Vapor Thrust"]),
+        ("cancel HOLDS LIKE 'Spe%'", ["5P"]),
+        ("(chara = 'Ky Kiske' OR damage IS NULL) AND NOT input = '5P'", ["S Stun Edge", "Vapor Thrust", "j.D", "Ride the Lightning"]),
+        ("chara = 'Ky Kiske' AND input = '236S' OR name = 'j.D'", ["S Stun Edge", "j.D"]),
+        # Unknown stays unknown under NOT, rows without a damage never match
+        ("NOT damage < 30", ["Vapor Thrust", "Ride the Lightning"]),
+        ("NOT (damage < 30 AND guard = 'High')", ["5P", "S Stun Edge", "Vapor Thrust", "Ride the Lightning"]),
+        ("damage < 30 OR guard = 'High'", ["5P", "S Stun Edge", "j.D"]),
+        ("name = 'It''s'", []),
+    ],
+)
+def test_where(table: ColumnarTable, where: str, expected: list[str]) -> None:
+    assert names(table, where) == expected
+
+
+def test_order_limit_offset(table: ColumnarTable) -> None:
+    assert names(table, "", order_by="damage DESC") == ["Ride the Lightning", "Vapor Thrust", "S Stun Edge", "5P", "j.D"]
+    # Rows without a value sort first, ties keep the order of the table
+    assert names(table, "", order_by="startup") == ["Ride the Lightning", "5P", "Vapor Thrust", "j.D", "S Stun Edge"]
+    assert names(table, "", order_by="chara, guard DESC") == ["j.D", "5P", "S Stun Edge", "Vapor Thrust", "Ride the Lightning"]
+    assert names(table, "damage > 0", order_by="damage", limit=2, offset=1) == ["S Stun Edge", "Vapor Thrust"]
+
+
+def test_project(table: ColumnarTable) -> None:
+    rows = table.where("airborne = 1")
+    assert table.project(rows, ["name", "damage", "airborne", "chara"]) == [
+        {"name": "Vapor Thrust", "damage": 40, "airborne": True, "chara": "Ky Kiske"},
+        {"name": "j.D", "damage": None, "airborne": True, "chara": "Baiken"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {"where": "damage + 1 > 10"},
+        {"where": "_pageName = 'Ky'"},
+        {"where": "Other.damage = 1"},
+        {"where": "damage > 10 AND"},
+        {"where": "cancel = 'Super'"},
+        {"order_by": "cancel"},
+        {"order_by": "damage DESC NULLS LAST"},
+        {"order_by": "startup,"},
+        {"order_by": "startup, , damage"},
+        {"offset": "second"},
+        {"tables": "MoveData_Test, Other"},
+        {"group_by": "chara"},
+    ],
+)
+def test_unsupported(table: ColumnarTable, query: Any) -> None:
+    with pytest.raises(UnsupportedQuery):
+        table.query(query)
+
+
+def test_mysql_conversions() -> None:
+    assert to_number(" 12.5f") == 12.5
+    assert to_number("-3e2 frames") == -300
+    assert to_number("Throw") == 0
+    assert like_pattern(r"100\%").fullmatch("100%")
+    assert not like_pattern(r"100\%").fullmatch("1000")
+
+
+def test_fetcher_queries_the_snapshot(
+    fetcher: CargoFetcher, cargo_calls: list[CargoParameters], rows: list[dict[str, Any]]
+) -> None:
+    fetcher.load_snapshot()
+    cargo_calls.clear()
+
+    baiken = fetcher.query({"where": "chara = 'Baiken' AND damage LIKE '3%'"})
+    assert [m.name for m in baiken] == ["Tatami Gaeshi", "j.D"]  # type: ignore
+    assert cargo_calls == []
+    # The rest goes upstream
+    fetcher.query({"where": "_pageName = 'Ky'"})
+    assert cargo_calls[0]["where"] == "_pageName = 'Ky'"
+    cargo_calls.clear()
+    fetcher.query({"order_by": "name,"})
+    assert cargo_calls[0]["order_by"] == "name,"
+
+    rows[:] = [{"chara": "Baiken", "input": "236K", "name": "Tsurane Sanzu-watashi"}]
+    fetcher.refresh("Baiken")
+    assert [m.name for m in fetcher.query({"where": "chara = 'Baiken'"})] == ["Tsurane Sanzu-watashi"]  # type: ignore
+
+
+def test_frame_data_columns() -> None:
+    frames: list[Any] = [("input", Optional[str], field(default=None)), ("onBlock", Optional[str], field(default=None))]
+    move = make_dataclass("Frames", frames, frozen=True)
+    moves = [move("5P", "+1"), move("236S", "-12(-8)"), move("623S", "-20~-24"), move("j.D", "KD"), move("5K", None)]
+    table = ColumnarTable("MoveData_Test", move, moves)
+
+    def inputs(**query: Any) -> list[str]:
+        return [m.input for m in table.query(query)]  # type: ignore
+
+    assert inputs(where="onBlock_min >= -12") == ["5P", "236S"]
+    assert inputs(where="onblock_max < -10") == ["623S"]
+    assert inputs(where="onBlock_first IS NULL") == ["j.D", "5K"]
+    assert inputs(where="onBlock_first IS NOT NULL", order_by="onBlock_first DESC") == ["5P", "236S", "623S"]
+    assert table.project(table.where("input = '236S'"), ["onBlock", "onBlock_first", "onBlock_max"]) == [
+        {"onBlock": "-12(-8)", "onBlock_first": -12, "onBlock_max": -8}
+    ]
+
+
+def test_frame_data_columns_follow_the_table_definition() -> None:
+    frames: list[Any] = [
+        ("input", Optional[str], field(default=None)),
+        ("block", Optional[Wikitext], field(default=None)),
+        ("image", Optional[File], field(default=None)),
+        ("damage", Optional[int], field(default=None)),
+    ]
+    move = make_dataclass("Frames", frames, frozen=True)
+    table = ColumnarTable("Move", move, [move("d/f+1", "-1", "T8_1.png", 12), move("b+4", "-15", None, 20)])
+
+    assert frame_fields(move) == {"input", "block"}
+    assert "block_max" not in table.columns
+    assert [m.input for m in table.query({"where": "block_max < -10"})] == ["b+4"]  # type: ignore
+    assert "block_max" in table.columns
+    for where in ("image_min > 0", "damage_max > 0"):
+        with pytest.raises(UnsupportedQuery):
+            table.query({"where": where})
+
+
+def test_frame_data_columns_are_not_sent_upstream(fetcher: CargoFetcher, cargo_calls: list[CargoParameters]) -> None:
+    query: Any = {"where": "MoveData_Test.damage_min >= 30", "order_by": "damage_max"}
+
+    # Without a snapshot the wiki would fail on the unknown field
+    with pytest.raises(UnsupportedQuery, match="damage_max, damage_min"):
+        fetcher.query(query)
+    with pytest.raises(UnsupportedQuery):
+        fetcher.query(query | {"group_by": "chara"})
+    assert cargo_calls == []
+
+    fetcher.load_snapshot()
+    cargo_calls.clear()
+    assert [m.name for m in fetcher.query(query)] == ["Tatami Gaeshi", "j.D", "Vapor Thrust"]  # type: ignore
+    with pytest.raises(UnsupportedQuery):
+        fetcher.query(query | {"group_by": "chara"})
+    # Names in strings and of other fields are not columns
+    fetcher.query({"where": "name = 'damage_min' AND _pageName_min = 1"})
+    assert cargo_calls[0]["where"] == "name = 'damage_min' AND _pageName_min = 1"
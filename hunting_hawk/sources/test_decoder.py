@@ -0,0 +1,78 @@
+from typing import Any
+
+import pytest
+
+from hunting_hawk.mediawiki.cargo import _table_type
+
+from .decoder import RowDecoder, ValuePool
+
+FIELDS: dict[str, dict[str, Any]] = {
+    "chara": {"type": "String"},
+    "damage": {"type": "Integer"},
+    "guardBreak": {"type": "Boolean"},
+    "meter": {"type": "Float"},
+    "notes": {"type": "Wikitext"},
+    "images": {"type": "File", "isList": "", "delimiter": ";"},
+    "tags": {"type": "String", "isList": "", "delimiter": ","},
+}
+
+ROWS: list[dict[str, Any]] = [
+    {"chara": "Ky Kiske", "damage": 20, "guardBreak": "yes", "meter": "0.5", "notes": "Stun", "images": ["a.png"]},
+    {"chara": 10, "damage": "35", "guardBreak": 0, "meter": 1, "tags": ["a", "b"], "extra": "ignored"},
+    {"chara": None, "damage": None, "images": [], "tags": ("c",)},
+    {},
+]
+
+Move = _table_type("MoveData_Test", {"cargofields": FIELDS})
+decode = RowDecoder(Move, {})
+
+
+def test_decoded_moves_match_validated_moves() -> None:
+    for row in ROWS:
+        assert decode(row) == Move(**{k: v for k, v in row.items() if k != "extra"})
+
+
+def test_decoder_transforms() -> None:
+    decoder = RowDecoder(Move, {"notes": str.upper, "images": lambda v: [f"/{f}" for f in v]})
+    move = decoder({"notes": "stun", "images": ["a.png"]})
+    assert move.notes == "STUN"  # type: ignore
+    assert move.images == ["/a.png"]  # type: ignore
+
+
+def test_decoder_splits_lists_on_the_cargo_delimiter() -> None:
+    move = decode({"images": "a.png;b.png", "tags": "x, y"})
+    assert move.images == ["a.png", "b.png"]  # type: ignore
+    assert move.tags == ["x", "y"]  # type: ignore
+    assert decode({"tags": ""}).tags == []  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "row",
+    [{"damage": "twenty"}, {"guardBreak": "maybe"}, {"notes": 5}, {"chara": ["Ky"]}, {"tags": 5}],
+)
+def test_decoder_rejects_invalid_rows(row: dict[str, Any]) -> None:
+    with pytest.raises((TypeError, ValueError)):
+        decode(row)
+
+
+def test_decoder_shares_string_values() -> None:
+    decoder = RowDecoder(Move, {})
+    # Equal but distinct objects, like two parsed export rows
+    first, second = (decoder({"chara": "".join(["Ky ", "Kiske"]), "tags": ["".join(["a", "b"])]}) for _ in range(2))
+
+    assert first.chara is second.chara  # type: ignore
+    assert first.tags[0] is second.tags[0]  # type: ignore
+    assert set(decoder.pools) == {"chara", "notes", "images", "tags"}
+    # Converted values, e.g. read from an artifact, are shared as well
+    assert decoder.shared({"chara": "".join(["Ky ", "Kiske"]), "damage": 20})["chara"] is first.chara  # type: ignore
+
+
+def test_value_pools_stop_growing() -> None:
+    pool = ValuePool(max_values=2)
+    values = [str(i) * 3 for i in range(3)]
+    for v in values:
+        pool.share(v)
+
+    assert list(pool.values) == values[:2]
+    assert pool.share("".join(["0", "00"])) is values[0]
+    assert pool(["".join(["2", "22"])]) == ["222"]
@@ -0,0 +1,123 @@
+from typing import Any
+
+import pytest
+
+from hunting_hawk.cache.cache import DictCache
+from hunting_hawk.mediawiki.cargo import CargoClient, CargoField, CargoFields, CargoParameters
+from hunting_hawk.mediawiki.filepath import FilePaths
+
+from . import fetcher as fetcher_module
+from .fetcher import CargoFetcher
+
+
+def test_snapshot_pages_whole_table(fetcher: CargoFetcher, cargo_calls: list[CargoParameters]) -> None:
+    snapshot = fetcher.load_snapshot()
+
+    assert [c["offset"] for c in cargo_calls] == [0, 2, 4]
+    assert snapshot.characters == ["Ky Kiske", "Baiken"]
+    assert len(snapshot.get("Ky Kiske")) == 3
+
+
+def test_snapshot_lookups_are_local(fetcher: CargoFetcher, cargo_calls: list[CargoParameters]) -> None:
+    fetcher.load_snapshot()
+    cargo_calls.clear()
+
+    assert list(fetcher) == ["Ky Kiske", "Baiken"]
+    assert len(fetcher) == 2
+    # Moves keep their upstream order
+    assert [m.name for m in fetcher["ky kiske"]] == ["S Stun Edge", "Vapor Thrust", "5P"]  # type: ignore
+    assert [m.name for m in fetcher.get_moves_by_input("Ky Kiske", "236S")] == ["S Stun Edge"]  # type: ignore
+    assert [m.name for m in fetcher.get_moves_by_input("Ky Kiske", "qcfS")] == ["S Stun Edge"]  # type: ignore
+    assert [m.name for m in fetcher.get_moves_by_input("Baiken", "tatami")] == ["Tatami Gaeshi"]  # type: ignore
+    assert [m.damage for m in fetcher.get_moves_by_input("Baiken", "j.D")] == ["32"]  # type: ignore
+    assert fetcher.get_moves("Sol Badguy") == []
+    assert cargo_calls == []
+
+
+def test_snapshot_misses_go_upstream(
+    fetcher: CargoFetcher, cargo_calls: list[CargoParameters], rows: list[dict[str, Any]]
+) -> None:
+    fetcher.load_snapshot()
+    cargo_calls.clear()
+
+    # Added to the wiki after the snapshot was loaded
+    rows[:] = [{"chara": "Baiken", "input": "236S", "name": "Kabari"}]
+    assert [m.name for m in fetcher.get_moves_by_input("Baiken", "236S")] == ["Kabari"]  # type: ignore
+    assert "input='236S'" in cargo_calls[0]["where"]
+
+
+def test_lookups_quote_their_values(
+    fetcher: CargoFetcher, cargo_calls: list[CargoParameters], rows: list[dict[str, Any]]
+) -> None:
+    rows.clear()
+    fetcher.get_moves("Ky' OR '1'='1")
+    assert cargo_calls[0]["where"] == "MoveData_Test.chara='Ky'' OR ''1''=''1'"
+    cargo_calls.clear()
+
+    # Nothing matches exactly, the fuzzy query follows
+    fetcher.get_moves_by_input("Baiken", "It's")
+    assert "input='It''s' OR name='It''s'" in cargo_calls[0]["where"]
+    assert "input LIKE '%It''s%'" in cargo_calls[1]["where"]
+
+
+def test_fetched_movelists_are_searched_locally(
+    fetcher: CargoFetcher, cargo_calls: list[CargoParameters], rows: list[dict[str, Any]]
+) -> None:
+    rows[:] = [r for r in rows if r["chara"] == "Ky Kiske"]
+    assert len(fetcher.get_moves("Ky Kiske")) == 3
+    cargo_calls.clear()
+
+    assert [m.name for m in fetcher.get_moves_by_input("Ky Kiske", "623S")] == ["Vapor Thrust"]  # type: ignore
+    assert [m.name for m in fetcher.search("Ky Kiske", "vapor")] == ["Vapor Thrust"]  # type: ignore
+    assert cargo_calls == []
+
+
+def test_refresh_bypasses_the_snapshot(
+    fetcher: CargoFetcher, cargo_calls: list[CargoParameters], rows: list[dict[str, Any]]
+) -> None:
+    fetcher.load_snapshot()
+    cargo_calls.clear()
+
+    rows[0]["name"] = "Stun Edge"
+    assert fetcher.refresh("Ky Kiske", "236S")[0].name == "Stun Edge"  # type: ignore
+    assert "input='236S'" in cargo_calls[0]["where"]
+    loaded = fetcher.snapshot
+    assert loaded is not None
+    assert fetcher.refresh("Ky Kiske")[0].name == "Stun Edge"  # type: ignore
+    assert [m.name for m in fetcher.get_moves("Ky Kiske")][0] == "Stun Edge"  # type: ignore
+    # Readers of the previous snapshot never see it change
+    assert fetcher.snapshot is not loaded
+    assert loaded.get("Ky Kiske")[0].name == "S Stun Edge"  # type: ignore
+
+    rows[:] = [{"chara": "Sol Badguy", "input": "236P", "name": "Gun Flame"}]
+    fetcher.refresh("Sol Badguy")
+    assert list(fetcher) == ["Ky Kiske", "Baiken", "Sol Badguy"]
+    assert loaded.characters == ["Ky Kiske", "Baiken"]
+
+
+@pytest.mark.usefixtures("cargo_calls")
+def test_snapshot_resolves_files_in_batches(
+    monkeypatch: pytest.MonkeyPatch,
+    cargo_client: CargoClient,
+    rows: list[dict[str, Any]],
+    fake_api: list[list[str]],
+    cdn: str,
+) -> None:
+    rows[:] = [{"chara": "Ky Kiske", "input": f"{i}S", "images": f"Ky_{i}S.png;Ky_{i}S_2.png"} for i in range(40)]
+    files = FilePaths(cargo_client, DictCache())
+    monkeypatch.setattr(fetcher_module, "file_paths", lambda _: files)
+
+    f = CargoFetcher(cargo_client, "MoveData_Files")
+    f.use_fields(
+        CargoFields(
+            cargofields={
+                "chara": CargoField(type="String"),
+                "input": CargoField(type="String"),
+                "images": CargoField(type="File", isList="", delimiter=";"),
+            }
+        )
+    )
+    snapshot = f.load_snapshot()
+
+    assert [len(r) for r in fake_api] == [50, 30]
+    assert snapshot.get("Ky Kiske")[0].images == [f"{cdn}/Ky 0S.png", f"{cdn}/Ky 0S 2.png"]  # type: ignore
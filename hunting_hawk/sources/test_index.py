@@ -0,0 +1,52 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from hunting_hawk.mediawiki.cargo import Move
+
+from .index import MoveIndex, grams
+
+
+@dataclass(frozen=True)
+class FakeMove:
+    input: Optional[str]
+    name: Optional[str]
+
+
+MOVES: list[Move] = [
+    FakeMove("236S", "S Stun Edge"),  # type: ignore
+    FakeMove("214K", "Stun Dipper"),  # type: ignore
+    FakeMove("j.236H", "Air H Stun Edge"),  # type: ignore
+    FakeMove("632146H", "Ride the Lightning"),  # type: ignore
+    FakeMove(None, "Dire Eclat"),  # type: ignore
+]
+
+
+def test_grams() -> None:
+    assert grams("5P") == {"^5P", "5P$"}
+    assert grams("") == {"^$"}
+
+
+def test_lookup() -> None:
+    index = MoveIndex()
+    index.add("Ky Kiske", MOVES)
+
+    assert "ky kiske" in index
+    assert index.lookup("Ky Kiske", "236s") == [MOVES[0]]
+    assert index.lookup("Ky Kiske", "qcf S") == [MOVES[0]]
+    assert index.lookup("Ky Kiske", "j.qcfH") == [MOVES[2]]
+    assert index.lookup("Ky Kiske", "j236h") == [MOVES[2]]
+    assert index.lookup("Ky Kiske", "air h stun edge") == [MOVES[2]]
+    assert index.lookup("Ky Kiske", "Stun") == []
+    assert index.lookup("Sol Badguy", "236S") == []
+
+
+def test_search_ranking() -> None:
+    index = MoveIndex()
+    index.add("Ky Kiske", MOVES)
+
+    # Prefix matches rank above substring matches, ties keep upstream order
+    assert index.search("Ky Kiske", "Stun") == [MOVES[1], MOVES[0], MOVES[2]]
+    assert index.search("Ky Kiske", "236") == [MOVES[0], MOVES[2]]
+    assert index.search("Ky Kiske", "lightnin") == [MOVES[3]]
+    assert index.search("Ky Kiske", "eclat", limit=1) == [MOVES[4]]
+    assert index.search("Ky Kiske", "5K") == []
@@ -0,0 +1,16 @@
+from hunting_hawk.mediawiki.cargo import _table_type
+
+from .fetcher import Snapshot
+from .memory import snapshot_memory
+
+Move = _table_type("MoveData_Test", {"cargofields": {"chara": {"type": "String"}, "notes": {"type": "Wikitext"}}})
+
+
+def test_snapshot_memory_counts_shared_values_once() -> None:
+    notes = "".join(["Stun ", "Edge"])
+    moves = [Move(chara="Ky Kiske", notes=notes), Move(chara="Ky Kiske", notes="".join(["Stun ", "Edge"]))]
+    memory = snapshot_memory(Snapshot(["Ky Kiske"], {"ky kiske": moves}))
+    shared = snapshot_memory(Snapshot(["Ky Kiske"], {"ky kiske": [moves[0], Move(chara="Ky Kiske", notes=notes)]}))
+
+    assert memory.moves == shared.moves == 2
+    assert shared.bytes < memory.bytes < memory.unshared_bytes
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+
+from hunting_hawk.mediawiki.cargo import CargoClient, CargoParameters, Move
+
+from hunting_hawk.mediawiki import cargo
+
+from . import sync
+from .fetcher import CargoFetcher
+
+PAGES = {"Ky Kiske": "GGACR/Ky Kiske/Data", "Baiken": "GGACR/Baiken/Data"}
+
+
+def test_sync_refreshes_changed_characters(
+    monkeypatch: pytest.MonkeyPatch, fetcher: CargoFetcher, rows: list[dict[str, Any]]
+) -> None:
+    exports: list[CargoParameters] = []
+
+    def export(_: CargoClient, params: CargoParameters) -> list[Any]:
+        exports.append(params)
+        paged = [dict(r, _pageName=PAGES[r["chara"]]) for r in rows]
+        if "_pageName IN" in str(params.get("where")):
+            matches = [{"chara": r["chara"]} for r in paged if f"'{r['_pageName']}'" in str(params["where"])][:1]
+        else:
+            matches = [r for r in paged if f"'{r['chara']}'" in str(params.get("where"))]
+        offset = params.get("offset", 0)
+        return matches[offset : offset + params.get("limit", len(matches))]
+
+    monkeypatch.setattr(cargo, "cargo_export", export)
+
+    windows: list[tuple[datetime, datetime]] = []
+    pages: list[list[str]] = [["GGACR/Ky Kiske/Data", "Sandbox"], []]
+
+    def changed_pages(_: CargoClient, since: datetime, until: datetime) -> list[str]:
+        windows.append((since, until))
+        return pages[len(windows) - 1]
+
+    monkeypatch.setattr(sync, "changed_pages", changed_pages)
+
+    clock = [datetime(2024, 1, 1, tzinfo=timezone.utc)]
+    refreshed: list[tuple[str, list[Move]]] = []
+    job = sync.Sync([fetcher], lambda _, char, moves: refreshed.append((char, moves)), clock=lambda: clock[0])
+
+    clock[0] += timedelta(minutes=10)
+    assert job.run() == {"MoveData_Test": ["Ky Kiske"]}
+    assert [char for char, _ in refreshed] == ["Ky Kiske"]
+    assert len(refreshed[0][1]) == 3
+    assert "'Sandbox'" in str(exports[0]["where"])
+
+    # Nothing changed since, so nothing is fetched
+    exports.clear()
+    clock[0] += timedelta(minutes=10)
+    assert job.run() == {"MoveData_Test": []}
+    assert exports == []
+    assert windows[1][0] == windows[0][1] - job.overlap
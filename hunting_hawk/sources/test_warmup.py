@@ -0,0 +1,77 @@
+import threading
+from typing import Any
+
+from .warmup import Warmup, retry, warm, warmup
+
+
+class Source:
+    def __init__(self, characters: list[str], release: threading.Event | None = None) -> None:
+        self.characters = characters
+        self.release = release
+
+    @property
+    def move(self) -> Any:
+        if self.release is not None:
+            self.release.wait(5)
+        return object
+
+    def __iter__(self) -> Any:
+        return iter(self.characters)
+
+
+class Broken:
+    @property
+    def move(self) -> Any:
+        raise ValueError("Table does not exist")
+
+
+def test_warmup_serves_ready_sources_first() -> None:
+    release = threading.Event()
+    ready: list[Warmup] = []
+    finished = threading.Event()
+
+    def on_ready(result: Warmup) -> None:
+        ready.append(result)
+        if result.source == "SLOW":
+            finished.set()
+
+    sources: Any = {"FAST": Source(["Ky Kiske"]), "SLOW": Source(["Sol"], release), "BROKEN": Broken()}
+    done, pending = warmup(sources, on_ready, deadline=0.5, characters=True)
+
+    assert sorted(w.source for w in done) == ["BROKEN", "FAST"]
+    assert pending == ["SLOW"]
+    fast = next(w for w in done if w.source == "FAST")
+    assert fast.ready and fast.character_list == ["Ky Kiske"] and fast.characters is not None
+    assert not next(w for w in done if w.source == "BROKEN").ready
+
+    # The slow source still reports in once it finishes
+    release.set()
+    assert finished.wait(5)
+    assert [w.source for w in ready][-1] == "SLOW"
+
+
+def test_failed_sources_are_retried() -> None:
+    class Recovering:
+        attempts = 0
+
+        @property
+        def move(self) -> Any:
+            self.attempts += 1
+            if self.attempts < 3:
+                raise ValueError("Wiki is down")
+            return object
+
+    results: list[Warmup] = []
+    done = threading.Event()
+
+    def on_ready(result: Warmup) -> None:
+        results.append(result)
+        if result.ready:
+            done.set()
+        else:
+            retry(result, on_ready, 0.01)
+
+    on_ready(warm("RECOVERING", Recovering()))  # type: ignore[arg-type]
+
+    assert done.wait(5)
+    assert [(r.attempt, r.ready) for r in results] == [(1, False), (2, False), (3, True)]
@@ -0,0 +1,97 @@
+"""Resolve the sources concurrently at startup"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from .fetcher import CargoFetcher
+
+__all__ = ["Warmup", "retry", "warmup"]
+
+
+@dataclass
+class Warmup:
+    """Outcome of warming up a single source."""
+
+    source: str
+    fetcher: CargoFetcher
+    # Seconds spent resolving the table definition
+    schema: float = 0.0
+    # Seconds spent fetching the character list, if it was prefetched
+    characters: Optional[float] = None
+    character_list: Optional[list[str]] = None
+    error: Optional[Exception] = None
+    # Number of the attempt this is the outcome of
+    attempt: int = 1
+
+    @property
+    def ready(self) -> bool:
+        return self.error is None
+
+
+def warm(source: str, fetcher: CargoFetcher, characters: bool = False) -> Warmup:
+    """Resolve the table definition of FETCHER and optionally its character list."""
+    result = Warmup(source, fetcher)
+    start = time.perf_counter()
+    try:
+        fetcher.move
+        result.schema = time.perf_counter() - start
+        if characters:
+            start = time.perf_counter()
+            result.character_list = list(fetcher)
+            result.characters = time.perf_counter() - start
+    except Exception as e:
+        logging.error(f"Warming up {source} failed with {e}")
+        result.error = e
+    return result
+
+
+def retry(
+    result: Warmup, on_ready: Callable[[Warmup], None], delay: float, characters: bool = False
+) -> threading.Timer:
+    """Warm up the source of the failed RESULT again after DELAY seconds and call ON_READY with the outcome."""
+
+    def run() -> None:
+        again = warm(result.source, result.fetcher, characters)
+        again.attempt = result.attempt + 1
+        try:
+            on_ready(again)
+        except Exception as e:
+            logging.error(f"Registering {result.source} failed with {e}")
+
+    timer = threading.Timer(delay, run)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def warmup(
+    sources: dict[str, CargoFetcher],
+    on_ready: Callable[[Warmup], None],
+    deadline: Optional[float] = None,
+    characters: bool = False,
+) -> tuple[list[Warmup], list[str]]:
+    """Warm up all SOURCES concurrently, calling ON_READY with each result as soon as it is done.
+
+    Waits at most DEADLINE seconds and returns the finished results and the names of
+    the sources still pending. Those keep running in the background and call ON_READY
+    once they finish."""
+    if not sources:
+        return [], []
+
+    def run(name: str, fetcher: CargoFetcher) -> Warmup:
+        result = warm(name, fetcher, characters)
+        # Called from the worker so a finished source is fully registered by the time we return
+        try:
+            on_ready(result)
+        except Exception as e:
+            logging.error(f"Registering {name} failed with {e}")
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="warmup")
+    futures = {executor.submit(run, name, fetcher): name for name, fetcher in sources.items()}
+    finished, pending = wait(futures, timeout=deadline)
+    executor.shutdown(wait=False)
+    return [f.result() for f in futures if f in finished], [futures[f] for f in futures if f in pending]
@@ -2,12 +2,12 @@
 
 
 from .fetcher import CargoFetcher
-from typing import Iterator, Any
+from typing import Iterator, Any, Optional
 from hunting_hawk.mediawiki.cargo import (
     CargoClient,
     CargoParameters,
     Move,
-    cargo_export,
+    iter_cargo_export,
 )
 
 WIKI_DOMAIN = "https://wavu.wiki"
@@ -48,14 +48,33 @@ class StripSuffixFetcher(CargoFetcher):
     def get_moves_by_input(self, char: str, input: str) -> list[Move]:
         return super().get_moves_by_input(char + self.valid_table_sufix, input)
 
+    def refresh(self, char: str, input: Optional[str] = None) -> list[Move]:
+        return super().refresh(char + self.valid_table_sufix, input)
+
+    def search(self, char: str, query: str) -> list[Move]:
+        return super().search(char + self.valid_table_sufix, query)
+
+    async def aget_moves(self, char: str) -> list[Move]:
+        return await super().aget_moves(char + self.valid_table_sufix)
+
+    async def aget_moves_by_input(self, char: str, input: str) -> list[Move]:
+        return await super().aget_moves_by_input(char + self.valid_table_sufix, input)
+
     def __iter__(self) -> Iterator[Move]:
+        if self.snapshot is not None:
+            return (
+                self._mutate_fields({self.default_key: c})[self.default_key]
+                for c in self.snapshot.characters
+                if c.endswith(self.valid_table_sufix)
+            )
+
         iter_params: CargoParameters = {
             "group_by": self.default_key,
             "tables": self.table_name,
             "fields": self.default_key,
             "where": f"{self.table_name}.{self.default_key} LIKE '%{self.valid_table_sufix}'",
         }
-        data = cargo_export(self.client, iter_params)
+        data = iter_cargo_export(self.client, iter_params)
         return (self._mutate_fields(c)[self.default_key] for c in data)
 
 
@@ -0,0 +1,33 @@
+"""Numbers of the frame data values of cargo tables"""
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+__all__ = ["Frames", "parse_frames"]
+
+# Distinct values remembered, tables repeat the same frame counts a lot
+MEMO_SIZE = 8192
+
+# A minus right after a digit separates a range like 7-9, it is not a sign
+_number = re.compile(r"(?<![\d.])[+-]?\d+(?:\.\d+)?")
+
+
+@dataclass(frozen=True)
+class Frames:
+    """The numbers of a frame data value like 7~9, +3 or -12(-8)."""
+
+    first: int
+    min: int
+    max: int
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def parse_frames(val: Optional[str]) -> Optional[Frames]:
+    """Numbers of VAL, None if it has none."""
+    if not val:
+        return None
+    numbers = [int(float(n)) for n in _number.findall(val)]
+    if not numbers:
+        return None
+    return Frames(numbers[0], min(numbers), max(numbers))
@@ -1,6 +1,16 @@
-from .numpad import NotationMap
+from .numpad import NotationMap, from_numpad, to_numpad
 from html import unescape
-from re import sub
+from re import Pattern, compile, sub
+
+
+def _alternation(keys: list[str]) -> Pattern[str]:
+    # Longest first so that 41236 wins over 236 and RDP over DP
+    return compile("|".join(sorted(keys, key=len, reverse=True)))
+
+
+_motions = _alternation(list(to_numpad.keys()))
+_numpad_motions = _alternation(list(from_numpad.keys()))
+_separators = compile(r"[.+]")
 
 
 def normalize(input: str) -> str:
@@ -13,12 +23,33 @@ def normalize(input: str) -> str:
 def reverse_notation(input: str) -> str:
     normalized = normalize(input)
 
-    for k in NotationMap.keys():
+    for k in sorted(NotationMap.keys(), key=len, reverse=True):
         if k in normalized:
             normalized = normalized.replace(k, NotationMap[k])
             break
     return normalized
 
 
+def to_numpad_notation(input: str) -> str:
+    """Rewrite every motion name (QCF, DP, ...) in INPUT to numpad notation."""
+    return _motions.sub(lambda m: to_numpad[m[0]], normalize(input))
+
+
+def to_motion_notation(input: str) -> str:
+    """Rewrite every numpad motion (236, 623, ...) in INPUT to its motion name."""
+    return _numpad_motions.sub(lambda m: from_numpad[m[0]], normalize(input))
+
+
+def canonical_notation(input: str) -> str:
+    """A single form shared by every notation variant of INPUT."""
+    return _separators.sub("", to_numpad_notation(input))
+
+
+def notation_variants(input: str) -> set[str]:
+    """Every normalized way of writing INPUT in numpad and motion notation, with and without separators."""
+    forms = {normalize(input), to_numpad_notation(input), to_motion_notation(input)}
+    return forms | {_separators.sub("", f) for f in forms}
+
+
 def fuzzy_string(input: str) -> str:
     return f"%{input}%"
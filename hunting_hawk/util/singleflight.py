@@ -0,0 +1,95 @@
+"""Coalesce concurrent calls for the same key into a single call"""
+import asyncio
+import threading
+from typing import Awaitable, Callable, Generic, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+__all__ = ["SingleFlight"]
+
+
+class _Call(Generic[T]):
+    """A synchronous call in flight."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """Only let one call per key run at a time, concurrent callers share its result.
+
+    Shared results are handed out as is and should not be mutated."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call[T]] = {}
+        self._acalls: dict[Hashable, asyncio.Future[T]] = {}
+        # Callers that made the call
+        self.leaders = 0
+        # Callers that waited on the call of a leader
+        self.coalesced = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"leaders": self.leaders, "coalesced": self.coalesced}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Call FN, or wait for the result of a call for KEY that is already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                self.leaders += 1
+                call = self._calls[key] = _Call()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await FN, or the result of a call for KEY that is already in flight."""
+        # Only ever touched from the event loop, no locking required
+        while (pending := self._acalls.get(key)) is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only the leader was cancelled, the first waiter to wake up leads the retry
+                task = asyncio.current_task()
+                if not pending.cancelled() or (task is not None and task.cancelling()):
+                    raise
+
+        self.leaders += 1
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self._acalls[key] = future
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved for when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._acalls[key]
@@ -0,0 +1,28 @@
+from typing import Optional
+
+import pytest
+
+from .framedata import Frames, parse_frames
+
+
+@pytest.mark.parametrize(
+    "val,expected",
+    [
+        ("7", Frames(7, 7, 7)),
+        ("+3", Frames(3, 3, 3)),
+        ("-12(-8)", Frames(-12, -12, -8)),
+        ("7~9", Frames(7, 7, 9)),
+        # Ranges written with a minus are not negative
+        ("7-9", Frames(7, 7, 9)),
+        ("i13~14", Frames(13, 13, 14)),
+        ("+27a (+17)", Frames(27, 17, 27)),
+        ("3,3,3 [5]", Frames(3, 3, 5)),
+        ("-2.5", Frames(-2, -2, -2)),
+        ("KD", None),
+        ("-", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_parse_frames(val: Optional[str], expected: Optional[Frames]) -> None:
+    assert parse_frames(val) == expected
@@ -1,4 +1,12 @@
-from .normalize import fuzzy_string, normalize, reverse_notation
+from .normalize import (
+    canonical_notation,
+    fuzzy_string,
+    normalize,
+    notation_variants,
+    reverse_notation,
+    to_motion_notation,
+    to_numpad_notation,
+)
 
 
 def test_normalize() -> None:
@@ -17,6 +25,19 @@ def test_reverse_notaiton() -> None:
     assert reverse_notation("DPlP") == "623LP"
     assert reverse_notation("qcfS") == "236S"
     assert reverse_notation("qcfSqcfS") == "236S236S"
+    assert reverse_notation("41236H") == "HCFH"
+
+
+def test_notation_rewrites_every_motion() -> None:
+    assert to_numpad_notation("hcf qcf P") == "41236236P"
+    assert to_numpad_notation("rdpK dpK") == "421K623K"
+    assert to_motion_notation("j.41236H 236H") == "J.HCFHQCFH"
+    assert canonical_notation("j.qcf+H") == canonical_notation("j236H") == "J236H"
+
+
+def test_notation_variants() -> None:
+    assert notation_variants("j.236h") == {"J.236H", "J.QCFH", "J236H", "JQCFH"}
+    assert notation_variants("f+1+2") == {"F+1+2", "F12"}
 
 
 def test_fuzzy_string() -> None:
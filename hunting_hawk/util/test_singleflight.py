@@ -0,0 +1,121 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from .singleflight import SingleFlight
+
+# Seconds before a hanging async test fails
+TIMEOUT = 5
+
+
+def test_do_coalesces() -> None:
+    flight: SingleFlight[list[int]] = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow() -> list[int]:
+        calls.append(1)
+        release.wait(5)
+        return [1, 2]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(flight.do, "key", slow) for _ in range(4)]
+        while flight.leaders + flight.coalesced < 4:
+            pass
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert results == [[1, 2]] * 4
+    assert len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "coalesced": 3}
+    # Once the call has landed the next caller leads again
+    assert flight.do("key", lambda: [3]) == [3]
+
+
+def test_do_shares_errors() -> None:
+    flight: SingleFlight[int] = SingleFlight()
+
+    def fail() -> int:
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: 1) == 1
+
+
+def test_ado_coalesces() -> None:
+    flight: SingleFlight[str] = SingleFlight()
+    calls = []
+
+    async def slow() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "moves"
+
+    async def run() -> list[str]:
+        calls = asyncio.gather(*(flight.ado(("T8", "kazuya", None), slow) for _ in range(5)))
+        return await asyncio.wait_for(calls, TIMEOUT)
+
+    assert asyncio.run(run()) == ["moves"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "coalesced": 4}
+
+
+def test_ado_shares_errors() -> None:
+    flight: SingleFlight[str] = SingleFlight()
+
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    async def run() -> list[str | BaseException]:
+        calls = asyncio.gather(flight.ado("key", fail), flight.ado("key", fail), return_exceptions=True)
+        return list(await asyncio.wait_for(calls, TIMEOUT))
+
+    assert [type(r) for r in asyncio.run(run())] == [ValueError, ValueError]
+
+
+def test_ado_survives_a_cancelled_leader() -> None:
+    flight: SingleFlight[str] = SingleFlight()
+    calls = []
+
+    async def slow() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "moves"
+
+    async def run() -> tuple[list[str], bool]:
+        leader = asyncio.create_task(flight.ado("key", slow))
+        await asyncio.sleep(0)
+        followers = asyncio.gather(*(flight.ado("key", slow) for _ in range(3)))
+        await asyncio.sleep(0)
+        leader.cancel()
+        results = await asyncio.wait_for(followers, TIMEOUT)
+        return results, leader.cancelled()
+
+    # A waiter takes over the call instead of being cancelled along with the leader
+    assert asyncio.run(run()) == (["moves"] * 3, True)
+    assert len(calls) == 2
+    assert flight.leaders == 2
+
+
+def test_ado_cancels_only_the_waiter() -> None:
+    flight: SingleFlight[str] = SingleFlight()
+
+    async def slow() -> str:
+        await asyncio.sleep(0.01)
+        return "moves"
+
+    async def run() -> str:
+        leader = asyncio.create_task(flight.ado("key", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.ado("key", slow))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await asyncio.wait_for(leader, TIMEOUT)
+
+    assert asyncio.run(run()) == "moves"
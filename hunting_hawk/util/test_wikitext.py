@@ -0,0 +1,25 @@
+import json
+from pathlib import Path
+
+from . import wikitext
+
+# Output of the ElementTree based decoder this module replaced
+GOLDEN = json.loads((Path(__file__).parent / "test_wikitext.json").read_text(encoding="utf-8"))
+
+
+def test_decode_matches_golden() -> None:
+    for val, expected in GOLDEN["values"]:
+        assert wikitext.decode(val) == expected, val
+
+
+def test_decode_list_matches_golden() -> None:
+    for vals, expected in GOLDEN["lists"]:
+        assert wikitext.decode_list(vals) == expected, vals
+
+
+def test_decode_is_memoized() -> None:
+    wikitext.decode.cache_clear()
+    for _ in range(3):
+        wikitext.decode("&amp;lt;b&amp;gt;Tornado&amp;lt;/b&amp;gt;")
+    info = wikitext.decode.cache_info()
+    assert (info.hits, info.misses) == (2, 1)
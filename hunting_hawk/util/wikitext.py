@@ -0,0 +1,47 @@
+"""Decoding of the wikitext values of cargo tables"""
+import re
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+from html import unescape
+from typing import Iterable
+
+__all__ = ["decode", "decode_list", "unescape_twice"]
+
+# Distinct values remembered, tables repeat the same notes and placeholders a lot
+MEMO_SIZE = 8192
+
+_bold = re.compile("^'''|'''$")
+
+
+def unescape_twice(val: str) -> str:
+    """Unescape HTML entities of VAL, the wikis escape some values twice."""
+    if "&" not in val:
+        return val
+    once = unescape(val)
+    return unescape(once) if "&" in once else once
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def decode(val: str) -> str:
+    """Text of the single tag VAL is wrapped in, VAL unescaped if it is not a single tag."""
+    text = unescape_twice(val)
+    # Every XML document has a root tag, anything without one fails to parse
+    if "<" not in text:
+        return text
+    try:
+        inner = ET.fromstring(text).text
+    except ET.ParseError:
+        return text
+    if not inner:
+        return text
+    return _bold.sub("", inner)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _decode_item(val: str) -> str:
+    return unescape_twice(val)
+
+
+def decode_list(vals: Iterable[str]) -> list[str]:
+    """Unescape every item of VALS, dropping the blank ones."""
+    return [item for item in map(_decode_item, vals) if item.strip()]
@@ -1,29 +1,71 @@
 """REST web service for retreiving frame data"""
+import asyncio
+import json
 import logging
-from json import loads
-from typing import Annotated, Callable, List, Optional, Awaitable
-from fastapi import BackgroundTasks, FastAPI, Query, HTTPException, Response, Request
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
-from pydantic.json import pydantic_encoder
+import os
+import threading
+from dataclasses import asdict
+from pathlib import Path
+from typing import Annotated, Any, Callable, List, Optional, Awaitable
+from fastapi import BackgroundTasks, FastAPI, Header, Query, HTTPException, Response, Request
 
 from urllib.parse import quote
 from hunting_hawk.util.oembed import parse_url, Photo
-from hunting_hawk.cache.cache import FallbackCache
-from hunting_hawk.cache.util import create_redis_index
+from hunting_hawk.cache.cache import TABLE_FIELD, FallbackCache, LocalCache
+from hunting_hawk.cache.stale import StaleWhileRevalidate
+from hunting_hawk.cache.util import SEARCH_FIELDS, create_redis_index
 from hunting_hawk.mediawiki.cargo import Move
+from hunting_hawk.mediawiki.client import aclose_sessions
+from hunting_hawk.sources.artifact import artifact_path, load
 from hunting_hawk.sources.dreamcancel import KOFXV
 from hunting_hawk.sources.dustloop import BBCF, GBVSR, GGACR, HNK, P4U2R
 from hunting_hawk.sources.fetcher import CargoFetcher
+from hunting_hawk.sources.memory import snapshot_memory
 from hunting_hawk.sources.mizuumi import MBTL
 from hunting_hawk.sources.supercombo import SF6
+from hunting_hawk.sources.sync import Sync
+from hunting_hawk.sources.warmup import Warmup, retry, warmup
 
 from hunting_hawk.sources.wavu import T8
 from hunting_hawk.util import normalize
+from hunting_hawk.web.body import Body, encode_move
 
 MAX_MOVE_LENGTH = 25
 
-cache = FallbackCache()
+GAMES: dict[str, CargoFetcher] = {
+    "T8": T8,
+    "BBCF": BBCF,
+    "P4U2R": P4U2R,
+    "HNK": HNK,
+    "GGACR": GGACR,
+    "MBTL": MBTL,
+    "SF6": SF6,
+    "KOFXV": KOFXV,
+    "GBVSR": GBVSR,
+}
+FETCHERS: list[CargoFetcher] = list(GAMES.values())
+# Games whose move lookups bypass the response cache
+UNCACHED = {"HNK"}
+
+# Seconds startup waits for the sources, slower ones are served once they are ready
+WARMUP_DEADLINE = float(os.getenv("HUNTING_HAWK_WARMUP_DEADLINE", "10"))
+WARMUP: dict[str, Warmup] = {}
+WARMUP_CHARACTERS = bool(os.getenv("HUNTING_HAWK_WARMUP_CHARACTERS"))
+# Seconds until a source that failed to warm up is tried again, doubling up to WARMUP_RETRY_MAX
+WARMUP_RETRY = float(os.getenv("HUNTING_HAWK_WARMUP_RETRY", "30"))
+WARMUP_RETRY_MAX = float(os.getenv("HUNTING_HAWK_WARMUP_RETRY_MAX", str(60 * 60)))
+_routes_lock = threading.Lock()
+
+# Seconds until cached values are refreshed in the background, they expire for good after RedisCache.expiry
+SOFT_TTL = int(os.getenv("HUNTING_HAWK_SOFT_TTL", str(60 * 60 * 24)))
+
+cache = LocalCache(FallbackCache())
+freshness = StaleWhileRevalidate(cache, SOFT_TTL)
+
+# Cache-Control of game responses, HUNTING_HAWK_CACHE_CONTROL_<GAME> overrides it per game
+CACHE_CONTROL = os.getenv(
+    "HUNTING_HAWK_CACHE_CONTROL", f"public, max-age={LocalCache.ttl}, stale-while-revalidate={SOFT_TTL}"
+)
 app = FastAPI(
     title="HuntingHawk",
     servers=[
@@ -33,205 +75,295 @@ app = FastAPI(
 )
 
 
-@app.on_event("startup")
-async def startup_event() -> None:
-    logging.info("Initializing...")
-    create_redis_index()
-
-
-def populate_cache(m: CargoFetcher, character: str, moves: list[Move]) -> None:
-    for mo in moves:
-        if hasattr(mo, "input"):
-            normalized = normalize.normalize(mo.input)
-            logging.debug(f"Storing {normalized} for {character}")
-            cache_key = f"moves:{m.table_name}:{character}:{normalized}".lower()
-            cache.set_json(cache_key, mo, pydantic_encoder)
-        else:
-            logging.warn(f"Could not find input for {mo}")
-
-
-def get_characters(m: CargoFetcher, tasks: BackgroundTasks) -> Callable[[], list[str]]:
-    def wrapped() -> list[str]:
-        cache_key = f"characterlist_{m.table_name}".lower()
-
+def load_artifacts(directory: Path) -> None:
+    """Serve every game with an artifact in DIRECTORY from it."""
+    for game, fetcher in GAMES.items():
+        path = artifact_path(directory, fetcher)
+        if not path.exists():
+            logging.info(f"No artifact for {game} in {directory}")
+            continue
         try:
-            if r := cache.get_list(cache_key):
-                return r
+            load(fetcher, path)
         except Exception as e:
-            logging.error(f"Character cache lookup failed with {e}")
-
-        res = list(m)
-        tasks.add_task(cache.set_list, cache_key, res)
-        return res
+            logging.error(f"Loading the artifact of {game} failed with {e}")
 
-    return wrapped
 
+def load_snapshots() -> None:
+    for fetcher in FETCHERS:
+        # Games booted from an artifact already have one
+        if fetcher.snapshot is not None:
+            continue
+        try:
+            fetcher.load_snapshot()
+        except Exception as e:
+            logging.error(f"Snapshot of {fetcher.table_name} failed with {e}")
 
-def get_moves(m: CargoFetcher, tasks: BackgroundTasks) -> Callable[[str, Optional[str]], list[Move] | JSONResponse]:
-    def wrapped(
-        character: str,
-        move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-    ) -> list[Move] | JSONResponse:
-        if move is not None:
-            normalized_move = normalize.normalize(move)
-            cache_key = f"moves:{m.table_name}:{character}:{normalized_move}".lower()
-            # If we have an exact key match return that first
-            try:
-                if r := cache.get_json(cache_key):
-                    logging.debug(f"Retrieving {cache_key} from cache")
-                    return JSONResponse(content=jsonable_encoder(r))
-            except Exception as e:
-                logging.error(f"Cache lookup failed with {e}")
-
-            # Try to do a fuzzy query on our json
-            try:
-                logging.debug(f"Querying the cache for {move}")
-                if res := list(cache.query(m.default_key, character, move)):
-                    # TODO: almost definitely a bottleneck
-                    return JSONResponse(content=jsonable_encoder([loads(r) for r in res]))
-            except Exception as e:
-                logging.error(f"Cache query failed with {e}")
-
-            if  moves := m.get_moves_by_input(character, normalized_move):
-                logging.info(f"Populating cache for {character} {move}")
-                tasks.add_task(populate_cache, m, character, moves)
-        else:
-            cache_key = f"moves:{m.table_name}:{character}".lower()
-            if r := cache.get_json(cache_key):
-                return JSONResponse(content=jsonable_encoder(r))
-            if moves := m.get_moves(character):
-                logging.info(f"Populating cache for {character}")
-                tasks.add_task(populate_cache, m, character, moves)
-        return moves
-
-    return wrapped
 
+def on_ready(result: Warmup) -> None:
+    WARMUP[result.source] = result
+    if not result.ready:
+        delay = min(WARMUP_RETRY * 2 ** (result.attempt - 1), WARMUP_RETRY_MAX)
+        logging.warning(f"Retrying {result.source} in {delay:.0f}s")
+        retry(result, on_ready, delay, characters=WARMUP_CHARACTERS)
+        return
+    timing = f"schema {result.schema:.2f}s"
+    if result.characters is not None:
+        timing += f", characters {result.characters:.2f}s"
+    logging.info(f"{result.source} ready ({timing})")
 
-@app.get("/T8/characters/", response_model=List[str])
-def t8_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(T8, background_tasks)()
+    add_game_routes(result.source, result.fetcher, cached=result.source not in UNCACHED)
+    if result.character_list:
+        cache_key = f"characterlist_{result.fetcher.table_name}".lower()
+        cache.set_list(cache_key, result.character_list)
+        freshness.touch(cache_key)
 
 
-@app.get("/T8/characters/{character}/", response_model=List[T8.move])  # type: ignore
-def t8_moves(
-    background_tasks: BackgroundTasks,
-    character: str,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    return get_moves(T8, background_tasks)(character, move)
+@app.on_event("startup")
+async def startup_event() -> None:
+    logging.info("Initializing...")
+    if artifacts := os.getenv("HUNTING_HAWK_ARTIFACTS"):
+        await asyncio.to_thread(load_artifacts, Path(artifacts))
+    index = asyncio.create_task(asyncio.to_thread(create_redis_index))
+    _, pending = await asyncio.to_thread(
+        warmup, GAMES, on_ready, WARMUP_DEADLINE, characters=WARMUP_CHARACTERS
+    )
+    if pending:
+        logging.warning(f"Serving without {', '.join(pending)}, still warming up after {WARMUP_DEADLINE}s")
+    await index
+    if os.getenv("HUNTING_HAWK_SNAPSHOT"):
+        logging.info("Loading table snapshots in the background")
+        threading.Thread(target=load_snapshots, daemon=True).start()
+    if interval := os.getenv("HUNTING_HAWK_SYNC_INTERVAL"):
+        logging.info(f"Syncing changed pages every {interval}s")
+        sync = Sync(FETCHERS, refreshed)
+        threading.Thread(target=sync.run_forever, args=(float(interval),), daemon=True).start()
 
 
-@app.get("/BBCF/characters/", response_model=List[str])
-def bbcf_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(BBCF, background_tasks)()
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    await aclose_sessions()
 
 
-@app.get("/BBCF/characters/{character}/", response_model=List[BBCF.move])  # type: ignore
-def bbcf_moves(
-    background_tasks: BackgroundTasks,
-    character: str,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    return get_moves(BBCF, background_tasks)(character, move)
+def body_key(m: CargoFetcher, character: str, move: Optional[str] = None) -> str:
+    """Cache key of the serialized response for CHARACTER, or for its MOVE."""
+    key = f"body:{m.table_name}:{character}"
+    return (key if move is None else f"{key}:{move}").lower()
 
 
-@app.get("/P4U2R/characters/{character}/", response_model=List[P4U2R.move])  # type: ignore
-def p4u2r_moves(
-    character: str,
-    background_tasks: BackgroundTasks,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    return get_moves(P4U2R, background_tasks)(character, move)
+def refreshed(m: CargoFetcher, character: str, moves: list[Move], movelist: bool = True) -> bool:
+    """Store refetched MOVES of CHARACTER, MOVELIST tells whether they are its whole movelist.
 
+    Returns whether anything was stored, an empty refetch keeps the cached value."""
+    if not moves:
+        return False
+    populate_cache(m, character, moves, Body.of_moves(moves) if movelist else None)
+    return True
 
-@app.get("/P4U2R/characters/", response_model=List[str])
-def p4u2r_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(P4U2R, background_tasks)()
 
+def search_document(m: CargoFetcher, move: Move) -> dict[str, Any]:
+    """The fields of MOVE the search index covers, the move itself is stored as a body."""
+    fields = {f: getattr(move, f) for f in (*SEARCH_FIELDS, m.default_key) if hasattr(move, f)}
+    # Characters of different games share names, searches stay within the table
+    return fields | {TABLE_FIELD: m.table_name.lower()}
 
-@app.get("/HNK/characters/", response_model=List[str])
-def hnk_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(HNK, background_tasks)()
 
+def populate_cache(m: CargoFetcher, character: str, moves: list[Move], movelist: Optional[Body] = None) -> None:
+    """Store MOVES of CHARACTER in a few round trips, MOVELIST is the body of its whole movelist."""
+    documents: dict[str, Any] = {}
+    # Exact hits and search results are answered with these bytes as is
+    bodies: dict[str, bytes] = {}
+    if movelist is not None:
+        bodies[body_key(m, character)] = movelist.pack()
+    for mo in moves:
+        if hasattr(mo, "input"):
+            normalized = normalize.normalize(mo.input)
+            logging.debug(f"Storing {normalized} for {character}")
+            documents[f"moves:{m.table_name}:{character}:{normalized}".lower()] = search_document(m, mo)
+            bodies[body_key(m, character, normalized)] = Body.of(encode_move(mo)).pack()
+        else:
+            logging.warn(f"Could not find input for {mo}")
 
-@app.get("/HNK/characters/{character}/", response_model=List[HNK.move])  # type: ignore
-def hnk_moves(
-    character: str,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    if move is not None:
-        return HNK.get_moves_by_input(character, move)
-    return HNK.get_moves(character)
+    cache.set_bytes_many(bodies, sample=True)
+    cache.set_json_many(documents, lambda v: v)
+    # Refreshes are tracked on the indexed documents and on the whole movelist
+    freshness.touch_many([*documents, body_key(m, character)] if movelist is not None else documents)
 
 
-@app.get("/GGACR/characters/", response_model=List[str])
-def ggacr_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(GGACR, background_tasks)()
+def search_bodies(m: CargoFetcher, character: str, move: str) -> list[bytes]:
+    """Stored bodies of the moves of CHARACTER the search index matches MOVE with."""
+    found = []
+    for doc in cache.query(m.table_name, m.default_key, character, move):
+        found_input = json.loads(doc).get("input")
+        if not isinstance(found_input, str):
+            continue
+        if (raw := cache.get_bytes(body_key(m, character, normalize.normalize(found_input)))) is not None:
+            found.append(Body.unpack(raw).content)
+    return found
 
 
-@app.get("/GGACR/characters/{character}/", response_model=List[GGACR.move])  # type: ignore
-def ggacr_moves(
-    background_tasks: BackgroundTasks,
-    character: str,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    return get_moves(GGACR, background_tasks)(character, move)
+def store_characters(cache_key: str, characters: list[str]) -> None:
+    cache.set_list(cache_key, characters)
+    freshness.touch(cache_key)
 
 
-@app.get("/MBTL/characters/", response_model=List[str])
-def mbtl_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(MBTL, background_tasks)()
+def revalidate(tasks: BackgroundTasks, cache_key: str, refresh: Callable[[], bool]) -> None:
+    """Refresh CACHE_KEY after the response is sent if it is past the soft TTL."""
+    if freshness.is_stale(cache_key):
+        logging.debug(f"Serving stale {cache_key} while refreshing it")
+        tasks.add_task(freshness.revalidate, cache_key, refresh)
 
 
-@app.get("/MBTL/characters/{character}/", response_model=List[MBTL.move])  # type: ignore
-def mbtl_moves(
-    background_tasks: BackgroundTasks,
-    character: str,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    return get_moves(MBTL, background_tasks)(character, move)
+def get_characters(m: CargoFetcher, tasks: BackgroundTasks) -> Callable[[], list[str]]:
+    def wrapped() -> list[str]:
+        cache_key = f"characterlist_{m.table_name}".lower()
 
+        def refresh_characters() -> bool:
+            if characters := list(m):
+                cache.set_list(cache_key, characters)
+            return bool(characters)
 
-@app.get("/SF6/characters/", response_model=List[str])
-def sf6_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(SF6, background_tasks)()
+        try:
+            if r := cache.get_list(cache_key):
+                revalidate(tasks, cache_key, refresh_characters)
+                return r
+        except Exception as e:
+            logging.error(f"Character cache lookup failed with {e}")
 
+        if res := list(m):
+            tasks.add_task(store_characters, cache_key, res)
+        return res
 
-@app.get("/SF6/characters/{character}/", response_model=List[SF6.move])  # type: ignore
-def sf6_moves(
-    background_tasks: BackgroundTasks,
-    character: str,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    return get_moves(SF6, background_tasks)(character, move)
+    return wrapped
 
 
-@app.get("/KOFXV/characters/", response_model=List[str])
-def kofxv_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(KOFXV, background_tasks)()
+def get_cached_moves(m: CargoFetcher, tasks: BackgroundTasks, character: str, move: Optional[str]) -> Optional[Body]:
+    """The moves of CHARACTER matching MOVE from the cache or this worker, None to go upstream."""
+    if move is not None:
+        normalized_move = normalize.normalize(move)
+        cache_key = f"moves:{m.table_name}:{character}:{normalized_move}".lower()
 
+        def refresh_move() -> bool:
+            return refreshed(m, character, m.refresh(character, normalized_move), movelist=False)
 
-@app.get("/KOFXV/characters/{character}/", response_model=List[KOFXV.move])  # type: ignore
-def kofxv_moves(
-    background_tasks: BackgroundTasks,
-    character: str,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    return get_moves(KOFXV, background_tasks)(character, move)
+        # If we have an exact key match return that first
+        try:
+            if (raw := cache.get_bytes(body_key(m, character, normalized_move))) is not None:
+                logging.debug(f"Retrieving {cache_key} from cache")
+                revalidate(tasks, cache_key, refresh_move)
+                return Body.unpack(raw)
+        except Exception as e:
+            logging.error(f"Cache lookup failed with {e}")
 
+        # Search the movelists this worker has already fetched
+        if local := m.search(character, normalized_move):
+            return Body.of_moves(local)
 
-@app.get("/GBVSR/characters/", response_model=List[str])
-def gbvsr_characters(background_tasks: BackgroundTasks) -> List[str]:
-    return get_characters(GBVSR, background_tasks)()
+        # Try to do a fuzzy query on our json
+        try:
+            logging.debug(f"Querying the cache for {move}")
+            if res := search_bodies(m, character, move):
+                return Body.of_documents(res)
+        except Exception as e:
+            logging.error(f"Cache query failed with {e}")
+    else:
+        key = body_key(m, character)
+        try:
+            if (raw := cache.get_bytes(key)) is not None:
+                revalidate(tasks, key, lambda: refreshed(m, character, m.refresh(character)))
+                return Body.unpack(raw)
+        except Exception as e:
+            logging.error(f"Cache lookup failed with {e}")
+    return None
 
 
-@app.get("/GBVSR/characters/{character}/", response_model=List[GBVSR.move])  # type: ignore
-def gbvsr_moves(
-    background_tasks: BackgroundTasks,
-    character: str,
-    move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
-) -> list[Move] | JSONResponse:
-    return get_moves(GBVSR, background_tasks)(character, move)
+async def fetch_moves(
+    m: CargoFetcher, tasks: Optional[BackgroundTasks], character: str, move: Optional[str]
+) -> Body:
+    """Fetch the moves of CHARACTER matching MOVE upstream, cached after the response when TASKS is set."""
+    if move is not None:
+        if tasks is None:
+            return Body.of_moves(await m.aget_moves_by_input(character, move))
+        if moves := await m.aget_moves_by_input(character, normalize.normalize(move)):
+            logging.info(f"Populating cache for {character} {move}")
+            tasks.add_task(populate_cache, m, character, moves)
+            return Body.of_moves(moves)
+    else:
+        moves = await m.aget_moves(character)
+        if tasks is None:
+            return Body.of_moves(moves)
+        if moves:
+            logging.info(f"Populating cache for {character}")
+            # Serialized once, later requests skip the response model
+            serialized = Body.of_moves(moves)
+            tasks.add_task(populate_cache, m, character, moves, serialized)
+            return serialized
+    return Body.of_json([])
+
+
+@app.get("/stats/", include_in_schema=False)
+def stats() -> dict[str, dict[str, int]]:
+    """Counters of upstream lookups that were made or coalesced per table."""
+    return {f.table_name: f.flight.stats() for f in FETCHERS}
+
+
+@app.get("/stats/cache/", include_in_schema=False)
+def cache_stats() -> dict[str, int]:
+    """Bytes of the values stored by this worker before and after compression."""
+    return cache.stats()
+
+
+@app.get("/stats/memory/", include_in_schema=False)
+def memory_stats() -> dict[str, dict[str, int]]:
+    """Bytes held by the tables loaded into this worker, with and without shared values."""
+    return {f.table_name: asdict(snapshot_memory(f.snapshot)) for f in FETCHERS if f.snapshot is not None}
+
+
+@app.get("/stats/warmup/", include_in_schema=False)
+def warmup_stats() -> dict[str, dict[str, Any]]:
+    """Startup timings per game, games that are still warming up are missing."""
+    return {
+        game: {"ready": w.ready, "schema": w.schema, "characters": w.characters} for game, w in WARMUP.items()
+    }
+
+
+def cache_control(game: str) -> str:
+    """Cache-Control header of the responses of GAME."""
+    return os.getenv(f"HUNTING_HAWK_CACHE_CONTROL_{game}", CACHE_CONTROL)
+
+
+def add_game_routes(game: str, m: CargoFetcher, cached: bool = True) -> None:
+    """Serve the characters and moves of M under /GAME, requires its table definition."""
+    headers = {"Cache-Control": cache_control(game)}
+
+    def characters(
+        background_tasks: BackgroundTasks,
+        if_none_match: Annotated[str | None, Header(include_in_schema=False)] = None,
+    ) -> Response:
+        body = Body.of_json(get_characters(m, background_tasks)())
+        return body.response(if_none_match, headers)
+
+    async def moves(
+        background_tasks: BackgroundTasks,
+        character: str,
+        move: Annotated[str | None, Query(max_length=MAX_MOVE_LENGTH)] = None,
+        if_none_match: Annotated[str | None, Header(include_in_schema=False)] = None,
+    ) -> Response:
+        # The cache is synchronous, its round trips run off the event loop while the
+        # upstream lookups share the pooled async session of the loop
+        body = await asyncio.to_thread(get_cached_moves, m, background_tasks, character, move) if cached else None
+        if body is None:
+            body = await fetch_moves(m, background_tasks if cached else None, character, move)
+        return body.response(if_none_match, headers)
+
+    with _routes_lock:
+        app.get(f"/{game}/characters/", response_model=List[str], name=f"{game.lower()}_characters")(characters)
+        app.get(
+            f"/{game}/characters/{{character}}/",
+            response_model=List[m.move],  # type: ignore
+            name=f"{game.lower()}_moves",
+        )(moves)
+        # Regenerate the docs with the new routes
+        app.openapi_schema = None
 
 
 # Here be dragons
@@ -0,0 +1,93 @@
+"""Pre-serialized response bodies"""
+import json
+from dataclasses import dataclass, fields
+from functools import cache
+from hashlib import blake2b
+from typing import Any, Iterable, Iterator, Optional
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from pydantic.json import pydantic_encoder
+
+from hunting_hawk.mediawiki.cargo import Move
+
+__all__ = ["Body", "etag_matches"]
+
+# Bodies larger than this are streamed in chunks of this size
+CHUNK_SIZE = 64 * 1024
+
+
+@cache
+def _field_names(cls: type) -> tuple[str, ...]:
+    return tuple(f.name for f in fields(cls))
+
+
+def _dumps(val: Any) -> bytes:
+    # Same settings as fastapi.responses.JSONResponse
+    return json.dumps(val, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=pydantic_encoder).encode(
+        "utf-8"
+    )
+
+
+def encode_move(move: Any) -> bytes:
+    """Serialize MOVE the way its response model would."""
+    return _dumps({name: getattr(move, name) for name in _field_names(move.__class__)})
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value matches ETAG."""
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+@dataclass(frozen=True)
+class Body:
+    """A serialized JSON response and its entity tag."""
+
+    content: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, content: bytes) -> "Body":
+        return cls(content, f'"{blake2b(content, digest_size=16).hexdigest()}"')
+
+    @classmethod
+    def of_json(cls, val: Any) -> "Body":
+        return cls.of(_dumps(val))
+
+    @classmethod
+    def of_moves(cls, moves: list[Move]) -> "Body":
+        return cls.of(b"[" + b",".join(encode_move(m) for m in moves) + b"]")
+
+    @classmethod
+    def of_documents(cls, documents: Iterable[str | bytes]) -> "Body":
+        """Join already serialized JSON DOCUMENTS into an array without decoding them."""
+        return cls.of(b"[" + b",".join(d.encode("utf-8") if isinstance(d, str) else d for d in documents) + b"]")
+
+    def pack(self) -> bytes:
+        """Serialize the body together with its entity tag for storage."""
+        return self.etag.encode("ascii") + b"\n" + self.content
+
+    @classmethod
+    def unpack(cls, raw: bytes) -> "Body":
+        """Restore a body stored with pack, bare content gets its entity tag computed."""
+        if not raw.startswith(b'"'):
+            return cls.of(raw)
+        etag, _, content = raw.partition(b"\n")
+        return cls(content, etag.decode("ascii"))
+
+    def chunks(self) -> Iterator[bytes]:
+        view = memoryview(self.content)
+        for i in range(0, len(view), CHUNK_SIZE):
+            yield bytes(view[i : i + CHUNK_SIZE])
+
+    def response(self, if_none_match: Optional[str] = None, headers: Optional[dict[str, str]] = None) -> Response:
+        """Respond with the body, or with 304 Not Modified if the client already has it."""
+        headers = (headers or {}) | {"ETag": self.etag}
+        if etag_matches(if_none_match, self.etag):
+            return Response(status_code=304, headers=headers)
+        if len(self.content) <= CHUNK_SIZE:
+            return Response(self.content, media_type="application/json", headers=headers)
+        return StreamingResponse(self.chunks(), media_type="application/json", headers=headers)
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from hunting_hawk.mediawiki.cargo import CargoField, CargoFields, build_table_type
+
+from . import body
+from .body import Body, etag_matches
+
+move = build_table_type(
+    "MoveData_Test",
+    CargoFields(
+        cargofields={
+            "input": CargoField(type="String"),
+            "damage": CargoField(type="Integer"),
+            "images": CargoField(type="File", isList=""),
+            "notes": CargoField(type="Wikitext"),
+        }
+    ),
+)
+MOVES: list[Any] = [
+    move(input="236S", damage=20, images=["https://example.com/Ky_236S.png"], notes="Fireball"),
+    move(input="5P", notes="Fastest normal, 4f ≈ 0.07s"),
+]
+
+
+def test_body_matches_the_response_model() -> None:
+    assert Body.of_moves(MOVES).content == JSONResponse(content=jsonable_encoder(MOVES)).body
+
+
+def test_body_etag() -> None:
+    b = Body.of_moves(MOVES)
+    assert b.etag == Body.of_moves(list(MOVES)).etag
+    assert b.etag != Body.of_moves(MOVES[:1]).etag
+
+    assert etag_matches(f'"other", {b.etag}', b.etag)
+    assert etag_matches(f"W/{b.etag}", b.etag)
+    assert etag_matches("*", b.etag)
+    assert not etag_matches(None, b.etag)
+
+    assert b.response(b.etag).status_code == 304
+    assert b.response(None).headers["etag"] == b.etag
+
+
+def test_large_bodies_are_streamed(monkeypatch: Any) -> None:
+    monkeypatch.setattr(body, "CHUNK_SIZE", 16)
+    b = Body.of_moves(MOVES)
+    res = b.response()
+    assert isinstance(res, StreamingResponse)
+
+    async def collect() -> bytes:
+        return b"".join([c async for c in res.body_iterator])  # type: ignore
+
+    assert asyncio.run(collect()) == b.content
+
+
+def test_body_storage_keeps_the_etag() -> None:
+    b = Body.of_moves(MOVES)
+    assert Body.unpack(b.pack()) == b
+    # Bodies stored without an entity tag get one computed
+    assert Body.unpack(b.content) == b
+
+    res = b.response(None, {"Cache-Control": "public, max-age=300"})
+    assert res.headers["cache-control"] == "public, max-age=300"
+    assert res.headers["etag"] == b.etag